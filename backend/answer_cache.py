@@ -0,0 +1,148 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.config import settings
+from backend.embedding_cache import normalize_query
+
+Scope = Tuple[str, str, str]
+
+
+def make_scope(department: str, role: str, country: Optional[str]) -> Scope:
+    """Access scope an answer was produced for; answers never cross scopes."""
+    return ((department or "").lower(), (role or "").lower(), (country or "").lower())
+
+
+class _ScopeEntries:
+    def __init__(self):
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._keys: List[str] = []
+
+    def invalidate_matrix(self):
+        self._matrix = None
+
+    def matrix(self) -> Tuple[List[str], Optional[np.ndarray]]:
+        if self._matrix is None:
+            keys = [k for k, e in self.entries.items() if e["vector"] is not None]
+            self._keys = keys
+            self._matrix = np.stack([self.entries[k]["vector"] for k in keys]) if keys else None
+        return self._keys, self._matrix
+
+
+class AnswerCache:
+    """Answer cache for `run_rag`, partitioned by (department, role, country).
+
+    Lookups match the normalized question text exactly first, then fall back to the
+    most similar cached question in the same scope above `threshold` (cosine).
+    All entries are dropped when the index generation changes (re-ingest).
+    Conversation history is not part of the key, so cached answers are not personalised.
+    """
+
+    def __init__(self, max_entries_per_scope: int = 256, ttl_seconds: int = 3600, threshold: float = 0.95):
+        self.max_entries_per_scope = max_entries_per_scope
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._scopes: Dict[Scope, _ScopeEntries] = {}
+        self._generation: Optional[str] = None
+        self.hits_exact = 0
+        self.hits_semantic = 0
+        self.misses = 0
+
+    def _sync_generation(self, generation: Optional[str]):
+        if generation != self._generation:
+            self._scopes = {}
+            self._generation = generation
+
+    @staticmethod
+    def _unit(vector) -> Optional[np.ndarray]:
+        if vector is None:
+            return None
+        v = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(v))
+        return v / norm if norm else None
+
+    def get(self, question: str, scope: Scope, vector=None, generation: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached result flagged with how it matched, or None."""
+        key = normalize_query(question)
+        now = time.time()
+        with self._lock:
+            self._sync_generation(generation)
+            bucket = self._scopes.get(scope)
+            if bucket is None:
+                self.misses += 1
+                return None
+
+            entry = bucket.entries.get(key)
+            match, similarity = None, None
+            if entry and now - entry["created_at"] < self.ttl_seconds:
+                match, similarity = "exact", 1.0
+            else:
+                query = self._unit(vector)
+                keys, matrix = bucket.matrix()
+                if query is not None and matrix is not None and matrix.shape[1] == query.shape[0]:
+                    scores = matrix @ query
+                    best = int(np.argmax(scores))
+                    candidate = bucket.entries[keys[best]]
+                    if scores[best] >= self.threshold and now - candidate["created_at"] < self.ttl_seconds:
+                        entry, key = candidate, keys[best]
+                        match, similarity = "semantic", float(scores[best])
+
+            if match is None:
+                self.misses += 1
+                return None
+            bucket.entries.move_to_end(key)
+            if match == "exact":
+                self.hits_exact += 1
+            else:
+                self.hits_semantic += 1
+            result = copy.deepcopy(entry["result"])
+
+        result["cached"] = True
+        result["cache_match"] = match
+        result["cache_similarity"] = round(similarity, 4)
+        return result
+
+    def put(self, question: str, scope: Scope, result: Dict[str, Any], vector=None, generation: Optional[str] = None):
+        key = normalize_query(question)
+        with self._lock:
+            self._sync_generation(generation)
+            bucket = self._scopes.setdefault(scope, _ScopeEntries())
+            bucket.entries[key] = {
+                "result": copy.deepcopy(result),
+                "vector": self._unit(vector),
+                "created_at": time.time(),
+            }
+            bucket.entries.move_to_end(key)
+            while len(bucket.entries) > self.max_entries_per_scope:
+                bucket.entries.popitem(last=False)
+            bucket.invalidate_matrix()
+
+    def invalidate(self):
+        with self._lock:
+            self._scopes = {}
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.hits_exact + self.hits_semantic
+        total = hits + self.misses
+        return {
+            "hits_exact": self.hits_exact,
+            "hits_semantic": self.hits_semantic,
+            "misses": self.misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "scopes": len(self._scopes),
+            "entries": sum(len(b.entries) for b in self._scopes.values()),
+            "threshold": self.threshold,
+        }
+
+
+answer_cache = AnswerCache(
+    max_entries_per_scope=settings.ANSWER_CACHE_SIZE,
+    ttl_seconds=settings.ANSWER_CACHE_TTL,
+    threshold=settings.ANSWER_CACHE_THRESHOLD,
+)
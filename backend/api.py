@@ -1,13 +1,25 @@
 from fastapi import FastAPI, Request, Response, HTTPException, status
-from fastapi.responses import RedirectResponse, JSONResponse
+from fastapi.responses import RedirectResponse, JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from typing import Dict, Any
+from fastapi.concurrency import run_in_threadpool
+from typing import Dict, Any, Optional
+from datetime import datetime
 import requests
 import os
+import json
+import base64
+import time
 import secrets
 import msal
 from backend.config import settings
-from backend.rag_pipeline import run_rag
+from backend.rag_pipeline import arun_rag, arun_rag_batch, astream_answer
+from backend.clients import registry
+from backend.answer_cache import answer_cache
+from backend.context_budget import context_budgeter
+from backend.history_writer import history_writer
+from backend.session_store import build_session_store
+from backend.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics, register_stats
+from backend.profiling import PROFILE_HEADER, profile, profile_path, should_profile
 from backend import db
 
 app = FastAPI(title="HR Enterprise Assistant API")
@@ -19,11 +31,65 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Profile-File"],
 )
 
-# In-memory stores (for demo). Replace with persistent store in production.
-_state_store: Dict[str, str] = {}
-_session_store: Dict[str, Dict[str, Any]] = {}
+# Login sessions and pending OAuth states (see backend/session_store.py; SESSION_BACKEND=sqlite
+# shares them across `uvicorn --workers N`)
+_state_store = build_session_store("login_state", settings.LOGIN_STATE_TTL)
+_session_store = build_session_store("session", settings.SESSION_TTL)
+
+
+@app.on_event("startup")
+def warm_clients():
+    """Build embeddings, vector store and chat model once so /query does not pay setup cost."""
+    try:
+        registry.warm_up()
+        print("✅ RAG clients warmed up")
+    except Exception as e:
+        # keep serving; /health reports not-ready and clients are retried lazily
+        print(f"⚠️ Could not warm up RAG clients: {e}")
+
+
+@app.on_event("startup")
+def start_session_sweepers():
+    for store in (_session_store, _state_store):
+        store.start_sweeper(settings.SESSION_SWEEP_INTERVAL)
+
+
+@app.on_event("shutdown")
+def drain_history_writer():
+    """Commit chat messages still queued in the write-behind writer."""
+    history_writer.close()
+
+
+@app.on_event("shutdown")
+def stop_session_sweepers():
+    for store in (_session_store, _state_store):
+        store.close()
+
+
+@app.get("/health")
+def health():
+    """Readiness check for the shared RAG clients."""
+    report = registry.health()
+    report["answer_cache"] = answer_cache.stats()
+    report["context_budget"] = context_budgeter.stats()
+    report["history_writer"] = history_writer.stats()
+    report["sessions"] = _session_store.stats()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
+register_stats("hr_assistant_sessions", "Live login sessions", "field", _session_store.stats, ["entries"], kind="gauge")
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Per-stage latency histograms, LLM/retrieval counters and cache hit rates (Prometheus text format)."""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
 
 # Azure AD config from env
 AZURE_CLIENT_ID = os.getenv("AZURE_CLIENT_ID")
@@ -54,7 +120,7 @@ def login():
         redirect_uri=AZURE_REDIRECT_URI,
         state=state
     )
-    _state_store[state] = "init"
+    _state_store.set(state, {"created_at": time.time()})
     return RedirectResponse(url=auth_url)
 
 
@@ -82,7 +148,7 @@ async def demo_login(request: Request):
         if password == demo_users["test_user"]["password"]:
             session_id = secrets.token_urlsafe(24)
             user_info = {"name": username, "email": username, "department": (body.get("department") or "").lower(), "country": (body.get("country") or "").lower(), "roles": ["employee"]}
-            _session_store[session_id] = user_info
+            _session_store.set(session_id, user_info)
             resp = JSONResponse({"message": f"Welcome {username}", "username": username, "role": "employee"})
             resp.set_cookie("session", session_id, httponly=True)
             return resp
@@ -103,7 +169,7 @@ async def demo_login(request: Request):
     session_id = secrets.token_urlsafe(24)
     # Keep provided email if present, but use matched username for name/id
     user_info = {"name": matched_username, "email": username, "department": (body.get("department") or "").lower(), "country": (body.get("country") or "").lower(), "roles": [user.get("role")]}
-    _session_store[session_id] = user_info
+    _session_store.set(session_id, user_info)
     resp = JSONResponse({"message": f"Welcome {matched_username}", "username": matched_username, "role": user.get("role")})
     resp.set_cookie("session", session_id, httponly=True)
     return resp
@@ -115,7 +181,8 @@ async def auth_callback(request: Request):
     params = dict(request.query_params)
     code = params.get("code")
     state = params.get("state")
-    if not code or not state or state not in _state_store:
+    # states are single-use
+    if not code or not state or _state_store.pop(state) is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid auth callback parameters")
 
     app_msal = _build_msal_app()
@@ -160,7 +227,7 @@ async def auth_callback(request: Request):
 
     # Create session
     session_id = secrets.token_urlsafe(24)
-    _session_store[session_id] = user_info
+    _session_store.set(session_id, user_info)
 
     response = RedirectResponse(url="/")
     # Set cookie (httponly). In production, set secure=True and SameSite settings appropriately.
@@ -168,26 +235,29 @@ async def auth_callback(request: Request):
     return response
 
 
-@app.post("/query")
-async def query(request: Request):
-    """Accepts JSON {"question": "..."} and returns filtered answers based on user's department and country."""
-    session_id = request.cookies.get("session")
-    if not session_id or session_id not in _session_store:
-        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
-
-    user = _session_store[session_id]
-    body = await request.json()
-    question = body.get("question")
+def _query_params(request: Request, body: Dict[str, Any]) -> Dict[str, Any]:
+    """Resolve the authenticated user's question, department, role and policy country for /query."""
+    user = _user_scope(request, body)
+    question = (body or {}).get("question")
     if not question:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="question required")
+    return {"question": question, **user}
+
 
+def _user_scope(request: Request, body: Dict[str, Any]) -> Dict[str, Any]:
+    """The authenticated user's department, role, username and policy country."""
+    session_id = request.cookies.get("session")
+    user = _session_store.get(session_id) if session_id else None
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+
+    body = body or {}
     user_dept = (user.get("department") or "").lower()
     user_country = (user.get("country") or "").lower()
     roles_list = [(r or "").lower() for r in (user.get("roles") or [])]
     user_role = "hr" if any(r in ("hr", "human resources") for r in roles_list) else "employee"
 
     # Optional: policy_country allows the frontend to request 'india' or 'foreign' policies specifically
-    body = body or {}
     policy_country = (body.get("policy_country") or body.get("policy_type") or body.get("country") or "").lower() or None
     # normalize common aliases
     if policy_country in ("india", "indian", "indian_policy"):
@@ -195,57 +265,214 @@ async def query(request: Request):
     if policy_country in ("foreign", "international", "foreign_policy"):
         policy_country = "foreign"
 
+    return {
+        "department": user_dept or "",
+        "role": user_role,
+        "username": user.get("email"),
+        "country": policy_country or user_country or None,
+    }
+
+
+def _profile_requested(request: Request, params: Dict[str, Any]) -> bool:
+    """`X-Profile: 1` is honoured for HR users only; `PROFILE_SAMPLE_RATE` applies to everyone."""
+    return should_profile(request.headers.get(PROFILE_HEADER), authorized=params["role"] == "hr")
+
+
+@app.post("/query")
+async def query(request: Request):
+    """Accepts JSON {"question": "..."} and returns filtered answers based on user's department and country.
+
+    Profiled requests (see `_profile_requested`) name the speedscope file in `X-Profile-File`.
+    """
+    params = _query_params(request, await request.json())
+
+    profile_file = None
     try:
-        reply = run_rag(question, department=user_dept or "", role=user_role, username=user.get("email"), country=policy_country or user_country or None)
+        if _profile_requested(request, params):
+            with profile("query") as profile_file:
+                reply = await arun_rag(**params)
+        else:
+            reply = await arun_rag(**params)
     except Exception as e:
         # Fallback: return empty result with error
         return JSONResponse({"answer": "", "documents": [], "error": str(e)})
 
-    return JSONResponse(reply)
+    headers = {"X-Profile-File": os.path.basename(profile_file)} if profile_file else None
+    return JSONResponse(reply, headers=headers)
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/query/stream")
+async def query_stream(request: Request):
+    """Server-sent-events variant of /query.
+
+    Streams `token` events with answer text as it is generated, then `answer`,
+    `follow_ups`, `next_steps`, `confidence` (HR only) and `done`.
+    """
+    params = _query_params(request, await request.json())
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    profile_file = profile_path("query-stream") if _profile_requested(request, params) else None
+    if profile_file:
+        headers["X-Profile-File"] = os.path.basename(profile_file)
+
+    async def stream():
+        try:
+            async for event, data in astream_answer(**params):
+                yield _sse(event, data)
+        except Exception as e:
+            yield _sse("error", {"error": str(e)})
+
+    async def events():
+        if not profile_file:
+            async for chunk in stream():
+                yield chunk
+            return
+        with profile("query-stream", path=profile_file):
+            async for chunk in stream():
+                yield chunk
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=headers)
+
+
+@app.post("/query/batch")
+async def query_batch(request: Request):
+    """Answer many questions in one request (e.g. re-checking FAQ answers after a policy update). HR only.
+
+    Accepts JSON {"questions": ["...", ...]} plus the optional `policy_country` of /query;
+    `department` and `as_role: "employee"` check the answers another user would get.
+    Streams NDJSON: one {"index", "question", ...answer} line per question in completion
+    order (a failed question carries "error"), then a {"done": true, ...} summary line.
+    """
+    body = await request.json() or {}
+    params = _user_scope(request, body)
+    if params["role"] != "hr":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="HR role required")
+    questions = body.get("questions")
+    if not isinstance(questions, list) or not questions or not all(isinstance(q, str) and q.strip() for q in questions):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="questions must be a non-empty list of strings")
+    if len(questions) > settings.RAG_BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail=f"at most {settings.RAG_BATCH_MAX_QUESTIONS} questions per batch")
+    if body.get("department"):
+        params["department"] = str(body["department"]).lower()
+    if (body.get("as_role") or "").lower() == "employee":
+        params["role"] = "employee"
+    params.pop("username")  # batch answers stay out of the caller's chat history
+
+    async def lines():
+        started = time.perf_counter()
+        errors = 0
+        try:
+            async for index, result in arun_rag_batch(questions, **params):
+                errors += "error" in result
+                yield json.dumps({"index": index, "question": questions[index], **result}) + "\n"
+        except Exception as e:
+            errors += 1
+            yield json.dumps({"error": str(e)}) + "\n"
+        yield json.dumps({"done": True, "questions": len(questions), "errors": errors,
+                          "seconds": round(time.perf_counter() - started, 3)}) + "\n"
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers=headers)
+
+
+@app.post("/admin/reload")
+def reload_clients(request: Request):
+    """Rebuild the shared RAG clients (e.g. after a re-index). HR only."""
+    session_id = request.cookies.get("session")
+    user = _session_store.get(session_id) if session_id else None
+    if not user:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authenticated")
+    roles_list = [(r or "").lower() for r in (user.get("roles") or [])]
+    if not any(r in ("hr", "human resources") for r in roles_list):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="HR role required")
+    try:
+        registry.reload()
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    return JSONResponse(registry.health())
+
+
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+
+def _encode_history_cursor(message) -> str:
+    raw = f"{message.timestamp.isoformat()}|{message.id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def _decode_history_cursor(cursor: str):
+    try:
+        ts, message_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").rsplit("|", 1)
+        return datetime.fromisoformat(ts), int(message_id)
+    except (ValueError, UnicodeError):
+        raise HTTPException(status_code=400, detail="Invalid history cursor")
+
+
+async def _await_own_history(request: Request):
+    """Read-your-writes for the caller: wait for their own queued chat messages, not the whole queue."""
+    session_id = request.cookies.get("session")
+    user = _session_store.get(session_id) if session_id else None
+    username = (user or {}).get("email")
+    if username and history_writer.pending(username):
+        await run_in_threadpool(history_writer.flush, 1.0, username)
 
 
 @app.get('/history')
-async def get_history(department: str):
-    """Return a list of recent user questions (threads) for the given department.
+async def get_history(request: Request, department: str, limit: int = HISTORY_PAGE_SIZE, cursor: Optional[str] = None, answers: bool = False):
+    """Return a page of recent user questions (threads) for the given department.
 
     Each item corresponds to a single user question (role='user') so the frontend
     shows questions as the history list. The frontend can then request the
     matching Q/A pair using the message id.
+
+    Pages are newest first and keyset-paginated on (timestamp, id): pass the
+    `X-Next-Cursor` response header back as `cursor` to fetch the next page
+    (the header is absent on the last page). With `answers=true` each item also
+    carries its reply, fetched for the whole page in one query on turn_id.
     """
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    # include the exchange the caller just had answered (it may still be in the write-behind queue)
+    await _await_own_history(request)
     session = db.SessionLocal()
     try:
-        rows = (
-            session.query(db.ChatMessage)
-            .filter(db.ChatMessage.department == (department or "").lower(), db.ChatMessage.role == 'user')
-            .order_by(db.ChatMessage.timestamp.desc())
-            .all()
-        )
-        out = [{"message_id": m.id, "session_id": m.session_id, "question": (m.content or "")[:400], "timestamp": m.timestamp.isoformat()} for m in rows]
-        return JSONResponse(out)
+        before = _decode_history_cursor(cursor) if cursor else None
+        # one extra row tells us whether a next page exists
+        rows = db.fetch_question_page(session, (department or "").lower(), limit + 1, before=before)
+        page = rows[:limit]
+        out = [{"message_id": m.id, "session_id": m.session_id, "question": (m.content or "")[:400], "timestamp": m.timestamp.isoformat()} for m in page]
+        if answers and page:
+            replies = db.fetch_replies(session, [m.turn_id for m in page])
+            for item, m in zip(out, page):
+                reply = replies.get(m.turn_id)
+                item["answer"] = reply.content if reply else None
+        headers = {"X-Next-Cursor": _encode_history_cursor(page[-1])} if len(rows) > limit else None
+        return JSONResponse(out, headers=headers)
     finally:
         session.close()
 
 
 @app.get('/history/thread/{user_message_id}')
-async def get_history_thread(user_message_id: int, department: str):
+async def get_history_thread(request: Request, user_message_id: int, department: str):
     """Return the user question and the immediate assistant reply for the given user message id and department.
 
     This keeps history items concise (one entry per question) while allowing
     the frontend to show the full Q/A when clicked.
     """
+    await _await_own_history(request)
+    department = (department or "").lower()
     session = db.SessionLocal()
     try:
-        user_msg = session.query(db.ChatMessage).filter(db.ChatMessage.id == user_message_id, db.ChatMessage.role == 'user', db.ChatMessage.department == (department or "").lower()).first()
+        # question and reply share a turn_id: one indexed lookup for the whole exchange
+        rows = db.fetch_turn(session, user_message_id, department)
+        user_msg = next((m for m in rows if m.role == 'user'), None)
         if not user_msg:
             return JSONResponse([], status_code=404)
-
-        # find the first assistant reply after the user message with same session_id
-        assistant_msg = session.query(db.ChatMessage).filter(
-            db.ChatMessage.session_id == user_msg.session_id,
-            db.ChatMessage.role == 'assistant',
-            db.ChatMessage.department == (department or "").lower(),
-            db.ChatMessage.timestamp >= user_msg.timestamp
-        ).order_by(db.ChatMessage.timestamp.asc()).first()
+        assistant_msg = next((m for m in rows if m.role == 'assistant'), None)
 
         out = []
         out.append({"role": "user", "content": user_msg.content, "timestamp": user_msg.timestamp.isoformat()})
@@ -0,0 +1 @@
+"""Offline benchmarks for ingest, retrieval, generation and chat history (see run.py)."""
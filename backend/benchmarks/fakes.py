@@ -0,0 +1,134 @@
+import asyncio
+import hashlib
+import math
+import re
+import time
+from typing import Any, AsyncIterator, List
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic offline embeddings: hashed bag of words, L2-normalised.
+
+    Texts sharing words get similar vectors, so retrieval rankings are meaningful.
+    `latency_ms` is paid once per call and `per_text_ms` per input text, to model a
+    remote embedding API.
+    """
+
+    def __init__(self, dim: int = 256, latency_ms: float = 0.0, per_text_ms: float = 0.0):
+        self.dim = dim
+        self.latency_ms = latency_ms
+        self.per_text_ms = per_text_ms
+        self.calls = 0
+        self.texts = 0
+
+    def _vector(self, text: str) -> List[float]:
+        vec = [0.0] * self.dim
+        for word in re.findall(r"\w+", (text or "").lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dim
+            vec[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+        return [v / norm for v in vec]
+
+    def _delay(self, n: int) -> float:
+        self.calls += 1
+        self.texts += n
+        return (self.latency_ms + self.per_text_ms * n) / 1000
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self._delay(len(texts)))
+        return [self._vector(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        time.sleep(self._delay(1))
+        return self._vector(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self._delay(len(texts)))
+        return [self._vector(t) for t in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        await asyncio.sleep(self._delay(1))
+        return self._vector(text)
+
+
+def _prompt_text(messages: Any) -> str:
+    if isinstance(messages, str):
+        return messages
+    parts = []
+    for m in messages or []:
+        parts.append(m.get("content", "") if isinstance(m, dict) else str(getattr(m, "content", m)))
+    return "\n".join(parts)
+
+
+class FakeChatModel:
+    """Offline stand-in for the Gemini chat model with configurable latency.
+
+    Supports the calls the RAG pipeline makes: `invoke` / `ainvoke`, `astream`, and
+    `with_structured_output(schema)`. Latency is `latency_ms` to the first token plus
+    `per_token_ms` for each output word, so prompt size and answer length show up.
+    """
+
+    def __init__(self, latency_ms: float = 300.0, per_token_ms: float = 0.0, answer_words: int = 60):
+        self.latency_ms = latency_ms
+        self.per_token_ms = per_token_ms
+        self.answer_words = answer_words
+        self.calls = 0
+        self.prompt_chars = 0
+
+    def _answer(self, messages: Any) -> str:
+        prompt = _prompt_text(messages)
+        self.calls += 1
+        self.prompt_chars += len(prompt)
+        if "confidence" in prompt.lower() and "0-100" in prompt:
+            return "82"
+        if "Return ONLY valid JSON" in prompt:
+            return '{"suggested_follow_ups": ["Who approves this?", "Is there a limit?"], "next_steps": "Raise a request on the HR portal."}'
+        words = re.findall(r"\w+", prompt)[-self.answer_words:] or ["policy"]
+        return " ".join(words)
+
+    def _delay(self, text: str) -> float:
+        return (self.latency_ms + self.per_token_ms * len(text.split())) / 1000
+
+    def invoke(self, messages: Any, *args, **kwargs) -> AIMessage:
+        text = self._answer(messages)
+        time.sleep(self._delay(text))
+        return AIMessage(content=text)
+
+    async def ainvoke(self, messages: Any, *args, **kwargs) -> AIMessage:
+        text = self._answer(messages)
+        await asyncio.sleep(self._delay(text))
+        return AIMessage(content=text)
+
+    async def astream(self, messages: Any, *args, **kwargs) -> AsyncIterator[AIMessageChunk]:
+        text = self._answer(messages)
+        await asyncio.sleep(self.latency_ms / 1000)
+        for word in text.split():
+            await asyncio.sleep(self.per_token_ms / 1000)
+            yield AIMessageChunk(content=word + " ")
+
+    def with_structured_output(self, schema):
+        return _FakeStructured(self, schema)
+
+
+class _FakeStructured:
+    def __init__(self, model: FakeChatModel, schema):
+        self.model = model
+        self.schema = schema
+
+    def _build(self, text: str):
+        return self.schema(
+            answer=text,
+            suggested_follow_ups=["Who approves this?", "Is there a limit?"],
+            next_steps="Raise a request on the HR portal.",
+            confidence=82,
+        )
+
+    def invoke(self, messages: Any, *args, **kwargs):
+        return self._build(self.model.invoke(messages).content)
+
+    async def ainvoke(self, messages: Any, *args, **kwargs):
+        return self._build((await self.model.ainvoke(messages)).content)
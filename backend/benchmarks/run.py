@@ -0,0 +1,410 @@
+"""Offline end-to-end benchmarks with deterministic fake embeddings and chat model.
+
+Nothing here calls Gemini or needs a running server. Every run works in a scratch
+directory (docs/ copy, vector store, chat_history.db), so the real data is never touched.
+
+    python -m backend.benchmarks.run                          # all suites, default sizes
+    python -m backend.benchmarks.run --suites rag --llm-latency-ms 800 --iterations 200
+    python -m backend.benchmarks.run --history-sizes 10000,100000,1000000
+    python -m backend.benchmarks.run --compare bench_results/<baseline>.json
+
+Results are written as JSON (default: bench_results/<commit>-<time>.json) so runs can
+be compared between commits with --compare.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+SUITES = ("ingest", "retrieval", "rag", "history")
+
+# (question, department, country) mix: semantic questions plus policy-ID / keyword lookups
+SAMPLE_QUESTIONS = [
+    ("How many days of sick leave do I get?", "hr", "india"),
+    ("What is the notice period when I resign?", "hr", "foreign"),
+    ("Can I claim travel expenses for client visits?", "finance", "india"),
+    ("How do I request a salary advance?", "finance", "foreign"),
+    ("What are the password rules for company laptops?", "it", "india"),
+    ("Can I install my own software on my work laptop?", "it", "foreign"),
+    ("Who approves a product release?", "product", "india"),
+    ("How is customer data handled during testing?", "product", "foreign"),
+    ("What are the working hours?", "hr", "india"),
+    ("FIN004", "finance", "india"),
+    ("IJP policy", "hr", "india"),
+    ("Form 16", "finance", "india"),
+]
+HISTORY_DEPARTMENTS = ["hr", "finance", "it", "product", "sales", "operations"]
+
+
+def _percentiles(samples_ms: List[float]) -> Dict[str, float]:
+    arr = np.asarray(samples_ms, dtype=np.float64)
+    if arr.size == 0:
+        return {"count": 0}
+    return {
+        "count": int(arr.size),
+        "mean_ms": round(float(arr.mean()), 3),
+        "p50_ms": round(float(np.percentile(arr, 50)), 3),
+        "p95_ms": round(float(np.percentile(arr, 95)), 3),
+        "p99_ms": round(float(np.percentile(arr, 99)), 3),
+        "max_ms": round(float(arr.max()), 3),
+    }
+
+
+def _timed(fn: Callable, *args, **kwargs) -> Tuple[Any, float]:
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return ""
+
+
+# --- setup ---
+
+def _prepare_docs(source: str, target: str, scale: int) -> Dict[str, Any]:
+    """Copy docs/ into the scratch dir; `scale` > 1 adds renamed copies of every text/CSV file.
+
+    Copies get distinct policy IDs and a marker line, so their chunks are new content
+    (the content-addressed chunk store would otherwise skip embedding them).
+    """
+    os.makedirs(target, exist_ok=True)
+    files = sorted(f for f in os.listdir(source) if os.path.isfile(os.path.join(source, f)))
+    for f in files:
+        shutil.copy2(os.path.join(source, f), os.path.join(target, f))
+    for copy in range(1, scale):
+        for f in files:
+            stem, ext = os.path.splitext(f)
+            if ext.lower() not in (".csv", ".txt") or f.lower() == "metadata.csv":
+                continue
+            with open(os.path.join(source, f), encoding="utf-8-sig", errors="replace") as fh:
+                lines = fh.read().splitlines()
+            if ext.lower() == ".csv" and lines:
+                # suffix the first column (policy_id) of every data row
+                lines = [lines[0]] + [line.replace(",", f"-C{copy},", 1) for line in lines[1:]]
+            else:
+                lines.append(f"(benchmark copy {copy})")
+            with open(os.path.join(target, f"{stem}__copy{copy}{ext}"), "w", encoding="utf-8") as fh:
+                fh.write("\n".join(lines) + "\n")
+    return {"files": len(os.listdir(target)), "bytes": sum(os.path.getsize(os.path.join(target, f)) for f in os.listdir(target))}
+
+
+def _install_fakes(args):
+    from backend.benchmarks.fakes import FakeChatModel, FakeEmbeddings
+    from backend.clients import registry
+    from backend import ingest
+
+    embeddings = FakeEmbeddings(dim=args.embed_dim, latency_ms=args.embed_latency_ms, per_text_ms=args.embed_per_text_ms)
+    llm = FakeChatModel(latency_ms=args.llm_latency_ms, per_token_ms=args.llm_per_token_ms)
+    registry.override("embeddings", lambda: embeddings)
+    registry.override("llm", lambda: llm)
+    # ingest builds its own (uncached) embedding client
+    ingest.get_embeddings = lambda cached=True: embeddings
+    return embeddings, llm
+
+
+# --- suites ---
+
+def bench_ingest(args, embeddings) -> Dict[str, Any]:
+    from backend import ingest
+    from backend.clients import registry
+
+    out: Dict[str, Any] = {}
+    for workers in sorted({1, args.workers or os.cpu_count() or 1}):
+        (docs, _), ms = _timed(ingest.load_documents, workers=workers)
+        out[f"load_documents_workers_{workers}"] = {
+            "documents": len(docs), "seconds": round(ms / 1000, 3),
+            "docs_per_sec": round(len(docs) / (ms / 1000), 2) if ms else 0.0,
+        }
+
+    texts_before = embeddings.texts
+    _, ms = _timed(ingest.ingest, rebuild=True)
+    registry.reload()
+    chunks = registry.vectorstore()._collection.count()
+    out["full_ingest"] = {
+        "chunks": chunks, "seconds": round(ms / 1000, 3),
+        "chunks_per_sec": round(chunks / (ms / 1000), 2) if ms else 0.0,
+        "texts_embedded": embeddings.texts - texts_before,
+    }
+
+    texts_before = embeddings.texts
+    _, ms = _timed(ingest.ingest)
+    out["incremental_ingest_unchanged"] = {"seconds": round(ms / 1000, 3), "texts_embedded": embeddings.texts - texts_before}
+    return out
+
+
+def _ensure_index():
+    from backend import ingest
+    from backend.clients import registry
+    if not os.path.exists(ingest.VECTOR_DIR):
+        ingest.ingest(rebuild=True)
+    registry.reload()
+
+
+def bench_retrieval(args) -> Dict[str, Any]:
+    from backend.rag_pipeline import lexical_fast_path, retrieve_documents
+
+    _ensure_index()
+    vector_ms, lexical_ms, docs_returned = [], [], []
+    fast_path_hits = 0
+    for i in range(args.iterations):
+        question, department, country = SAMPLE_QUESTIONS[i % len(SAMPLE_QUESTIONS)]
+        (docs, _), ms = _timed(retrieve_documents, question, department, country=country, role="employee")
+        vector_ms.append(ms)
+        docs_returned.append(len(docs))
+        fast, ms = _timed(lexical_fast_path, question, department, country=country, role="employee")
+        if fast:
+            fast_path_hits += 1
+            lexical_ms.append(ms)
+    return {
+        "retrieve_documents": _percentiles(vector_ms),
+        "lexical_fast_path_hits": _percentiles(lexical_ms),
+        "fast_path_hit_rate": round(fast_path_hits / args.iterations, 4) if args.iterations else 0.0,
+        "avg_docs": round(float(np.mean(docs_returned)), 2) if docs_returned else 0.0,
+    }
+
+
+def bench_rag(args, llm) -> Dict[str, Any]:
+    from backend.config import settings
+    from backend.answer_cache import answer_cache
+    from backend.context_budget import context_budgeter
+    from backend.history_writer import history_writer
+    from backend.rag_pipeline import run_rag
+
+    _ensure_index()
+    out: Dict[str, Any] = {}
+    cache_enabled = settings.ANSWER_CACHE_ENABLED
+
+    def run(label: str, iterations: int):
+        samples = []
+        calls_before, chars_before = llm.calls, llm.prompt_chars
+        for i in range(iterations):
+            question, department, country = SAMPLE_QUESTIONS[i % len(SAMPLE_QUESTIONS)]
+            _, ms = _timed(run_rag, question, department, "employee", username=f"bench_user_{i % 20}", country=country)
+            samples.append(ms)
+        out[label] = _percentiles(samples)
+        out[label]["llm_calls_per_request"] = round((llm.calls - calls_before) / iterations, 3) if iterations else 0.0
+        out[label]["prompt_chars_per_request"] = round((llm.prompt_chars - chars_before) / iterations, 1) if iterations else 0.0
+
+    try:
+        settings.ANSWER_CACHE_ENABLED = False
+        run("run_rag_uncached", args.iterations)
+        settings.ANSWER_CACHE_ENABLED = True
+        answer_cache.invalidate()
+        run("run_rag_cached", args.iterations)
+    finally:
+        settings.ANSWER_CACHE_ENABLED = cache_enabled
+    history_writer.flush(timeout=10)
+    out["context_budget"] = context_budgeter.stats()
+    out["history_writer"] = history_writer.stats()
+    return out
+
+
+def _build_history_db(path: str, messages: int, seed: int = 7):
+    """Synthetic chat_history.db with `messages` rows: question/answer turns across departments."""
+    from backend import db
+
+    if os.path.exists(path):
+        os.remove(path)
+    engine = db.create_history_engine(f"sqlite:///{path}")
+    db.migrate(engine)
+    engine.dispose()
+
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+    rows = []
+    for turn in range(messages // 2):
+        ts = start + timedelta(seconds=turn * 30 + rng.randint(0, 20))
+        session_id = f"user{rng.randint(0, max(1, messages // 40))}@example.com"
+        department = rng.choice(HISTORY_DEPARTMENTS)
+        turn_id = f"bench-{turn}"
+        question = f"Question {turn} about {rng.choice(['leave', 'payroll', 'laptops', 'travel', 'release'])} policy?"
+        rows.append((session_id, "user", question, department, turn_id, ts.strftime("%Y-%m-%d %H:%M:%S.%f")))
+        ts += timedelta(seconds=2)
+        rows.append((session_id, "assistant", f"Answer to question {turn}. " * 8, department, turn_id, ts.strftime("%Y-%m-%d %H:%M:%S.%f")))
+        if len(rows) >= 50000:
+            conn.executemany("INSERT INTO messages (session_id, role, content, department, turn_id, timestamp) VALUES (?, ?, ?, ?, ?, ?)", rows)
+            rows = []
+    if rows:
+        conn.executemany("INSERT INTO messages (session_id, role, content, department, turn_id, timestamp) VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.close()
+
+
+def bench_history(args, workdir: str) -> Dict[str, Any]:
+    from sqlalchemy.orm import sessionmaker
+    from backend import db
+
+    out: Dict[str, Any] = {}
+    for size in args.history_sizes:
+        path = os.path.join(workdir, f"history_{size}.db")
+        _, build_ms = _timed(_build_history_db, path, size)
+        engine = db.create_history_engine(f"sqlite:///{path}")
+        Session = sessionmaker(bind=engine)
+        session = Session()
+        try:
+            first, deep, with_answers, thread = [], [], [], []
+            department = "hr"
+            latest = db.fetch_question_page(session, department, 1)
+            # a cursor halfway back in time: deep pages must cost the same as the first
+            probe = session.query(db.ChatMessage).filter(
+                db.ChatMessage.department == department, db.ChatMessage.role == "user"
+            ).order_by(db.ChatMessage.id).offset(size // (4 * len(HISTORY_DEPARTMENTS))).first()
+            before = (probe.timestamp, probe.id) if probe else None
+            for _ in range(args.history_iterations):
+                page, ms = _timed(db.fetch_question_page, session, department, 51)
+                first.append(ms)
+                _, ms = _timed(db.fetch_question_page, session, department, 51, before=before)
+                deep.append(ms)
+                started = time.perf_counter()
+                db.fetch_replies(session, [m.turn_id for m in page[:50]])
+                with_answers.append((time.perf_counter() - started) * 1000)
+                if latest:
+                    _, ms = _timed(db.fetch_turn, session, latest[0].id, department)
+                    thread.append(ms)
+                session.expire_all()
+        finally:
+            session.close()
+            engine.dispose()
+        out[str(size)] = {
+            "build_seconds": round(build_ms / 1000, 2),
+            "db_mb": round(os.path.getsize(path) / 1e6, 1),
+            "first_page": _percentiles(first),
+            "deep_page": _percentiles(deep),
+            "page_answers": _percentiles(with_answers),
+            "thread": _percentiles(thread),
+        }
+        print(f"🗄️ history {size}: first page p50 {out[str(size)]['first_page'].get('p50_ms')} ms, "
+              f"deep page p50 {out[str(size)]['deep_page'].get('p50_ms')} ms")
+    return out
+
+
+# --- comparison ---
+
+def _flatten(tree: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat: Dict[str, float] = {}
+    for key, value in tree.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = float(value)
+    return flat
+
+
+def compare(current: Dict[str, Any], baseline_path: str, threshold: float = 0.10):
+    """Print metrics (latencies, durations, throughputs) that moved more than `threshold`."""
+    with open(baseline_path, encoding="utf-8") as fh:
+        baseline = json.load(fh)
+    now, then = _flatten(current.get("results", {})), _flatten(baseline.get("results", {}))
+    print(f"📊 Compared with {baseline_path} ({baseline.get('meta', {}).get('commit', '')[:12]})")
+    for name in sorted(set(now) & set(then)):
+        if not name.endswith(("_ms", "seconds", "_per_sec")) or not then[name]:
+            continue
+        change = (now[name] - then[name]) / then[name]
+        if abs(change) >= threshold:
+            better = change < 0 if not name.endswith("_per_sec") else change > 0
+            print(f"  {'✅' if better else '⚠️'} {name}: {then[name]:g} → {now[name]:g} ({change:+.0%})")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Offline benchmarks (fake embeddings / chat model)")
+    parser.add_argument("--suites", default=",".join(SUITES), help=f"comma-separated subset of {','.join(SUITES)}")
+    parser.add_argument("--docs", default=os.path.join(REPO_ROOT, "docs"), help="source documents directory")
+    parser.add_argument("--scale", type=int, default=1, help="replicate text/CSV documents this many times")
+    parser.add_argument("--iterations", type=int, default=100, help="requests per retrieval / run_rag measurement")
+    parser.add_argument("--workers", type=int, default=0, help="load_documents process count (0 = CPU count)")
+    parser.add_argument("--embed-dim", type=int, default=256)
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="fake embedding latency per call")
+    parser.add_argument("--embed-per-text-ms", type=float, default=0.0, help="fake embedding latency per text")
+    parser.add_argument("--llm-latency-ms", type=float, default=50.0, help="fake chat model latency per call")
+    parser.add_argument("--llm-per-token-ms", type=float, default=0.0, help="fake chat model latency per output word")
+    parser.add_argument("--history-sizes", default="10000,100000", help="synthetic chat history sizes (messages)")
+    parser.add_argument("--history-iterations", type=int, default=50)
+    parser.add_argument("--workdir", default=None, help="scratch directory (default: a new temp dir, removed afterwards)")
+    parser.add_argument("--out", default=None, help="result JSON path")
+    parser.add_argument("--compare", default=None, help="baseline result JSON to compare against")
+    args = parser.parse_args(argv)
+    args.history_sizes = [int(s) for s in args.history_sizes.split(",") if s.strip()]
+    suites = [s.strip() for s in args.suites.split(",") if s.strip()]
+    unknown = set(suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suites: {', '.join(sorted(unknown))}")
+
+    commit = _git_commit()
+    out_path = os.path.abspath(args.out or os.path.join(
+        REPO_ROOT, "bench_results", f"{commit[:12] or 'local'}-{datetime.now().strftime('%Y%m%dT%H%M%S')}.json"))
+
+    workdir = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="hr-bench-"))
+    os.makedirs(workdir, exist_ok=True)
+    # settings need these at import time; the fakes never use them
+    for var in ("GEMINI_API_KEY", "MONGO_URI", "DB_NAME"):
+        os.environ.setdefault(var, "offline-benchmark")
+    sys.path.insert(0, REPO_ROOT)
+    previous_cwd = os.getcwd()
+    os.chdir(workdir)  # backend modules use relative paths (docs/, backend/vectorstore, chat_history.db)
+    try:
+        corpus = _prepare_docs(args.docs, os.path.join(workdir, "docs"), args.scale)
+        embeddings, llm = _install_fakes(args)
+
+        results: Dict[str, Any] = {}
+        for suite in suites:
+            print(f"⏱️ Running {suite} benchmarks...")
+            started = time.perf_counter()
+            if suite == "ingest":
+                results[suite] = bench_ingest(args, embeddings)
+            elif suite == "retrieval":
+                results[suite] = bench_retrieval(args)
+            elif suite == "rag":
+                results[suite] = bench_rag(args, llm)
+            elif suite == "history":
+                results[suite] = bench_history(args, workdir)
+            print(f"✅ {suite} done in {time.perf_counter() - started:.1f}s")
+    finally:
+        os.chdir(previous_cwd)
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "commit": commit,
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "corpus": corpus,
+            "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare", "workdir")},
+        },
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    with open(out_path, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=2)
+    print(f"📝 Results written to {out_path}")
+    if args.compare:
+        compare(report, args.compare)
+    return report
+
+
+if __name__ == "__main__":
+    main()
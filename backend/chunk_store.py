@@ -0,0 +1,94 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import Any, Dict, Iterable, List, Sequence
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+class ChunkEmbeddingStore:
+    """Persistent content-addressed map: (sha256(chunk text), embedding model) -> vector.
+
+    Ingest looks chunks up here before calling the embedding model, so identical text is
+    embedded once no matter how often it is re-chunked or the vector store is rebuilt.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunk_embeddings ("
+            " hash TEXT NOT NULL, model TEXT NOT NULL, dim INTEGER NOT NULL, vector BLOB NOT NULL,"
+            " created_at REAL NOT NULL, PRIMARY KEY (hash, model))"
+        )
+        self._conn.commit()
+        self.lookups = 0
+        self.hits = 0
+
+    def get_many(self, hashes: Iterable[str], model: str) -> Dict[str, List[float]]:
+        """Return {hash: vector} for the hashes already embedded with `model`."""
+        wanted = list(dict.fromkeys(hashes))
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            # stay well below SQLite's bound-parameter limit
+            for start in range(0, len(wanted), 500):
+                part = wanted[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM chunk_embeddings WHERE model = ? AND hash IN ({','.join('?' * len(part))})",
+                    [model, *part],
+                )
+                for h, blob in rows:
+                    vec = array("f")
+                    vec.frombytes(blob)
+                    found[h] = vec.tolist()
+            self.lookups += len(wanted)
+            self.hits += len(found)
+        return found
+
+    def put_many(self, hashes: Sequence[str], vectors: Sequence[Sequence[float]], model: str):
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunk_embeddings (hash, model, dim, vector, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(h, model, len(v), array("f", v).tobytes(), now) for h, v in zip(hashes, vectors)],
+            )
+            self._conn.commit()
+
+    def gc(self, referenced: Iterable[str], model: str) -> int:
+        """Delete `model`'s entries not referenced by the current index.
+
+        Vectors of other models are kept, so switching embedding backends and back reuses them.
+        """
+        with self._lock:
+            self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS live (hash TEXT PRIMARY KEY)")
+            self._conn.execute("DELETE FROM live")
+            self._conn.executemany("INSERT OR IGNORE INTO live (hash) VALUES (?)", ((h,) for h in referenced))
+            cur = self._conn.execute(
+                "DELETE FROM chunk_embeddings WHERE model = ? AND hash NOT IN (SELECT hash FROM live)", (model,)
+            )
+            self._conn.execute("DELETE FROM live")
+            self._conn.commit()
+            return cur.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM chunk_embeddings").fetchone()[0]
+        return {
+            "entries": entries,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "misses": self.lookups - self.hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
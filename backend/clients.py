@@ -0,0 +1,240 @@
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from langchain_chroma import Chroma
+from langchain_google_genai import ChatGoogleGenerativeAI
+from backend.config import settings
+from backend.embeddings import embedding_model_id, get_embeddings
+from backend.lexical_index import LEXICAL_INDEX_FILE, LexicalIndex
+from backend.numpy_index import NumpyIndex
+from backend.vector_snapshot import SNAPSHOT_DIR, SnapshotError, load_snapshot
+
+# Try several candidate vectorstore directories (ingest and db use different paths)
+VECTORSTORE_CANDIDATES = [
+    "backend/vectorstore",
+    "./chroma_db",
+    "chroma_db",
+    "vectorstore",
+]
+
+# Written by ingest after every (re)build so serving processes can notice a new index
+INDEX_STAMP_FILE = ".index_generation"
+
+# How often (seconds) the registry re-checks the index stamp on the request path
+GENERATION_CHECK_INTERVAL = 2.0
+
+
+def resolve_vectorstore_dir() -> str:
+    for c in VECTORSTORE_CANDIDATES:
+        if os.path.exists(c):
+            return c
+    # fallback to the first candidate (will create when writing)
+    return VECTORSTORE_CANDIDATES[0]
+
+
+def index_generation(persist_dir: str) -> str:
+    """Return the generation token written by the last ingest ("" if none)."""
+    try:
+        with open(os.path.join(persist_dir, INDEX_STAMP_FILE), encoding="utf-8") as fh:
+            return fh.read().strip()
+    except OSError:
+        return ""
+
+
+def new_generation_token() -> str:
+    return f"{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+def bump_index_generation(persist_dir: str, token: Optional[str] = None) -> str:
+    """Mark the index in `persist_dir` as rebuilt; running registries reload on next access.
+
+    Pass `token` to stamp artefacts (the vector snapshot) with the generation before publishing it.
+    """
+    token = token or new_generation_token()
+    os.makedirs(persist_dir, exist_ok=True)
+    tmp_path = os.path.join(persist_dir, INDEX_STAMP_FILE + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as fh:
+        fh.write(token)
+    os.replace(tmp_path, os.path.join(persist_dir, INDEX_STAMP_FILE))
+    return token
+
+
+def _build_llm():
+    return ChatGoogleGenerativeAI(
+        model=settings.CHAT_MODEL,
+        google_api_key=settings.GEMINI_API_KEY,
+        temperature=0
+    )
+
+
+class ClientRegistry:
+    """Builds the embeddings, vector store, BM25 index, chat model (and NumPy index with RETRIEVER=numpy)
+    once and shares them across threads.
+
+    Clients are created lazily (or eagerly via `warm_up()` at app startup) and rebuilt
+    when `reload()` is called or when ingest writes a new index generation stamp.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._clients: Dict[str, Any] = {}
+        self._factories: Dict[str, Callable[[], Any]] = {
+            "embeddings": get_embeddings,
+            "vectorstore": self._build_vectorstore,
+            "llm": _build_llm,
+            "lexical": self._build_lexical_index,
+        }
+        # built on first use instead of in warm_up(); not needed for the registry to be ready
+        self._lazy = set()
+        if settings.RETRIEVER == "numpy":
+            self._factories["numpy_index"] = self._build_numpy_index
+            # searches run on the NumPy index; Chroma only opens if the snapshot is unusable
+            self._lazy.add("vectorstore")
+        self.persist_dir: Optional[str] = None
+        self.generation: Optional[str] = None
+        self.built_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+        self._checked_at = 0.0
+
+    def _build_vectorstore(self):
+        return Chroma(
+            persist_directory=self.persist_dir,
+            embedding_function=self.get("embeddings")
+        )
+
+    def _build_lexical_index(self):
+        index = LexicalIndex.load(os.path.join(self.persist_dir, LEXICAL_INDEX_FILE))
+        if index is None:
+            # store written before ingest saved a BM25 index: build it from the collection
+            index = LexicalIndex.from_collection(self.get("vectorstore")._collection)
+        return index
+
+    def _build_numpy_index(self):
+        index = None
+        if settings.VECTOR_SNAPSHOT:
+            try:
+                index = load_snapshot(os.path.join(self.persist_dir, SNAPSHOT_DIR), embedding=embedding_model_id(),
+                                      generation=self.generation, verify=settings.VECTOR_SNAPSHOT_VERIFY)
+            except SnapshotError as e:
+                print(f"⚠️ Vector snapshot unusable ({e}); loading vectors from Chroma")
+        source = "snapshot (memory-mapped)"
+        if index is None:
+            index = NumpyIndex.from_collection(self.get("vectorstore")._collection)
+            source = "Chroma"
+        print(f"🧮 NumPy index: {len(index)} chunks in {len(index.partitions)} partitions from {source}")
+        return index
+
+    def _check_generation(self):
+        now = time.monotonic()
+        if now - self._checked_at < GENERATION_CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        persist_dir = resolve_vectorstore_dir()
+        if persist_dir != self.persist_dir or index_generation(persist_dir) != self.generation:
+            with self._lock:
+                # another thread may already have reloaded
+                if persist_dir != self.persist_dir or index_generation(persist_dir) != self.generation:
+                    # the embedding client (and its query cache) does not depend on the index
+                    self._reset(keep=("embeddings",))
+
+    def _reset(self, keep=()):
+        self._clients = {name: c for name, c in self._clients.items() if name in keep}
+        self.persist_dir = resolve_vectorstore_dir()
+        self.generation = index_generation(self.persist_dir)
+        self.built_at = None
+
+    def get(self, name: str):
+        self._check_generation()
+        client = self._clients.get(name)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(name)
+            if client is None:
+                if self.persist_dir is None:
+                    self._reset()
+                try:
+                    client = self._factories[name]()
+                except Exception as e:
+                    self.last_error = f"{name}: {e}"
+                    raise
+                self._clients[name] = client
+                if self.built_at is None:
+                    self.built_at = datetime.utcnow()
+            return client
+
+    def embeddings(self):
+        return self.get("embeddings")
+
+    def vectorstore(self):
+        return self.get("vectorstore")
+
+    def llm(self):
+        return self.get("llm")
+
+    def lexical(self):
+        return self.get("lexical")
+
+    def numpy_index(self):
+        return self.get("numpy_index")
+
+    def warm_up(self):
+        """Eagerly build every client (call from app startup)."""
+        with self._lock:
+            if self.persist_dir is None:
+                self._reset()
+            for name in self._factories:
+                if name not in self._lazy:
+                    self.get(name)
+            self.last_error = None
+
+    def reload(self):
+        """Drop all clients and rebuild them against the current index."""
+        with self._lock:
+            self._reset()
+            self.warm_up()
+
+    def override(self, name: str, factory: Callable[[], Any]):
+        """Replace a client factory (e.g. fakes for benchmarks) and drop the cached instance."""
+        with self._lock:
+            self._factories[name] = factory
+            self._clients.pop(name, None)
+            if name == "embeddings":
+                self._clients.pop("vectorstore", None)
+
+    def embedding_cache_stats(self) -> Optional[Dict[str, Any]]:
+        """Query-embedding cache counters, without building the client."""
+        embeddings = self._clients.get("embeddings")
+        return embeddings.stats() if hasattr(embeddings, "stats") else None
+
+    def health(self) -> Dict[str, Any]:
+        """Readiness report: every (non-lazy) client built and the vector store answering."""
+        clients = {name: name in self._clients for name in self._factories}
+        documents = None
+        error = self.last_error
+        if clients.get("vectorstore"):
+            try:
+                documents = self._clients["vectorstore"]._collection.count()
+            except Exception as e:
+                error = f"vectorstore: {e}"
+        elif clients.get("numpy_index"):
+            documents = len(self._clients["numpy_index"])
+        embedding_cache = self.embedding_cache_stats()
+        return {
+            "ready": all(built for name, built in clients.items() if name not in self._lazy) and error is None,
+            "clients": clients,
+            "persist_dir": self.persist_dir,
+            "index_generation": self.generation,
+            "documents": documents,
+            "built_at": self.built_at.isoformat() if self.built_at else None,
+            "embedding_cache": embedding_cache,
+            "numpy_index": self._clients["numpy_index"].stats() if "numpy_index" in self._clients else None,
+            "error": error,
+        }
+
+
+registry = ClientRegistry()
@@ -15,6 +15,79 @@ class Settings(BaseSettings):
     # 🧠 Vectorstore
     VECTORSTORE_DIR: str = "vectorstore"
 
+    # 🤖 Models
+    # "google" (Gemini API) or "local" (offline hashed word/bigram vectors, see local_embeddings.py).
+    # Serving and ingest must agree; ingest rebuilds the vector store when this changes.
+    EMBEDDING_BACKEND: str = "google"
+    EMBEDDING_MODEL: str = "models/embedding-001"
+    LOCAL_EMBEDDING_DIM: int = 384
+    CHAT_MODEL: str = "gemini-2.5-flash"
+    # "single": one schema-constrained call; "multi": answer + evaluator + JSON restructuring calls
+    GENERATION_MODE: str = "single"
+    # Threads for blocking work (Chroma search, SQLite) on the async /query path
+    RAG_BLOCKING_WORKERS: int = 16
+    # /query/batch: most questions per request, answers generated at once
+    RAG_BATCH_MAX_QUESTIONS: int = 500
+    RAG_BATCH_CONCURRENCY: int = 8
+
+    # 📥 Ingest: processes used to parse docs/ (0 = one per CPU)
+    INGEST_WORKERS: int = 0
+    # Embedding stage: chunks per request, concurrent requests, retries on quota errors
+    EMBED_BATCH_SIZE: int = 64
+    EMBED_MAX_IN_FLIGHT: int = 4
+    EMBED_MAX_RETRIES: int = 6
+
+    # ⚡ Query-embedding cache (memory LRU + SQLite write-through)
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_SIZE: int = 2048
+    EMBEDDING_CACHE_TTL: int = 7 * 24 * 3600
+    EMBEDDING_CACHE_PATH: str = "embedding_cache.db"
+
+    # 💬 Answer cache for run_rag (exact + semantic match, per department/role/country)
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_THRESHOLD: float = 0.95
+    ANSWER_CACHE_TTL: int = 3600
+    ANSWER_CACHE_SIZE: int = 256
+
+    # 🔎 Retrieval: "vector" (Chroma only) or "hybrid" (BM25 + vector, rank-fused)
+    RETRIEVAL_MODE: str = "vector"
+    # Vector search engine: "chroma" or "numpy" (exact in-memory search, see numpy_index.py)
+    RETRIEVER: str = "chroma"
+    # Ingest exports a memory-mappable snapshot (vector_snapshot.py) that RETRIEVER=numpy serves from;
+    # float16 halves the file, float32 is scored without conversion. Loading checks the metadata checksum
+    # and the vector file size; VERIFY also hashes the whole vector file (slower startup, grows with the index).
+    VECTOR_SNAPSHOT: bool = True
+    VECTOR_SNAPSHOT_DTYPE: str = "float32"
+    VECTOR_SNAPSHOT_VERIFY: bool = False
+    # Answer policy-ID / exact keyword queries from the BM25 index without an embedding call
+    LEXICAL_FAST_PATH: bool = True
+
+    # 🧮 Prompt context: estimated-token budget and near-duplicate (shingle Jaccard) threshold
+    CONTEXT_TOKEN_BUDGET: int = 3000
+    CONTEXT_DEDUP_THRESHOLD: float = 0.85
+
+    # 📝 Chat history write-behind: batch commits off the request path
+    HISTORY_WRITE_BEHIND: bool = True
+    HISTORY_FLUSH_INTERVAL: float = 0.05
+    HISTORY_BATCH_SIZE: int = 256
+    HISTORY_QUEUE_SIZE: int = 10000
+
+    # 🔑 Login sessions: "sqlite" (shared by all worker processes) or "memory" (single process)
+    SESSION_BACKEND: str = "sqlite"
+    SESSION_DB_PATH: str = "sessions.db"
+    SESSION_TTL: int = 8 * 3600
+    SESSION_MAX_ENTRIES: int = 10000
+    LOGIN_STATE_TTL: int = 600
+    SESSION_SWEEP_INTERVAL: int = 300
+
+    # 📈 Metrics: per-stage latency histograms and counters, served at /metrics (Prometheus text)
+    METRICS_ENABLED: bool = True
+
+    # 🔬 Request profiling: HR users send `X-Profile: 1`; a sample rate profiles random requests too
+    PROFILE_SAMPLE_RATE: float = 0.0
+    PROFILE_INTERVAL_MS: float = 5.0
+    PROFILE_DIR: str = "profiles"
+
     # 🗄 MongoDB
     MONGO_URI: str = Field(..., env="MONGO_URI")
     DB_NAME: str = Field(..., env="DB_NAME")
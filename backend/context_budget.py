@@ -0,0 +1,169 @@
+import math
+import re
+import threading
+from typing import Any, Dict, List, Tuple
+
+from langchain_core.documents import Document
+
+from backend.config import settings
+
+SHINGLE_SIZE = 5
+# Shortest suffix/prefix overlap treated as splitter overlap between two chunks of one file
+MIN_MERGE_OVERLAP = 20
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English prose)."""
+    return math.ceil(len(text or "") / 4)
+
+
+def _shingles(text: str) -> set:
+    words = re.findall(r"\w+", (text or "").lower())
+    if len(words) <= SHINGLE_SIZE:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _merge_text(first: str, second: str):
+    """Join two overlapping chunks into one text, or None when they do not overlap."""
+    if second in first:
+        return first
+    if first in second:
+        return second
+    probe = second[:MIN_MERGE_OVERLAP]
+    start = first.rfind(probe, max(0, len(first) - len(second)))
+    while start >= 0:
+        overlap = len(first) - start
+        if overlap >= MIN_MERGE_OVERLAP and second.startswith(first[start:]):
+            return first + second[overlap:]
+        start = first.rfind(probe, 0, start)
+    return None
+
+
+def _render(doc: Document) -> str:
+    return f"[{doc.metadata.get('policy_name', 'Policy')}]\n{doc.page_content}"
+
+
+class ContextBudgeter:
+    """Turns retrieved chunks into the prompt context.
+
+    1. Near-duplicates (word 5-shingle Jaccard >= `dedup_threshold`, e.g. the India and
+       Foreign versions of one policy) are dropped, keeping the higher-ranked chunk.
+    2. Overlapping splitter chunks of the same file are merged into one passage.
+    3. Chunks are packed in rank order into `token_budget` estimated tokens.
+    The per-request report says how many tokens this saved against joining every chunk.
+    """
+
+    def __init__(self, token_budget: int = 3000, dedup_threshold: float = 0.85):
+        self.token_budget = token_budget
+        self.dedup_threshold = dedup_threshold
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+        self.duplicates_removed = 0
+        self.merged = 0
+        self.dropped_for_budget = 0
+
+    def _dedupe(self, docs: List[Document]) -> Tuple[List[Document], int]:
+        kept: List[Document] = []
+        kept_shingles: List[set] = []
+        removed = 0
+        for doc in docs:
+            shingles = _shingles(doc.page_content)
+            if any(_jaccard(shingles, other) >= self.dedup_threshold for other in kept_shingles):
+                removed += 1
+                continue
+            kept.append(doc)
+            kept_shingles.append(shingles)
+        return kept, removed
+
+    @staticmethod
+    def _merge_overlaps(docs: List[Document]) -> Tuple[List[Document], int]:
+        merged_docs: List[Document] = []
+        merged = 0
+        for doc in docs:
+            meta = doc.metadata or {}
+            for i, kept in enumerate(merged_docs):
+                kept_meta = kept.metadata or {}
+                if kept_meta.get("source") != meta.get("source") or kept_meta.get("record_type") == "policy_row":
+                    continue
+                text = _merge_text(kept.page_content, doc.page_content) or _merge_text(doc.page_content, kept.page_content)
+                if text is not None:
+                    # the merged passage keeps the rank (position) of the better chunk
+                    merged_docs[i] = Document(page_content=text, metadata=dict(kept_meta))
+                    merged += 1
+                    break
+            else:
+                merged_docs.append(doc)
+        return merged_docs, merged
+
+    def _pack(self, docs: List[Document]) -> Tuple[List[str], int]:
+        blocks: List[str] = []
+        used = 0
+        dropped = 0
+        for doc in docs:
+            block = _render(doc)
+            cost = estimate_tokens(block) + 1
+            if used + cost <= self.token_budget:
+                blocks.append(block)
+                used += cost
+            elif not blocks:
+                # never send an empty context: cut the best chunk down to the budget
+                blocks.append(block[:self.token_budget * 4])
+                used = self.token_budget
+            else:
+                dropped += 1
+        return blocks, dropped
+
+    def assemble(self, documents: List[Document]) -> Tuple[str, Dict[str, Any]]:
+        """Return (context, report) for documents in retrieval rank order."""
+        tokens_in = estimate_tokens("\n\n".join(_render(d) for d in documents))
+        unique, duplicates = self._dedupe(documents)
+        merged_docs, merged = self._merge_overlaps(unique)
+        blocks, dropped = self._pack(merged_docs)
+        context = "\n\n".join(blocks)
+        tokens_out = estimate_tokens(context)
+
+        report = {
+            "chunks_in": len(documents),
+            "chunks_out": len(blocks),
+            "duplicates_removed": duplicates,
+            "merged": merged,
+            "dropped_for_budget": dropped,
+            "tokens_in": tokens_in,
+            "tokens_out": tokens_out,
+            "tokens_saved": max(0, tokens_in - tokens_out),
+        }
+        with self._lock:
+            self.requests += 1
+            self.tokens_in += tokens_in
+            self.tokens_out += tokens_out
+            self.duplicates_removed += duplicates
+            self.merged += merged
+            self.dropped_for_budget += dropped
+        return context, report
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "token_budget": self.token_budget,
+            "requests": self.requests,
+            "tokens_in": self.tokens_in,
+            "tokens_out": self.tokens_out,
+            "tokens_saved": self.tokens_in - self.tokens_out,
+            "duplicates_removed": self.duplicates_removed,
+            "merged": self.merged,
+            "dropped_for_budget": self.dropped_for_budget,
+        }
+
+
+context_budgeter = ContextBudgeter(
+    token_budget=settings.CONTEXT_TOKEN_BUDGET,
+    dedup_threshold=settings.CONTEXT_DEDUP_THRESHOLD,
+)
@@ -1,24 +1,17 @@
-import os
-import uuid # Added for unique ID generation if needed
+import uuid
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime
+from sqlalchemy import and_, or_, create_engine, event, Column, Index, Integer, String, Text, DateTime
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from langchain_chroma import Chroma
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_core.documents import Document
-from backend.config import settings
+from backend.embeddings import get_embeddings
+from backend.metrics import timed
 
 # --- 1. Vector Store Configuration (ChromaDB) ---
 VECTORSTORE_DIR = "./chroma_db"
 
-def get_embeddings():
-    return GoogleGenerativeAIEmbeddings(
-        model="models/embedding-001",
-        google_api_key=settings.GEMINI_API_KEY
-    )
-
 def get_vectorstore():
     return Chroma(
         persist_directory=VECTORSTORE_DIR,
@@ -28,43 +21,219 @@ def get_vectorstore():
 # --- 2. Relational Database Configuration (SQLite for History) ---
 # Ensure this matches the database name used in your connection strings
 SQLITE_URL = "sqlite:///./chat_history.db" 
-engine = create_engine(SQLITE_URL, connect_args={"check_same_thread": False})
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """WAL lets readers (history, conversation context) run while answers are being written."""
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")   # durable at checkpoints; safe with WAL
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA cache_size=-16000")    # ~16 MB page cache per connection
+    cursor.close()
+
+
+def create_history_engine(url: str = SQLITE_URL):
+    """SQLite engine for a chat history DB with the connection pragmas applied."""
+    history_engine = create_engine(url, connect_args={"check_same_thread": False})
+    event.listen(history_engine, "connect", _set_sqlite_pragmas)
+    return history_engine
+
+
+engine = create_history_engine(SQLITE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+
 class ChatMessage(Base):
     """Table to store chat history persistent across restarts"""
     __tablename__ = "messages"
+    __table_args__ = (
+        # GET /history: department + role filter, newest first (keyset on timestamp, id)
+        Index("ix_messages_department_role_timestamp", "department", "role", "timestamp"),
+        # conversation context: one session, ordered by time
+        Index("ix_messages_session_timestamp", "session_id", "timestamp"),
+        # /history/thread and answers for a page of questions: all messages of a turn
+        Index("ix_messages_turn_role", "turn_id", "role"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
-    session_id = Column(String, index=True)
+    session_id = Column(String)
     role = Column(String)  # 'user' or 'assistant'
     content = Column(Text)
-    department = Column(String, index=True, nullable=True)
+    department = Column(String, nullable=True)
+    # shared by a question and its answer; set when the exchange is saved
+    turn_id = Column(String, nullable=True)
     timestamp = Column(DateTime, default=datetime.utcnow)
 
-# Create the SQLite tables
-Base.metadata.create_all(bind=engine)
-
-# Ensure backward-compatible migration: add `department` column if it is missing
-try:
-    with engine.connect() as conn:
-        res = conn.execute("PRAGMA table_info(messages);")
-        cols = [row[1] for row in res.fetchall()]
-        if "department" not in cols:
-            conn.execute("ALTER TABLE messages ADD COLUMN department VARCHAR;")
-            print("⚙️ Migrated messages table: added 'department' column")
-except Exception:
-    # If migration fails (older DB without column), remove DB and recreate tables (dev-only fallback)
+
+def new_turn_id() -> str:
+    return uuid.uuid4().hex
+
+
+# --- History queries (shared by the API and the benchmarks) ---
+
+@timed("db_history_page")
+def fetch_question_page(session, department: str, limit: int, before=None):
+    """Up to `limit` user questions for a department, newest first.
+
+    `before` is the (timestamp, id) keyset of the last row of the previous page.
+    Served by ix_messages_department_role_timestamp.
+    """
+    query = session.query(ChatMessage).filter(ChatMessage.department == department, ChatMessage.role == 'user')
+    if before is not None:
+        ts, message_id = before
+        query = query.filter(or_(
+            ChatMessage.timestamp < ts,
+            and_(ChatMessage.timestamp == ts, ChatMessage.id < message_id),
+        ))
+    return query.order_by(ChatMessage.timestamp.desc(), ChatMessage.id.desc()).limit(limit).all()
+
+
+@timed("db_history_replies")
+def fetch_replies(session, turn_ids) -> dict:
+    """First assistant reply per turn_id, for a page of questions in one query."""
+    replies = {}
+    rows = (
+        session.query(ChatMessage)
+        .filter(ChatMessage.turn_id.in_([t for t in turn_ids if t]), ChatMessage.role == 'assistant')
+        .order_by(ChatMessage.timestamp.asc(), ChatMessage.id.asc())
+    )
+    for r in rows:
+        replies.setdefault(r.turn_id, r)
+    return replies
+
+
+@timed("db_history_turn")
+def fetch_turn(session, user_message_id: int, department: str):
+    """All messages of the turn opened by a user message (one indexed query on turn_id)."""
+    turn = (
+        session.query(ChatMessage.turn_id)
+        .filter(ChatMessage.id == user_message_id, ChatMessage.role == 'user', ChatMessage.department == department)
+        .scalar_subquery()
+    )
+    return (
+        session.query(ChatMessage)
+        .filter(ChatMessage.turn_id == turn, ChatMessage.department == department)
+        .order_by(ChatMessage.timestamp.asc(), ChatMessage.id.asc())
+        .all()
+    )
+
+
+# --- Schema migrations (PRAGMA user_version) ---
+
+def _messages_columns(conn):
+    return [row[1] for row in conn.exec_driver_sql("PRAGMA table_info(messages)").fetchall()]
+
+
+def _migrate_v1(conn):
+    """department column (pre-department DBs) and composite indexes replacing single-column ones."""
+    if "department" not in _messages_columns(conn):
+        conn.exec_driver_sql("ALTER TABLE messages ADD COLUMN department VARCHAR")
+        print("⚙️ Migrated messages table: added 'department' column")
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_messages_session_id")
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_messages_department")
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_messages_department_role_timestamp ON messages (department, role, timestamp)"
+    )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_messages_session_timestamp ON messages (session_id, timestamp)"
+    )
+
+
+def _migrate_v2(conn):
+    """turn_id column linking a question to its answer (existing rows: see backfill_turn_ids)."""
+    if "turn_id" not in _messages_columns(conn):
+        conn.exec_driver_sql("ALTER TABLE messages ADD COLUMN turn_id VARCHAR")
+    conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_messages_turn_role ON messages (turn_id, role)")
+
+
+def backfill_turn_ids(bind=None, batch_size: int = 5000) -> int:
+    """Link rows written before turn_id existed into question/answer turns; returns rows updated.
+
+    Within a session, in time order, each user message opens a turn and the first
+    assistant message after it joins that turn (the pairing the old timestamp scan
+    used); any other row gets a turn of its own. Only rows with a NULL turn_id are
+    touched, so the job can be interrupted and re-run.
+    """
+    bind = bind or engine
+    with bind.begin() as conn:
+        # shrinks as rows are linked, so every page is an index seek rather than a rescan
+        conn.exec_driver_sql(
+            "CREATE INDEX IF NOT EXISTS ix_messages_unlinked ON messages (session_id, timestamp, id) WHERE turn_id IS NULL"
+        )
+    updated = 0
+    session_id, open_turn = object(), None
     try:
-        db_path = os.path.join(os.path.dirname(__file__), '..', 'chat_history.db')
-        db_path = os.path.normpath(db_path)
-        if os.path.exists(db_path):
-            os.remove(db_path)
-            print(f"⚠️ Removed existing DB at {db_path} to recreate schema (dev fallback)")
-            Base.metadata.create_all(bind=engine)
-    except Exception:
-        pass
+        while True:
+            with bind.begin() as conn:
+                rows = conn.exec_driver_sql(
+                    "SELECT id, session_id, role FROM messages WHERE turn_id IS NULL"
+                    " ORDER BY session_id, timestamp, id LIMIT ?", (batch_size,)
+                ).fetchall()
+                if not rows:
+                    break
+                links = []
+                for message_id, sid, role in rows:
+                    if sid != session_id:
+                        session_id, open_turn = sid, None
+                    if role == "user":
+                        open_turn = f"legacy-{message_id}"
+                        links.append((open_turn, message_id))
+                    elif role == "assistant" and open_turn:
+                        links.append((open_turn, message_id))
+                        open_turn = None
+                    else:
+                        links.append((f"legacy-{message_id}", message_id))
+                conn.exec_driver_sql("UPDATE messages SET turn_id = ? WHERE id = ?", links)
+                updated += len(links)
+    finally:
+        with bind.begin() as conn:
+            conn.exec_driver_sql("DROP INDEX IF EXISTS ix_messages_unlinked")
+    if updated:
+        print(f"🔗 Linked {updated} existing chat messages into question/answer turns")
+    return updated
+
+
+# Ordered; MIGRATIONS[n - 1] upgrades a database from user_version n - 1 to n
+MIGRATIONS = [_migrate_v1, _migrate_v2]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(bind=None):
+    """Bring the history DB up to SCHEMA_VERSION.
+
+    Fresh databases are created at the current schema; existing ones are upgraded in
+    place and never dropped. Steps are idempotent and user_version is bumped after each
+    one, so a failed upgrade raises and is simply resumed on the next start.
+    """
+    bind = bind or engine
+    with bind.begin() as conn:
+        has_table = conn.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages'"
+        ).first() is not None
+        version = conn.exec_driver_sql("PRAGMA user_version").scalar() or 0
+        if not has_table:
+            Base.metadata.create_all(bind=conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            return
+    for target in range(version + 1, SCHEMA_VERSION + 1):
+        with bind.begin() as conn:
+            MIGRATIONS[target - 1](conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {target}")
+        print(f"⚙️ Chat history schema migrated to version {target}")
+    if version > SCHEMA_VERSION:
+        print(f"⚠️ Chat history DB is at schema version {version}, newer than this code ({SCHEMA_VERSION})")
+
+    # NULL turn_ids sort first in ix_messages_turn_role, so this check is a single index probe
+    with bind.connect() as conn:
+        unlinked = conn.exec_driver_sql("SELECT 1 FROM messages WHERE turn_id IS NULL LIMIT 1").first()
+    if unlinked:
+        backfill_turn_ids(bind)
+
+
+migrate()
 
 # --- 3. Database Seeding Logic ---
 
@@ -109,4 +278,11 @@ def seed_database():
     print(f"✅ Vector Database seeded with {len(sample_policies)} documents.")
 
 if __name__ == "__main__":
-    seed_database()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Seed the sample vector store or maintain the chat history DB")
+    parser.add_argument("--backfill-turns", action="store_true", help="link existing chat messages into question/answer turns")
+    args = parser.parse_args()
+    if args.backfill_turns:
+        backfill_turn_ids()
+    else:
+        seed_database()
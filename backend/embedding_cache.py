@@ -0,0 +1,233 @@
+import asyncio
+import hashlib
+import inspect
+import os
+import re
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+# Gemini embeds documents and queries with different task types; batched questions need the query one
+QUERY_TASK_TYPE = "RETRIEVAL_QUERY"
+
+
+def normalize_query(text: str) -> str:
+    """Normalize a question so trivial variations share one cache entry."""
+    return re.sub(r"\s+", " ", (text or "").strip().lower())
+
+
+def embed_queries(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """The `embed_query` vector of every text, in one model request where the client allows it.
+
+    Clients with their own `embed_queries` use it; clients whose `embed_documents` takes a
+    `task_type` (Gemini) embed the batch as queries; anything else is embedded one by one.
+    """
+    if not texts:
+        return []
+    batch = getattr(embeddings, "embed_queries", None)
+    if batch is not None:
+        return batch(texts)
+    if "task_type" in inspect.signature(embeddings.embed_documents).parameters:
+        return embeddings.embed_documents(texts, task_type=QUERY_TASK_TYPE)
+    return [embeddings.embed_query(text) for text in texts]
+
+
+class CachedEmbeddings(Embeddings):
+    """Query-embedding cache in front of any LangChain `Embeddings`.
+
+    - Memory tier: LRU with TTL.
+    - Disk tier: SQLite table written through on every miss, so entries survive restarts.
+    Document embeddings (ingest) are passed through unchanged.
+    """
+
+    def __init__(self, inner: Embeddings, model_name: str, max_entries: int = 2048,
+                 ttl_seconds: int = 7 * 24 * 3600, db_path: Optional[str] = None):
+        self.inner = inner
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Tuple[List[float], float]]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self.hits_memory = 0
+        self.hits_disk = 0
+        self.misses = 0
+        if db_path:
+            self._open_disk(db_path)
+
+    # --- disk tier ---
+    def _open_disk(self, db_path: str):
+        try:
+            parent = os.path.dirname(os.path.abspath(db_path))
+            os.makedirs(parent, exist_ok=True)
+            conn = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                " key TEXT PRIMARY KEY, model TEXT NOT NULL, vector BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+        except sqlite3.Error as e:
+            print(f"⚠️ Embedding cache disk tier disabled ({db_path}): {e}")
+            self._conn = None
+
+    def _disk_get(self, key: str) -> Optional[Tuple[List[float], float]]:
+        if self._conn is None:
+            return None
+        row = self._conn.execute(
+            "SELECT vector, created_at FROM query_embeddings WHERE key = ?", (key,)
+        ).fetchone()
+        if not row:
+            return None
+        vector = array("f")
+        vector.frombytes(row[0])
+        return vector.tolist(), row[1]
+
+    def _disk_put(self, key: str, vector: List[float], created_at: float):
+        if self._conn is None:
+            return
+        self._conn.execute(
+            "INSERT OR REPLACE INTO query_embeddings (key, model, vector, created_at) VALUES (?, ?, ?, ?)",
+            (key, self.model_name, array("f", vector).tobytes(), created_at),
+        )
+        self._conn.commit()
+
+    # --- cache logic ---
+    def cache_key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model_name}\n{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: List[float], created_at: float):
+        self._memory[key] = (vector, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _memory_lookup(self, key: str) -> Optional[List[float]]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and now - entry[1] < self.ttl_seconds:
+                self._memory.move_to_end(key)
+                self.hits_memory += 1
+                return entry[0]
+            if entry:
+                del self._memory[key]
+        return None
+
+    def _disk_lookup(self, key: str) -> Optional[List[float]]:
+        now = time.time()
+        with self._lock:
+            try:
+                entry = self._disk_get(key)
+            except sqlite3.Error:
+                entry = None
+            if entry and now - entry[1] < self.ttl_seconds:
+                self._remember(key, entry[0], entry[1])
+                self.hits_disk += 1
+                return entry[0]
+        return None
+
+    def lookup(self, text: str) -> Optional[List[float]]:
+        """Return a cached vector without calling the model (None on miss)."""
+        key = self.cache_key(text)
+        vector = self._memory_lookup(key)
+        return vector if vector is not None else self._disk_lookup(key)
+
+    def store(self, text: str, vector: List[float]):
+        key = self.cache_key(text)
+        now = time.time()
+        with self._lock:
+            self._remember(key, vector, now)
+            try:
+                self._disk_put(key, vector, now)
+            except sqlite3.Error as e:
+                print(f"⚠️ Embedding cache write failed: {e}")
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self.lookup(text)
+        if vector is not None:
+            return vector
+        with self._lock:
+            self.misses += 1
+        vector = self.inner.embed_query(text)
+        self.store(text, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self.cache_key(text)
+        loop = asyncio.get_running_loop()
+        vector = self._memory_lookup(key)
+        if vector is None and self._conn is not None:
+            # the SQLite tier is read (and written through, below) off the event loop
+            vector = await loop.run_in_executor(None, self._disk_lookup, key)
+        if vector is not None:
+            return vector
+        with self._lock:
+            self.misses += 1
+        vector = await self.inner.aembed_query(text)
+        await loop.run_in_executor(None, self.store, text, vector)
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """`embed_query` for many texts: hits come from the cache, distinct misses go to the model in one batch."""
+        vectors: List[Optional[List[float]]] = [self.lookup(text) for text in texts]
+        missing: Dict[str, List[int]] = {}
+        for i, vector in enumerate(vectors):
+            if vector is None:
+                missing.setdefault(self.cache_key(texts[i]), []).append(i)
+        if missing:
+            with self._lock:
+                self.misses += len(missing)
+            positions = list(missing.values())
+            fresh = embed_queries(self.inner, [texts[group[0]] for group in positions])
+            for group, vector in zip(positions, fresh):
+                self.store(texts[group[0]], vector)
+                for i in group:
+                    vectors[i] = vector
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.inner.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.inner.aembed_documents(texts)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.hits_memory + self.hits_disk
+        total = hits + self.misses
+        disk_entries = None
+        if self._conn is not None:
+            try:
+                with self._lock:
+                    disk_entries = self._conn.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+            except sqlite3.Error:
+                pass
+        return {
+            "model": self.model_name,
+            "hits_memory": self.hits_memory,
+            "hits_disk": self.hits_disk,
+            "misses": self.misses,
+            "hit_rate": round(hits / total, 4) if total else 0.0,
+            "memory_entries": len(self._memory),
+            "memory_capacity": self.max_entries,
+            "disk_entries": disk_entries,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+    def clear_expired(self) -> int:
+        """Drop expired rows from the disk tier; returns rows removed."""
+        if self._conn is None:
+            return 0
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM query_embeddings WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            self._conn.commit()
+            return cur.rowcount
@@ -0,0 +1,103 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+EmbedFn = Callable[[List[str]], List[List[float]]]
+BatchCallback = Callable[[List[str], List[List[float]]], None]
+
+
+def is_quota_error(exc: Exception) -> bool:
+    """Heuristic for rate-limit / quota / transient errors worth retrying."""
+    text = f"{type(exc).__name__} {exc}".lower()
+    return any(t in text for t in ("429", "quota", "resourceexhausted", "resource exhausted", "rate limit",
+                                   "503", "unavailable", "deadline", "timeout", "temporarily"))
+
+
+class EmbeddingScheduler:
+    """Batched, concurrent embedding of ingest chunks.
+
+    `embed_fn` is any `List[str] -> List[vector]` callable (e.g. `embeddings.embed_documents`,
+    or a local fake in tests). Chunks are split into `batch_size` batches with up to
+    `max_in_flight` batches running at once; failing batches are retried with exponential
+    backoff and jitter. Each finished batch is handed to `on_batch` as it completes (ingest
+    persists it in the ChunkEmbeddingStore, which is what an interrupted run resumes from).
+    """
+
+    def __init__(self, embed_fn: EmbedFn, batch_size: int = 64, max_in_flight: int = 4,
+                 max_retries: int = 5, backoff_base: float = 1.0, backoff_max: float = 60.0,
+                 retry_on: Callable[[Exception], bool] = lambda e: True,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.embed_fn = embed_fn
+        self.batch_size = max(1, batch_size)
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_on = retry_on
+        self.sleep = sleep
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Any] = {}
+
+    # --- embedding ---
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        attempt = 0
+        while True:
+            try:
+                vectors = self.embed_fn(texts)
+                if len(vectors) != len(texts):
+                    raise ValueError(f"embedding returned {len(vectors)} vectors for {len(texts)} texts")
+                return vectors
+            except Exception as e:
+                attempt += 1
+                if attempt > self.max_retries or not self.retry_on(e):
+                    raise
+                delay = min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1)))
+                delay *= 0.5 + random.random() / 2
+                with self._lock:
+                    self.stats["retries"] = self.stats.get("retries", 0) + 1
+                print(f"⏳ Embedding batch failed ({e}); retry {attempt}/{self.max_retries} in {delay:.1f}s")
+                self.sleep(delay)
+
+    def run(self, ids: Sequence[str], texts: Sequence[str], on_batch: Optional[BatchCallback] = None) -> Dict[str, List[float]]:
+        """Embed `texts` (keyed by `ids`); returns {id: vector}.
+
+        `on_batch(ids, vectors)` is called from the calling thread as each batch completes.
+        """
+        if len(ids) != len(texts):
+            raise ValueError("ids and texts must have the same length")
+        started = time.perf_counter()
+        self.stats = {"chunks": len(ids), "embedded": 0, "batches": 0, "retries": 0}
+        results: Dict[str, List[float]] = {}
+
+        pending = list(zip(ids, texts))
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix="embed") as pool:
+            queue = list(reversed(batches))
+            in_flight = {}
+            try:
+                while queue or in_flight:
+                    while queue and len(in_flight) < self.max_in_flight:
+                        batch = queue.pop()
+                        in_flight[pool.submit(self._embed_batch, [t for _, t in batch])] = batch
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        batch = in_flight.pop(future)
+                        vectors = future.result()
+                        batch_ids = [cid for cid, _ in batch]
+                        results.update(zip(batch_ids, vectors))
+                        if on_batch:
+                            on_batch(batch_ids, vectors)
+                        self.stats["embedded"] += len(batch)
+                        self.stats["batches"] += 1
+            except BaseException:
+                for future in in_flight:
+                    future.cancel()
+                raise
+
+        elapsed = time.perf_counter() - started
+        self.stats["seconds"] = round(elapsed, 3)
+        self.stats["chunks_per_sec"] = round(self.stats["embedded"] / elapsed, 2) if elapsed > 0 else 0.0
+        return results
@@ -1,9 +1,41 @@
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from backend.config import settings
+from backend.embedding_cache import CachedEmbeddings
+from backend.local_embeddings import HashingEmbeddings
 
+EMBEDDING_BACKENDS = ("google", "local")
 
-def get_embeddings():
-    return GoogleGenerativeAIEmbeddings(
-        model="models/embedding-001",
+
+def _backend() -> str:
+    backend = (settings.EMBEDDING_BACKEND or "google").lower()
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND {settings.EMBEDDING_BACKEND!r} (expected 'google' or 'local')")
+    return backend
+
+
+def embedding_model_id() -> str:
+    """Identity of the configured embeddings, keying the query cache, chunk store and ingest manifest."""
+    if _backend() == "local":
+        return HashingEmbeddings(dim=settings.LOCAL_EMBEDDING_DIM).model_id
+    return settings.EMBEDDING_MODEL
+
+
+def get_embeddings(cached: bool = True):
+    """The embedding client selected by `settings.EMBEDDING_BACKEND`, behind the query cache when enabled."""
+    if _backend() == "local":
+        # computing a hashed vector is cheaper than a cache lookup
+        return HashingEmbeddings(dim=settings.LOCAL_EMBEDDING_DIM)
+
+    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+    embeddings = GoogleGenerativeAIEmbeddings(
+        model=settings.EMBEDDING_MODEL,
         google_api_key=settings.GEMINI_API_KEY
     )
+    if not (cached and settings.EMBEDDING_CACHE_ENABLED):
+        return embeddings
+    return CachedEmbeddings(
+        embeddings,
+        model_name=settings.EMBEDDING_MODEL,
+        max_entries=settings.EMBEDDING_CACHE_SIZE,
+        ttl_seconds=settings.EMBEDDING_CACHE_TTL,
+        db_path=settings.EMBEDDING_CACHE_PATH or None
+    )
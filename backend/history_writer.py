@@ -0,0 +1,200 @@
+import atexit
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from backend.config import settings
+from backend import db
+from backend.metrics import STAGE_SECONDS
+
+_STOP = object()
+
+
+class HistoryWriter:
+    """Write-behind persister for chat messages.
+
+    Request handlers `enqueue()` messages and return immediately; a background thread
+    inserts everything queued within `flush_interval` seconds (up to `batch_size` rows)
+    in a single transaction. Timestamps are taken at enqueue time, so ordering matches
+    the request path. The queue is bounded: when it is full, `enqueue()` blocks, which
+    throttles bursts instead of growing memory. `flush(session_id=...)` waits for one
+    session's rows only, so a reader is not held up by everyone else's queued writes.
+    `close()` drains the queue (app shutdown and interpreter exit).
+    """
+
+    def __init__(self, session_factory: Callable = db.SessionLocal, flush_interval: float = 0.05,
+                 batch_size: int = 256, max_queue: int = 10000, max_retries: int = 3):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.batch_size = max(1, batch_size)
+        self.max_retries = max_retries
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._pending = 0
+        self._pending_by_session: Dict[str, int] = {}
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="history-writer", daemon=True)
+                    self._thread.start()
+                    atexit.register(self.close)
+
+    def enqueue(self, session_id: str, role: str, content: str, department: Optional[str] = None,
+                turn_id: Optional[str] = None):
+        row = self._row(session_id, role, content, department, turn_id)
+        if self._closed:
+            # after shutdown started: write synchronously rather than lose the message
+            self._write([row])
+            return
+        self._ensure_started()
+        with self._lock:
+            self._pending += 1
+            self._pending_by_session[session_id] = self._pending_by_session.get(session_id, 0) + 1
+            self.enqueued += 1
+        self._queue.put(row)
+
+    @staticmethod
+    def _row(session_id: str, role: str, content: str, department: Optional[str], turn_id: Optional[str]) -> Dict[str, Any]:
+        return {
+            "session_id": session_id,
+            "role": role,
+            "content": content,
+            "department": department or "",
+            "turn_id": turn_id or db.new_turn_id(),
+            "timestamp": datetime.utcnow(),
+        }
+
+    def _run(self):
+        stop = False
+        while not stop:
+            try:
+                item = self._queue.get(timeout=None if not self._closed else 0)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            self._flush(batch)
+        # drain whatever was queued behind the stop marker
+        rest: List[Dict[str, Any]] = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                rest.append(item)
+        for start in range(0, len(rest), self.batch_size):
+            self._flush(rest[start:start + self.batch_size])
+
+    def _write(self, rows: List[Dict[str, Any]]):
+        session = self.session_factory()
+        try:
+            session.add_all([db.ChatMessage(**row) for row in rows])
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        finally:
+            session.close()
+
+    def _flush(self, batch: List[Dict[str, Any]]):
+        started = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._write(batch)
+                written = len(batch)
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    print(f"❌ Dropping {len(batch)} chat messages after {attempt + 1} failed writes: {e}")
+                    written = 0
+                    break
+                time.sleep(0.1 * (2 ** attempt))
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        STAGE_SECONDS.observe(elapsed_ms / 1000, "history_flush")
+        with self._lock:
+            self.flushes += 1
+            self.written += written
+            self.dropped += len(batch) - written
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+            self._pending -= len(batch)
+            for row in batch:
+                left = self._pending_by_session.get(row["session_id"], 0) - 1
+                if left > 0:
+                    self._pending_by_session[row["session_id"]] = left
+                else:
+                    self._pending_by_session.pop(row["session_id"], None)
+            self._idle.notify_all()
+
+    def pending(self, session_id: Optional[str] = None) -> int:
+        """Rows enqueued but not yet committed (for one session when given)."""
+        with self._lock:
+            return self._pending if session_id is None else self._pending_by_session.get(session_id, 0)
+
+    def flush(self, timeout: float = 1.0, session_id: Optional[str] = None) -> bool:
+        """Wait until everything enqueued so far (or just `session_id`'s rows) is committed; False on timeout."""
+        with self._lock:
+            if session_id is None:
+                return self._idle.wait_for(lambda: self._pending <= 0, timeout=timeout)
+            return self._idle.wait_for(lambda: session_id not in self._pending_by_session, timeout=timeout)
+
+    def close(self, timeout: float = 10.0):
+        """Stop accepting queued writes and drain the queue to the database."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+            if not self._thread.is_alive():
+                # messages enqueued while the writer was stopping
+                self._run()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "pending": self._pending,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+            "max_flush_ms": round(self.max_flush_ms, 2),
+            "avg_flush_ms": round(self._total_flush_ms / self.flushes, 2) if self.flushes else 0.0,
+            "avg_batch": round(self.written / self.flushes, 2) if self.flushes else 0.0,
+        }
+
+
+history_writer = HistoryWriter(
+    flush_interval=settings.HISTORY_FLUSH_INTERVAL,
+    batch_size=settings.HISTORY_BATCH_SIZE,
+    max_queue=settings.HISTORY_QUEUE_SIZE,
+)
@@ -1,16 +1,45 @@
+import hashlib
+import json
 import os
 import shutil
 import stat
+import time
+from concurrent.futures import ProcessPoolExecutor
 from langchain_community.document_loaders import PyPDFLoader, TextLoader, CSVLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_chroma import Chroma 
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
+from langchain_core.documents import Document
 from backend.config import settings
+from backend.embeddings import embedding_model_id, get_embeddings
+from backend.utils import normalize_department, normalize_country, normalize_visibility
+from backend.clients import bump_index_generation, index_generation, new_generation_token
+from backend.answer_cache import answer_cache
+from backend.embedding_scheduler import EmbeddingScheduler, is_quota_error
+from backend.chunk_store import ChunkEmbeddingStore, content_hash
+from backend.lexical_index import LEXICAL_INDEX_FILE, LexicalIndex
+from backend.metrics import span, stage_summary, timed
+from backend.profiling import all_threads, profile
+from backend.numpy_index import NumpyIndex
+from backend.vector_snapshot import SNAPSHOT_DIR, read_header, write_snapshot
 
 # Paths based on project structure
 DOCS_DIR = "docs"
 VECTOR_DIR = "backend/vectorstore"
 
+# Per-file content hashes and chunk IDs of the last ingest (lives next to the Chroma files)
+INGEST_MANIFEST = "ingest_manifest.json"
+INGEST_MANIFEST_VERSION = 2
+SUPPORTED_EXTENSIONS = (".pdf", ".docx", ".txt", ".csv")
+
+# Content-addressed chunk vectors (outside VECTOR_DIR so --rebuild keeps them)
+CHUNK_STORE_PATH = "backend/chunk_embeddings.sqlite"
+
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+# Bump when parsing/chunking changes so unchanged files are re-chunked on the next ingest
+LOADER_VERSION = 2
+UPSERT_BATCH = 256
+
 
 def _on_rm_error(func, path, exc_info):
     """Attempt to fix permission issues and retry removal (Windows-friendly)."""
@@ -20,13 +49,8 @@ def _on_rm_error(func, path, exc_info):
     except Exception as e:
         print(f"⚠️ Could not remove {path}: {e}")
 
-def load_documents():
-    documents = []
-    if not os.path.exists(DOCS_DIR):
-        print(f"❌ Error: {DOCS_DIR} directory not found.")
-        return []
-
-    # Optional manifest to explicitly map filenames to metadata.
+def load_metadata_manifest():
+    """Optional manifest (docs/metadata.csv) explicitly mapping filenames to metadata."""
     manifest = {}
     try:
         import csv
@@ -53,186 +77,395 @@ def load_documents():
                         manifest[key] = {
                             'department': (row.get('department') or row.get('dept') or '').strip().lower(),
                             'country': (row.get('country') or '').strip().lower(),
+                            'visibility': (row.get('visibility') or '').strip().lower(),
                             'policy_name': (row.get('policy_name') or row.get(key_field) or '').strip()
                         }
                 print(f"Loaded metadata manifest: {manifest_path}")
                 break
     except Exception:
         manifest = {}
+    return manifest
 
-    for file in os.listdir(DOCS_DIR):
-        path = os.path.join(DOCS_DIR, file)
-        loader = None
-        # infer department and country from filename (more robust)
-        fn = file.lower()
-        inferred_dept = ""
-        inferred_country = ""
-        # tokenise filename on non-alphanum to find department tokens
-        import re
-        tokens = re.split(r'[^a-z0-9]+', fn)
-        # map common tokens to normalized department names
-        dept_map = {
-            'hr': 'hr', 'human': 'hr', 'humanresources': 'hr', 'human_resources': 'hr',
-            'it': 'it', 'information': 'it', 'informationtechnology': 'it',
-            'finance': 'finance', 'payroll': 'finance',
-            'product': 'product',
-            'engineering': 'engineering', 'eng': 'engineering',
-            'common': 'common', 'company': 'common', 'admin': 'admin', 'administration': 'admin'
-        }
-        for t in tokens:
-            if not t:
-                continue
-            if t in dept_map:
-                inferred_dept = dept_map[t]
-                break
 
-        # detect country tokens
-        if any(t in ('india', 'indian') for t in tokens):
-            inferred_country = 'india'
-        elif any(t in ('foreign', 'international', 'non_common', 'noncommon', 'non-common') for t in tokens):
-            inferred_country = 'foreign'
-
-        # If manifest has an explicit entry for this file (match with or without extension), prefer it
-        manifest_entry = None
-        if manifest:
-            mkey1 = file.lower()
-            mkey2 = os.path.splitext(file)[0].lower()
-            manifest_entry = manifest.get(mkey1) or manifest.get(mkey2)
-            if manifest_entry:
-                inferred_dept = manifest_entry.get('department') or inferred_dept
-                inferred_country = manifest_entry.get('country') or inferred_country
+def _manifest_entry(manifest, file):
+    # match with or without extension
+    return manifest.get(file.lower()) or manifest.get(os.path.splitext(file)[0].lower())
+
+
+def _read_csv_rows(path):
+    """Read a CSV as dicts; several policy exports are cp1252 rather than UTF-8."""
+    import csv
+    for encoding in ('utf-8-sig', 'cp1252'):
         try:
-            if file.endswith(".pdf"):
-                loader = PyPDFLoader(path)
-            elif file.endswith(".docx"):
-                # Load .docx with several fallbacks to avoid external dependency issues:
-                # 1) try python-docx (`docx` module)
-                # 2) try langchain's Docx2txtLoader if docx2txt is present
-                # 3) fallback to stdlib zip/xml extraction (always available)
-                tried = False
-                # 1) python-docx
-                try:
-                    from docx import Document as _DocxDocument
-                    from types import SimpleNamespace
-                    text = "\n".join([p.text for p in _DocxDocument(path).paragraphs])
-                    docs = [SimpleNamespace(page_content=text, metadata={})]
-                    for d in docs:
-                        meta = d.metadata or {}
-                        meta.update({
-                            "source": file,
-                            "department": (meta.get('department') or inferred_dept or '').strip().lower(),
-                            "country": (meta.get('country') or inferred_country or '').strip().lower(),
-                            "policy_name": (meta.get('policy_name') or os.path.splitext(file)[0]).strip()
-                        })
-                        d.metadata = meta
-                    documents.extend(docs)
-                    continue
-                except Exception:
-                    pass
+            with open(path, newline='', encoding=encoding) as fh:
+                reader = csv.DictReader(fh)
+                fields = [(h or '').strip().lower() for h in (reader.fieldnames or [])]
+                rows = [{(k or '').strip().lower(): (v or '').strip() for k, v in row.items()} for row in reader]
+            return fields, rows
+        except UnicodeDecodeError:
+            continue
+    raise ValueError(f"Could not decode {path}")
+
+
+def _parse_policy_date(value):
+    """'31/12/2025' (also ISO / dashed variants) -> datetime.date, or None."""
+    from datetime import datetime
+    value = (value or '').strip()
+    for fmt in ('%d/%m/%Y', '%Y-%m-%d', '%d-%m-%Y', '%d.%m.%Y'):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _load_policy_csv(path, file, inferred_dept, inferred_country):
+    """One document per policy row, with the row's columns promoted to metadata.
+
+    Returns None when the CSV is not a policy table (no policy_id/policy_name columns),
+    so the generic CSVLoader path is used instead. Rows are never split further.
+    """
+    fields, rows = _read_csv_rows(path)
+    if 'policy_id' not in fields or 'policy_name' not in fields:
+        return None
+
+    docs = []
+    for i, row in enumerate(rows):
+        policy_id = row.get('policy_id', '')
+        policy_name = row.get('policy_name', '')
+        if not (policy_id or policy_name):
+            continue
+        description = row.get('policy_description', '')
+        category = row.get('policy_category') or row.get('policy_type') or ''
+        region = row.get('region') or row.get('country') or ''
+        effective = _parse_policy_date(row.get('effective_from'))
+
+        text = f"{policy_name} ({policy_id})\n{description}"
+        if category:
+            text += f"\nCategory: {category}"
+        if effective:
+            text += f"\nEffective from: {effective.isoformat()}"
+
+        docs.append(Document(
+            page_content=text,
+            metadata={
+                "source": file,
+                "row": i,
+                "record_type": "policy_row",
+                "policy_id": policy_id,
+                "policy_name": policy_name or os.path.splitext(file)[0],
+                "policy_category": category.lower(),
+                # region 'all' carries no country information; fall back to the filename
+                "department": (row.get('department') or inferred_dept or '').lower(),
+                "country": (region.lower() if region.lower() not in ('', 'all') else inferred_country),
+                "effective_from": effective.isoformat() if effective else '',
+                "effective_from_int": int(effective.strftime('%Y%m%d')) if effective else 0,
+            }
+        ))
+    return docs
+
+
+def _load_file(file, manifest):
+    """Parse one docs/ file into documents with inferred metadata (raises on failure)."""
+    path = os.path.join(DOCS_DIR, file)
+    loader = None
+    # infer department and country from filename (more robust)
+    fn = file.lower()
+    inferred_dept = ""
+    inferred_country = ""
+    # tokenise filename on non-alphanum to find department tokens
+    import re
+    tokens = re.split(r'[^a-z0-9]+', fn)
+    # map common tokens to normalized department names
+    dept_map = {
+        'hr': 'hr', 'human': 'hr', 'humanresources': 'hr', 'human_resources': 'hr',
+        'it': 'it', 'information': 'it', 'informationtechnology': 'it',
+        'finance': 'finance', 'payroll': 'finance',
+        'product': 'product',
+        'engineering': 'engineering', 'eng': 'engineering',
+        'common': 'common', 'company': 'common', 'admin': 'admin', 'administration': 'admin'
+    }
+    for t in tokens:
+        if not t:
+            continue
+        if t in dept_map:
+            inferred_dept = dept_map[t]
+            break
 
-                # 2) langchain Docx2txtLoader if available
+    # detect country tokens
+    if any(t in ('india', 'indian') for t in tokens):
+        inferred_country = 'india'
+    elif any(t in ('foreign', 'international', 'non_common', 'noncommon', 'non-common') for t in tokens):
+        inferred_country = 'foreign'
+
+    # If manifest has an explicit entry for this file (match with or without extension), prefer it
+    manifest_entry = None
+    if manifest:
+        mkey1 = file.lower()
+        mkey2 = os.path.splitext(file)[0].lower()
+        manifest_entry = manifest.get(mkey1) or manifest.get(mkey2)
+        if manifest_entry:
+            inferred_dept = manifest_entry.get('department') or inferred_dept
+            inferred_country = manifest_entry.get('country') or inferred_country
+    if file.endswith(".pdf"):
+        loader = PyPDFLoader(path)
+    elif file.endswith(".docx"):
+        # Load .docx with several fallbacks to avoid external dependency issues:
+        # 1) try python-docx (`docx` module)
+        # 2) try langchain's Docx2txtLoader if docx2txt is present
+        # 3) fallback to stdlib zip/xml extraction (always available)
+        tried = False
+        # 1) python-docx
+        try:
+            from docx import Document as _DocxDocument
+            from types import SimpleNamespace
+            text = "\n".join([p.text for p in _DocxDocument(path).paragraphs])
+            docs = [SimpleNamespace(page_content=text, metadata={})]
+            for d in docs:
+                meta = d.metadata or {}
+                meta.update({
+                    "source": file,
+                    "department": (meta.get('department') or inferred_dept or '').strip().lower(),
+                    "country": (meta.get('country') or inferred_country or '').strip().lower(),
+                    "policy_name": (meta.get('policy_name') or os.path.splitext(file)[0]).strip()
+                })
+                d.metadata = meta
+            return docs
+        except Exception:
+            pass
+
+        # 2) langchain Docx2txtLoader if available
+        try:
+            import importlib
+            if importlib.util.find_spec("docx2txt") is not None:
                 try:
-                    import importlib
-                    if importlib.util.find_spec("docx2txt") is not None:
-                        try:
-                            Docx2txtLoader = importlib.import_module(
-                                "langchain_community.document_loaders"
-                            ).Docx2txtLoader
-                            loader = Docx2txtLoader(path)
-                            tried = True
-                        except Exception:
-                            tried = False
+                    Docx2txtLoader = importlib.import_module(
+                        "langchain_community.document_loaders"
+                    ).Docx2txtLoader
+                    loader = Docx2txtLoader(path)
+                    tried = True
                 except Exception:
                     tried = False
+        except Exception:
+            tried = False
 
-                if tried:
-                    # loader will be used below
-                    pass
-                else:
-                    # 3) Stdlib fallback: unzip and parse word/document.xml
-                    try:
-                        import zipfile
-                        import xml.etree.ElementTree as ET
-                        with zipfile.ZipFile(path) as z:
-                            xml_content = z.read("word/document.xml")
-                        root = ET.fromstring(xml_content)
-                        # Namespaces handling
-                        ns = {k: v for k, v in [node.split('}')[-1].split(':') if ':' in node else (node, '') for node in []]}
-                        # Extract all text nodes
-                        texts = []
-                        for elem in root.iter():
-                            if elem.tag.endswith('}t') or elem.tag == 't':
-                                if elem.text:
-                                    texts.append(elem.text)
-                        text = "\n".join(texts)
-                        from types import SimpleNamespace
-                        docs = [SimpleNamespace(page_content=text, metadata={})]
-                        for d in docs:
-                            meta = d.metadata or {}
-                            meta.update({
-                                "source": file,
-                                "department": (meta.get('department') or inferred_dept or '').strip().lower(),
-                                "country": (meta.get('country') or inferred_country or '').strip().lower(),
-                                "policy_name": (meta.get('policy_name') or os.path.splitext(file)[0]).strip()
-                            })
-                            d.metadata = meta
-                        documents.extend(docs)
-                        continue
-                    except Exception as e:
-                        raise ImportError(f"Failed to extract .docx content for {file}: {e}")
-            elif file.endswith(".txt"):
-                loader = TextLoader(path, encoding="utf-8")
-            elif file.endswith(".csv"):
-                loader = CSVLoader(path)
-            else:
-                continue
-
-            if loader:
-                # For CSVs, try to read header or first row for explicit department/country
-                explicit_headers = {}
-                if file.endswith('.csv'):
-                    try:
-                        import csv
-                        with open(path, newline='', encoding='utf-8') as fh:
-                            reader = csv.DictReader(fh)
-                            # check header fields for department/country
-                            hdrs = [h.lower() for h in reader.fieldnames or []]
-                            if 'department' in hdrs or 'country' in hdrs:
-                                # read first data row to infer values for this file
-                                first = next(reader, None)
-                                if first:
-                                    if 'department' in hdrs and first.get('department'):
-                                        explicit_headers['department'] = first.get('department').strip().lower()
-                                    if 'country' in hdrs and first.get('country'):
-                                        explicit_headers['country'] = first.get('country').strip().lower()
-                    except Exception:
-                        explicit_headers = {}
-                    except Exception:
-                        # non-fatal; fallback to filename inference
-                        explicit_headers = {}
-
-                docs = loader.load()
+        if tried:
+            # loader will be used below
+            pass
+        else:
+            # 3) Stdlib fallback: unzip and parse word/document.xml
+            try:
+                import zipfile
+                import xml.etree.ElementTree as ET
+                with zipfile.ZipFile(path) as z:
+                    xml_content = z.read("word/document.xml")
+                root = ET.fromstring(xml_content)
+                # Namespaces handling
+                ns = {k: v for k, v in [node.split('}')[-1].split(':') if ':' in node else (node, '') for node in []]}
+                # Extract all text nodes
+                texts = []
+                for elem in root.iter():
+                    if elem.tag.endswith('}t') or elem.tag == 't':
+                        if elem.text:
+                            texts.append(elem.text)
+                text = "\n".join(texts)
+                from types import SimpleNamespace
+                docs = [SimpleNamespace(page_content=text, metadata={})]
                 for d in docs:
-                    # preserve any existing metadata but add inferred fields
                     meta = d.metadata or {}
-                    # treat empty strings as missing: prefer existing non-empty, then explicit headers, then inferred
-                    dept_val = (meta.get('department') or explicit_headers.get('department') or inferred_dept or '').strip().lower()
-                    country_val = (meta.get('country') or explicit_headers.get('country') or inferred_country or '').strip().lower()
-                    policy_name_val = (meta.get('policy_name') or os.path.splitext(file)[0]).strip()
                     meta.update({
                         "source": file,
-                        "department": dept_val,
-                        "country": country_val,
-                        "policy_name": policy_name_val
+                        "department": (meta.get('department') or inferred_dept or '').strip().lower(),
+                        "country": (meta.get('country') or inferred_country or '').strip().lower(),
+                        "policy_name": (meta.get('policy_name') or os.path.splitext(file)[0]).strip()
                     })
                     d.metadata = meta
-                documents.extend(docs)
-        except Exception as e:
-            print(f"⚠️ Error loading {file}: {e}")
-    return documents
+                return docs
+            except Exception as e:
+                raise ImportError(f"Failed to extract .docx content for {file}: {e}")
+    elif file.endswith(".txt"):
+        loader = TextLoader(path, encoding="utf-8")
+    elif file.endswith(".csv"):
+        # Policy tables (one policy per row) get row-aware documents with typed metadata
+        rows = _load_policy_csv(path, file, inferred_dept, inferred_country)
+        if rows is not None:
+            return rows
+        loader = CSVLoader(path)
+    else:
+        return []
+
+    if loader:
+        # For CSVs, try to read header or first row for explicit department/country
+        explicit_headers = {}
+        if file.endswith('.csv'):
+            try:
+                import csv
+                with open(path, newline='', encoding='utf-8') as fh:
+                    reader = csv.DictReader(fh)
+                    # check header fields for department/country
+                    hdrs = [h.lower() for h in reader.fieldnames or []]
+                    if 'department' in hdrs or 'country' in hdrs:
+                        # read first data row to infer values for this file
+                        first = next(reader, None)
+                        if first:
+                            if 'department' in hdrs and first.get('department'):
+                                explicit_headers['department'] = first.get('department').strip().lower()
+                            if 'country' in hdrs and first.get('country'):
+                                explicit_headers['country'] = first.get('country').strip().lower()
+            except Exception:
+                explicit_headers = {}
+            except Exception:
+                # non-fatal; fallback to filename inference
+                explicit_headers = {}
+
+        docs = loader.load()
+        for d in docs:
+            # preserve any existing metadata but add inferred fields
+            meta = d.metadata or {}
+            # treat empty strings as missing: prefer existing non-empty, then explicit headers, then inferred
+            dept_val = (meta.get('department') or explicit_headers.get('department') or inferred_dept or '').strip().lower()
+            country_val = (meta.get('country') or explicit_headers.get('country') or inferred_country or '').strip().lower()
+            policy_name_val = (meta.get('policy_name') or os.path.splitext(file)[0]).strip()
+            meta.update({
+                "source": file,
+                "department": dept_val,
+                "country": country_val,
+                "policy_name": policy_name_val
+            })
+            d.metadata = meta
+        return docs
+    return []
+
+
+def _load_file_task(file, manifest):
+    """Process-pool worker: load one file, isolating failures and timing the parse."""
+    started = time.perf_counter()
+    try:
+        docs = _load_file(file, manifest)
+        error = None
+    except Exception as e:
+        docs, error = [], str(e)
+    elapsed = round(time.perf_counter() - started, 4)
+
+    # Normalize the fields the retriever filters on so it can push them into the Chroma `where`
+    entry = _manifest_entry(manifest, file) or {}
+    for d in docs:
+        meta = d.metadata
+        meta['department'] = normalize_department(meta.get('department'))
+        meta['country'] = normalize_country(meta.get('country'))
+        meta['visibility'] = normalize_visibility(meta.get('visibility') or entry.get('visibility'))
+        meta['load_seconds'] = elapsed
+    return file, docs, error, elapsed
+
+
+def load_documents(files=None, manifest=None, workers=None):
+    """Load policy documents from docs/ (only `files` when given); returns (documents, failed files).
+
+    Files are parsed in a process pool (`settings.INGEST_WORKERS`, default: CPU count);
+    output order is deterministic (sorted by filename) and a failing file is reported,
+    skipped without affecting the others and listed in the returned set.
+    """
+    if not os.path.exists(DOCS_DIR):
+        print(f"❌ Error: {DOCS_DIR} directory not found.")
+        return [], set()
+
+    if manifest is None:
+        manifest = load_metadata_manifest()
 
-def ingest():
-    # PERMANENT FIX: Remove old vectorstore to prevent 404/database conflicts
+    files = sorted(files if files is not None else os.listdir(DOCS_DIR))
+    if not files:
+        return [], set()
+    if workers is None:
+        workers = settings.INGEST_WORKERS or os.cpu_count() or 1
+    workers = max(1, min(workers, len(files)))
+
+    started = time.perf_counter()
+    if workers == 1:
+        results = [_load_file_task(f, manifest) for f in files]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # map() yields in submission order, so output order does not depend on timing
+            results = list(pool.map(_load_file_task, files, [manifest] * len(files)))
+
+    documents = []
+    failed = set()
+    for file, docs, error, elapsed in results:
+        if error:
+            print(f"⚠️ Error loading {file}: {error}")
+            failed.add(file)
+            continue
+        documents.extend(docs)
+    slowest = sorted(results, key=lambda r: r[3], reverse=True)[:3]
+    print(f"📄 Loaded {len(documents)} documents from {len(files)} files in {time.perf_counter() - started:.2f}s "
+          f"({workers} workers); slowest: " + ", ".join(f"{f} {t:.2f}s" for f, _, _, t in slowest))
+    return documents, failed
+
+def _file_fingerprint(file, manifest):
+    """Content hash of a docs/ file plus the manifest metadata applied to it."""
+    h = hashlib.sha256()
+    with open(os.path.join(DOCS_DIR, file), 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 20), b''):
+            h.update(block)
+    h.update(json.dumps(_manifest_entry(manifest, file) or {}, sort_keys=True).encode('utf-8'))
+    return h.hexdigest()
+
+
+def _read_ingest_manifest():
+    try:
+        with open(os.path.join(VECTOR_DIR, INGEST_MANIFEST), encoding='utf-8') as fh:
+            data = json.load(fh)
+        if data.get('version') == INGEST_MANIFEST_VERSION:
+            return data
+    except (OSError, ValueError):
+        pass
+    return {'version': INGEST_MANIFEST_VERSION, 'splitter': None, 'files': {}}
+
+
+def _write_ingest_manifest(data):
+    os.makedirs(VECTOR_DIR, exist_ok=True)
+    path = os.path.join(VECTOR_DIR, INGEST_MANIFEST)
+    with open(path + '.tmp', 'w', encoding='utf-8') as fh:
+        json.dump(data, fh, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+
+def _chunk_ids(file, fingerprint, count):
+    # Stable: the same file content always yields the same chunk IDs; the path keeps
+    # identical copies of a document apart (shared IDs would collide and delete each other)
+    prefix = hashlib.sha256(f"{file}\n{fingerprint}".encode('utf-8')).hexdigest()[:24]
+    return [f"{prefix}-{i:05d}" for i in range(count)]
+
+
+def _embedding_scheduler(embeddings):
+    return EmbeddingScheduler(
+        embeddings.embed_documents,
+        batch_size=settings.EMBED_BATCH_SIZE,
+        max_in_flight=settings.EMBED_MAX_IN_FLIGHT,
+        max_retries=settings.EMBED_MAX_RETRIES,
+        retry_on=is_quota_error
+    )
+
+
+def _export_snapshot(collection, model_id, generation):
+    """Write the memory-mappable vector snapshot that RETRIEVER=numpy serves from."""
+    with span("ingest_snapshot"):
+        index = NumpyIndex.from_collection(collection)
+        header = write_snapshot(os.path.join(VECTOR_DIR, SNAPSHOT_DIR), index, embedding=model_id,
+                                generation=generation, dtype=settings.VECTOR_SNAPSHOT_DTYPE)
+    print(f"🧊 Vector snapshot: {header['rows']}×{header['dim']} {header['dtype']} "
+          f"({header['vectors']['bytes'] / 1e6:.1f} MB) in {SNAPSHOT_DIR}/")
+
+
+def _snapshot_current(model_id):
+    try:
+        header = read_header(os.path.join(VECTOR_DIR, SNAPSHOT_DIR))
+    except Exception:
+        return False
+    return bool(header) and header.get('embedding') == model_id and header.get('generation') == index_generation(VECTOR_DIR) \
+        and header.get('dtype') == settings.VECTOR_SNAPSHOT_DTYPE
+
+
+def _clear_vectorstore():
     if os.path.exists(VECTOR_DIR):
         print(f"🧹 Clearing existing vector store at {VECTOR_DIR}...")
         try:
@@ -241,32 +474,183 @@ def ingest():
             print("❌ PermissionError while removing vector store."
                   " Ensure no process (sqlite, server, editor) is using files in backend/vectorstore and try again.")
             print(f"Details: {e}")
+            return False
+    return True
+
+
+@timed("ingest_total")
+def ingest(rebuild=False, load_workers=None):
+    """Incrementally sync docs/ into the vector store.
+
+    An ingest manifest (backend/vectorstore/ingest_manifest.json) records a content hash and
+    the chunk IDs of every file. Only new or changed files are parsed, split and embedded
+    (upserted under stable chunk IDs); chunks of changed and removed files are deleted.
+    Chunk vectors come from the content-addressed ChunkEmbeddingStore whenever the same text
+    was embedded before, so re-chunking or rebuilding only embeds genuinely new text.
+    `rebuild=True` wipes the store first. Changing the splitter settings re-chunks everything.
+    `load_workers` overrides `settings.INGEST_WORKERS` for parsing.
+    """
+    if rebuild and not _clear_vectorstore():
+        return
+
+    if not os.path.exists(DOCS_DIR):
+        print(f"❌ Error: {DOCS_DIR} directory not found.")
+        return
+
+    state = _read_ingest_manifest()
+    if not state['files'] and os.path.exists(VECTOR_DIR) and not rebuild:
+        # store built before the manifest existed: its chunk IDs are unknown, so start clean
+        print("ℹ️ No ingest manifest found; rebuilding the vector store once.")
+        if not _clear_vectorstore():
+            return
+    if state['files'] and not os.path.exists(VECTOR_DIR):
+        state = {'version': INGEST_MANIFEST_VERSION, 'splitter': None, 'files': {}}
+    model_id = embedding_model_id()
+    # manifests written before EMBEDDING_BACKEND existed were always Gemini embeddings
+    previous_model = state.get('embedding', settings.EMBEDDING_MODEL)
+    if state['files'] and previous_model != model_id:
+        # vectors of another model (and possibly another dimension) cannot share the collection
+        print(f"ℹ️ Embeddings changed ({previous_model} → {model_id}); rebuilding the vector store.")
+        if not _clear_vectorstore():
             return
+        state = {'version': INGEST_MANIFEST_VERSION, 'splitter': None, 'files': {}}
+    splitter_config = {'chunk_size': CHUNK_SIZE, 'chunk_overlap': CHUNK_OVERLAP, 'loader_version': LOADER_VERSION}
+    resplit = state.get('splitter') != splitter_config
 
-    print("🔄 Loading documents from docs/...")
-    documents = load_documents()
-    
-    if not documents:
-        print("❌ No documents found.")
+    manifest = load_metadata_manifest()
+    current = {}
+    with span("ingest_fingerprint"):
+        for file in sorted(os.listdir(DOCS_DIR)):
+            if os.path.splitext(file)[1].lower() in SUPPORTED_EXTENSIONS:
+                current[file] = _file_fingerprint(file, manifest)
+
+    previous = state['files']
+    changed = [f for f, fp in current.items() if resplit or previous.get(f, {}).get('sha256') != fp]
+    removed = [f for f in previous if f not in current]
+    print(f"🔎 {len(current)} files: {len(changed)} new/changed, {len(removed)} removed, {len(current) - len(changed)} unchanged")
+
+    if not changed and not removed:
+        if settings.VECTOR_SNAPSHOT and not _snapshot_current(model_id):
+            vectorstore = Chroma(persist_directory=VECTOR_DIR, embedding_function=get_embeddings(cached=False))
+            _export_snapshot(vectorstore._collection, model_id, index_generation(VECTOR_DIR))
+        print("✅ Vector store already up to date.")
         return
 
-    # Splitting text
-    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-    chunks = splitter.split_documents(documents)
+    # Document embeddings are not cached; skip the query-cache wrapper
+    embeddings = get_embeddings(cached=False)
+    vectorstore = Chroma(persist_directory=VECTOR_DIR, embedding_function=embeddings)
+    store = ChunkEmbeddingStore(CHUNK_STORE_PATH)
 
-    embeddings = GoogleGenerativeAIEmbeddings(
-        model="models/embedding-001",
-        google_api_key=settings.GEMINI_API_KEY
-    )
+    documents, failed = [], set()
+    if changed:
+        print(f"🔄 Loading {len(changed)} documents from docs/...")
+        with span("ingest_load"):
+            documents, failed = load_documents(files=changed, manifest=manifest, workers=load_workers)
+        if failed:
+            print(f"⚠️ {len(failed)} file(s) failed to load and keep their indexed chunks; retried next run: {', '.join(sorted(failed))}")
+    # A file that failed to load keeps its chunks and manifest entry; no recorded hash, so the next run retries it
+    loaded = [f for f in changed if f not in failed]
+    for f in failed:
+        if f in previous:
+            previous[f]['sha256'] = None
 
-    print(f"🧠 Creating Vector Store in {VECTOR_DIR}...")
-    # Use the new langchain_chroma package logic
-    Chroma.from_documents(
-        documents=chunks,
-        embedding=embeddings,
-        persist_directory=VECTOR_DIR
-    )
+    stale_ids = [cid for f in loaded + removed for cid in previous.get(f, {}).get('chunk_ids', [])]
+    if stale_ids:
+        print(f"🗑️ Deleting {len(stale_ids)} stale chunks...")
+        with span("ingest_delete"):
+            vectorstore.delete(ids=stale_ids)
+    for f in removed:
+        previous.pop(f, None)
+
+    if loaded:
+        # Splitting text
+        # (policy CSV rows are already one self-contained chunk each and are not split)
+        splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+        by_file = {f: [] for f in loaded}
+        with span("ingest_split"):
+            for doc in documents:
+                parts = [doc] if doc.metadata.get('record_type') == 'policy_row' else splitter.split_documents([doc])
+                by_file.setdefault(doc.metadata.get('source'), []).extend(parts)
+
+        chunks, ids, hashes = [], [], []
+        for f in loaded:
+            file_chunks = by_file.get(f, [])
+            file_ids = _chunk_ids(f, current[f], len(file_chunks))
+            file_hashes = [content_hash(c.page_content) for c in file_chunks]
+            chunks.extend(file_chunks)
+            ids.extend(file_ids)
+            hashes.extend(file_hashes)
+            previous[f] = {'sha256': current[f], 'chunk_ids': file_ids, 'chunk_hashes': file_hashes}
+
+        # Content-addressed lookup: only text never embedded with this model goes to the API
+        with span("ingest_chunk_store_lookup"):
+            vectors_by_hash = store.get_many(hashes, model_id)
+        text_by_hash = {h: c.page_content for h, c in zip(hashes, chunks)}
+        missing = [h for h in text_by_hash if h not in vectors_by_hash]
+        print(f"🧠 {len(chunks)} chunks, {len(text_by_hash)} unique texts: {len(vectors_by_hash)} already embedded "
+              f"(hit rate {store.stats()['hit_rate']:.0%}), {len(missing)} to embed")
+
+        if missing:
+            # each finished batch is persisted in the store, so an interrupted run resumes from it
+            scheduler = _embedding_scheduler(embeddings)
+            with span("ingest_embed"):
+                new_vectors = scheduler.run(
+                    missing, [text_by_hash[h] for h in missing],
+                    on_batch=lambda batch_hashes, vectors: store.put_many(batch_hashes, vectors, model_id)
+                )
+            vectors_by_hash.update(new_vectors)
+            st = scheduler.stats
+            print(f"⚡ Embedded {st['embedded']} chunks in {st['batches']} batches, "
+                  f"{st['retries']} retries, {st['seconds']}s, {st['chunks_per_sec']} chunks/sec")
+
+        print(f"📦 Upserting {len(chunks)} chunks into {VECTOR_DIR}...")
+        for start in range(0, len(chunks), UPSERT_BATCH):
+            part = slice(start, start + UPSERT_BATCH)
+            with span("ingest_upsert"):
+                vectorstore._collection.upsert(
+                    ids=ids[part],
+                    embeddings=[vectors_by_hash[h] for h in hashes[part]],
+                    documents=[c.page_content for c in chunks[part]],
+                    metadatas=[c.metadata for c in chunks[part]]
+                )
+
+    state.update(files=previous, splitter=splitter_config, embedding=model_id)
+    _write_ingest_manifest(state)
+
+    # Drop store entries no longer referenced by any indexed chunk
+    if all('chunk_hashes' in entry for entry in previous.values()):
+        removed_entries = store.gc((h for entry in previous.values() for h in entry['chunk_hashes']), model_id)
+        print(f"🗃️ Chunk embedding store: {store.stats()['entries']} entries, {removed_entries} unreferenced removed")
+    store.close()
+
+    # BM25 index over the full collection, saved next to it for the serving processes
+    with span("ingest_bm25"):
+        lexical = LexicalIndex.from_collection(vectorstore._collection)
+        lexical.save(os.path.join(VECTOR_DIR, LEXICAL_INDEX_FILE))
+    print(f"🔤 BM25 index: {len(lexical)} chunks")
+
+    # Snapshot is stamped with the generation it belongs to before servers are told about it
+    generation = new_generation_token()
+    if settings.VECTOR_SNAPSHOT:
+        _export_snapshot(vectorstore._collection, model_id, generation)
+
+    # Running servers rebuild their shared clients when they see the new generation
+    bump_index_generation(VECTOR_DIR, generation)
+    answer_cache.invalidate()
     print("✅ Ingestion completed successfully.")
 
 if __name__ == "__main__":
-    ingest()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Sync docs/ into the vector store")
+    parser.add_argument("--rebuild", action="store_true", help="wipe the vector store and re-ingest every file")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"write a speedscope profile to {settings.PROFILE_DIR}/ (parses files in-process so parsing is sampled)")
+    args = parser.parse_args()
+    if args.profile:
+        # worker processes are invisible to the sampler: parse in this process instead
+        with profile("ingest", thread_filter=all_threads):
+            ingest(rebuild=args.rebuild, load_workers=1)
+    else:
+        ingest(rebuild=args.rebuild)
+    if settings.METRICS_ENABLED:
+        print(f"⏱️ Stage timings: {stage_summary('ingest_')}")
@@ -0,0 +1,157 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from backend.utils import filter_matches
+
+# Written next to the Chroma files by ingest; loaded by serving processes
+LEXICAL_INDEX_FILE = "lexical_index.json"
+LEXICAL_INDEX_VERSION = 1
+
+# FIN004, HR-012, cp001 ...
+POLICY_ID_PATTERN = re.compile(r"\b([a-z]{1,4})-?(\d{3})\b", re.IGNORECASE)
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Words that carry no signal for keyword matching ("what is the IJP policy?" -> ["ijp"])
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "for", "to", "in", "on", "at", "by", "with", "about",
+    "is", "are", "was", "be", "do", "does", "can", "could", "should", "will", "would",
+    "what", "which", "who", "when", "where", "how", "why", "i", "me", "my", "we", "our", "you",
+    "your", "it", "this", "that", "there", "tell", "show", "explain", "please", "give",
+    "policy", "policies", "rule", "rules",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall((text or "").lower())
+
+
+def keyword_terms(text: str) -> List[str]:
+    """Query terms worth matching on: tokens minus stopwords, order kept, duplicates dropped."""
+    return list(dict.fromkeys(t for t in tokenize(text) if t not in STOPWORDS))
+
+
+def extract_policy_ids(text: str) -> List[str]:
+    """'fin004 and HR-012?' -> ['FIN004', 'HR012']"""
+    return list(dict.fromkeys(f"{p.upper()}{n}" for p, n in POLICY_ID_PATTERN.findall(text or "")))
+
+
+class LexicalIndex:
+    """In-process BM25 inverted index over the same chunks as the vector store.
+
+    Built by ingest and persisted as JSON in the vector store directory. Searches take
+    the same `where` filters as Chroma (see `utils.build_access_filter`), evaluated
+    against each chunk's metadata, so results are scoped by department/country/visibility.
+    """
+
+    def __init__(self, ids: Sequence[str], texts: Sequence[str], metadatas: Sequence[Dict[str, Any]],
+                 k1: float = 1.5, b: float = 0.75):
+        self.ids = list(ids)
+        self.texts = list(texts)
+        self.metadatas = [m or {} for m in metadatas]
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._lengths: List[int] = []
+        # policy-title term -> chunks of that policy (the only keywords precise enough for the fast path)
+        self._title_postings: Dict[str, set] = {}
+        self._by_policy_id: Dict[str, List[int]] = {}
+        for i, text in enumerate(self.texts):
+            tokens = tokenize(text)
+            self._lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                self._postings.setdefault(term, []).append((i, tf))
+            meta = self.metadatas[i]
+            for term in tokenize(meta.get("policy_name", "")):
+                self._title_postings.setdefault(term, set()).add(i)
+            policy_id = (meta.get("policy_id") or "").upper().replace("-", "")
+            if policy_id:
+                self._by_policy_id.setdefault(policy_id, []).append(i)
+        self._avg_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+
+    def __len__(self):
+        return len(self.ids)
+
+    # --- persistence ---
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump({
+                "version": LEXICAL_INDEX_VERSION,
+                "ids": self.ids,
+                "texts": self.texts,
+                "metadatas": self.metadatas,
+            }, fh)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["LexicalIndex"]:
+        """Load a saved index; None if missing or written by another index version."""
+        try:
+            with open(path, encoding="utf-8") as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != LEXICAL_INDEX_VERSION:
+            return None
+        return cls(data["ids"], data["texts"], data["metadatas"])
+
+    @classmethod
+    def from_collection(cls, collection) -> "LexicalIndex":
+        """Build from a Chroma collection (ingest, or stores that predate the saved index)."""
+        data = collection.get(include=["documents", "metadatas"])
+        return cls(data.get("ids") or [], [t or "" for t in data.get("documents") or []], data.get("metadatas") or [])
+
+    # --- search ---
+    def _idf(self, term: str) -> float:
+        n = len(self._postings.get(term, ()))
+        return math.log(1 + (len(self.ids) - n + 0.5) / (n + 0.5))
+
+    def search(self, query: str, k: int = 10, where: Optional[Dict[str, Any]] = None) -> List[Tuple[int, float]]:
+        """BM25 top-k as (chunk position, score), restricted to chunks matching `where`."""
+        scores: Dict[int, float] = {}
+        for term in keyword_terms(query):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = self._idf(term)
+            for i, tf in postings:
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[i] / (self._avg_length or 1.0))
+                scores[i] = scores.get(i, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        ranked = sorted(scores.items(), key=lambda item: -item[1])
+        if where:
+            ranked = [(i, s) for i, s in ranked if filter_matches(self.metadatas[i], where)]
+        return ranked[:k]
+
+    def precise_matches(self, query: str, where: Optional[Dict[str, Any]] = None, max_hits: int = 3) -> List[int]:
+        """Chunks the query pins down exactly, or [] when it is not a precise lookup.
+
+        - Policy IDs in the query ("FIN004") match the `policy_id` field of CSV policy rows.
+        - Short keyword queries ("IJP policy") match when every term is in a policy title and
+          at most `max_hits` chunks carry that title. Body text never qualifies: "can I work
+          from home on friday" needs vector retrieval, not the rare chunks holding those words.
+        """
+        allowed = lambda i: not where or filter_matches(self.metadatas[i], where)
+
+        ids = extract_policy_ids(query)
+        if ids:
+            return [i for pid in ids for i in self._by_policy_id.get(pid, ()) if allowed(i)]
+
+        terms = keyword_terms(query)
+        if not terms or len(terms) > 4:
+            return []
+        titled = None
+        for term in terms:
+            chunks = self._title_postings.get(term, set())
+            titled = chunks if titled is None else titled & chunks
+            if not titled:
+                return []
+        hits = [i for i in titled if allowed(i)]
+        if not 0 < len(hits) <= max_hits:
+            return []
+        rank = {i: r for r, (i, _) in enumerate(self.search(query, k=len(self.ids)))}
+        return sorted(hits, key=lambda i: rank.get(i, len(rank)))
@@ -0,0 +1,80 @@
+import math
+import re
+import zlib
+from collections import Counter
+from functools import lru_cache
+from typing import List, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# Bump when tokenisation or weighting changes: vectors from different versions are not comparable
+LOCAL_EMBEDDING_VERSION = 1
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+@lru_cache(maxsize=1 << 16)
+def _bucket(feature: str, dim: int) -> Tuple[int, float]:
+    """Stable (column, sign) for a feature; crc32 because Python's hash() is salted per process."""
+    h = zlib.crc32(feature.encode("utf-8"))
+    return h % dim, (1.0 if (h >> 31) & 1 else -1.0)
+
+
+class HashingEmbeddings(Embeddings):
+    """Offline CPU embeddings: signed feature hashing of words and word bigrams.
+
+    Term frequency is dampened (1 + log tf) and rows are L2-normalised, so cosine
+    similarity behaves like TF-weighted term overlap. No model, no network and fully
+    deterministic; a query embeds in well under a millisecond. Ranking quality is
+    lexical (no synonyms), which suits exact policy wording, tests and benchmarks.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    @property
+    def model_id(self) -> str:
+        """Identity for caches and the ingest manifest (vectors differ per dimension/version)."""
+        return f"local-hashing-v{LOCAL_EMBEDDING_VERSION}-{self.dim}"
+
+    def _features(self, text: str) -> Counter:
+        words = TOKEN_PATTERN.findall((text or "").lower())
+        features = Counter(words)
+        features.update(f"{a} {b}" for a, b in zip(words, words[1:]))
+        return features
+
+    def _matrix(self, texts: List[str]) -> np.ndarray:
+        rows: List[int] = []
+        cols: List[int] = []
+        weights: List[float] = []
+        for row, text in enumerate(texts):
+            for feature, tf in self._features(text).items():
+                col, sign = _bucket(feature, self.dim)
+                rows.append(row)
+                cols.append(col)
+                weights.append(sign * (1.0 + math.log(tf)))
+        flat = np.asarray(rows, dtype=np.int64) * self.dim + np.asarray(cols, dtype=np.int64)
+        matrix = np.bincount(flat, weights=np.asarray(weights, dtype=np.float64), minlength=len(texts) * self.dim)
+        matrix = matrix.reshape(len(texts), self.dim).astype(np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._matrix(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._matrix([text])[0].tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Queries embed exactly like documents: one matrix for the whole batch."""
+        return self.embed_documents(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return self.embed_query(text)
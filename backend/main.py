@@ -1,8 +1,16 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException, status, Request
 import logging
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel
-from backend.rag_pipeline import run_rag
+from backend.rag_pipeline import arun_rag
+from backend.clients import registry
+from backend.answer_cache import answer_cache
+from backend.context_budget import context_budgeter
+from backend.history_writer import history_writer
+from backend.config import settings
+from backend.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, metrics
+from backend.profiling import profile, should_profile
 
 app = FastAPI(
     title="HR Enterprise Assistant",
@@ -20,6 +28,24 @@ app.add_middleware(
 )
 
 
+# -----------------------------
+# Startup
+# -----------------------------
+@app.on_event("startup")
+def warm_clients():
+    # Build the shared embeddings / vector store / chat model once per process
+    try:
+        registry.warm_up()
+    except Exception as e:
+        logging.getLogger("uvicorn.error").warning(f"Could not warm up RAG clients: {e}")
+
+
+@app.on_event("shutdown")
+def drain_history_writer():
+    # Commit chat messages still queued in the write-behind writer
+    history_writer.close()
+
+
 # -----------------------------
 # Models
 # -----------------------------
@@ -44,6 +70,23 @@ def root():
     return {"status": "HR Enterprise Assistant running"}
 
 
+@app.get("/health")
+def health():
+    report = registry.health()
+    report["answer_cache"] = answer_cache.stats()
+    report["context_budget"] = context_budgeter.stats()
+    report["history_writer"] = history_writer.stats()
+    return JSONResponse(report, status_code=200 if report["ready"] else 503)
+
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """Per-stage latency histograms, LLM/retrieval counters and cache hit rates (Prometheus text format)."""
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+
 # -----------------------------
 # Login
 # -----------------------------
@@ -114,14 +157,20 @@ def upload_policy(file: UploadFile = File(...)):
 # Chat Endpoint
 # -----------------------------
 @app.post("/chat")
-def chat(request: ChatRequest):
-    answer = run_rag(
+async def chat(request: ChatRequest):
+    params = dict(
         question=request.question,
         department=request.department,
         role=request.role,
         country=(request.country or None),
         username=request.username
     )
+    # the demo has no authentication, so only PROFILE_SAMPLE_RATE applies (no X-Profile header)
+    if should_profile():
+        with profile("chat"):
+            answer = await arun_rag(**params)
+    else:
+        answer = await arun_rag(**params)
     # `answer` is a structured dict: return it directly
     return answer
 
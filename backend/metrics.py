@@ -0,0 +1,254 @@
+import asyncio
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from backend.config import settings
+
+# Seconds; spans range from sub-millisecond cache lookups to multi-second LLM calls
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = ['%s="%s"' % (n, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", " "))
+             for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, *labels: str):
+        if not settings.METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # per label set: [bucket counts..., +Inf count], sum
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str):
+        if not settings.METRICS_ENABLED:
+            return
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(labels, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def snapshot(self) -> Dict[LabelValues, Dict[str, float]]:
+        """Per label set: count, sum and mean (used for console summaries)."""
+        with self._lock:
+            return {
+                labels: {"count": sum(counts), "sum": total[0], "mean": total[0] / sum(counts) if sum(counts) else 0.0}
+                for labels, (counts, total) in self._values.items()
+            }
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = 'le="+Inf"' if bound == float("inf") else 'le="%g"' % bound
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total[0]:.6f}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class _Callback:
+    """Metric read from a component's own stats() at scrape time (cache hit counts etc.)."""
+
+    def __init__(self, name: str, help_text: str, kind: str, labelnames: Sequence[str],
+                 fn: Callable[[], Dict[LabelValues, float]]):
+        self.name = name
+        self.help = help_text
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        try:
+            values = self.fn() or {}
+        except Exception:
+            return []
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for labels, value in sorted(values.items()):
+            if value is not None:
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-local metrics rendered in the Prometheus text format.
+
+    With `settings.METRICS_ENABLED` off, `span()` returns a shared no-op context manager
+    and counters/histograms return before taking any lock, so instrumentation is free.
+    Every worker process keeps its own numbers (scrape each worker, or run one).
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def callback(self, name: str, help_text: str, kind: str, labelnames: Sequence[str],
+                 fn: Callable[[], Dict[LabelValues, float]]):
+        with self._lock:
+            self._metrics[name] = _Callback(name, help_text, kind, labelnames, fn)
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram(
+    "hr_assistant_stage_seconds", "Latency of one pipeline stage (embedding, search, LLM call, SQLite, ingest step)", ["stage"]
+)
+RELAXED_RETRIEVALS = metrics.counter(
+    "hr_assistant_relaxed_retrievals_total", "Retrievals answered outside the strict department/country filter", ["fallback"]
+)
+LLM_CALLS = metrics.counter("hr_assistant_llm_calls_total", "Chat model calls", ["call"])
+LLM_TOKENS = metrics.counter(
+    "hr_assistant_llm_tokens_total", "Chat model tokens (usage metadata when reported, else ~4 chars/token)", ["call", "kind"]
+)
+LEXICAL_FAST_PATH = metrics.counter("hr_assistant_lexical_fast_path_total", "Lexical fast path outcomes", ["result"])
+
+
+class _Span:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        STAGE_SECONDS.observe(time.perf_counter() - self.started, self.stage)
+        return False
+
+
+_NOOP_SPAN = nullcontext()
+
+
+def span(stage: str):
+    """`with span("retrieve"): ...` records the block's duration under `stage`."""
+    if not settings.METRICS_ENABLED:
+        return _NOOP_SPAN
+    return _Span(stage)
+
+
+def timed(stage: str):
+    """Decorator form of `span` for whole functions (sync or `async def`)."""
+    def decorator(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_llm_call(call: str, prompt: Optional[str] = None, response=None, completion: Optional[str] = None,
+                    usage: Optional[Dict[str, int]] = None):
+    """Count one chat model call and its tokens (from `response.usage_metadata` / `usage` when present)."""
+    if not settings.METRICS_ENABLED:
+        return
+    LLM_CALLS.inc(1, call)
+    usage = usage or getattr(response, "usage_metadata", None) or {}
+    prompt_tokens = usage.get("input_tokens")
+    completion_tokens = usage.get("output_tokens")
+    if prompt_tokens is None and prompt is not None:
+        prompt_tokens = len(prompt) // 4
+    if completion_tokens is None and completion is not None:
+        completion_tokens = len(completion) // 4
+    if prompt_tokens:
+        LLM_TOKENS.inc(prompt_tokens, call, "prompt")
+    if completion_tokens:
+        LLM_TOKENS.inc(completion_tokens, call, "completion")
+
+
+def stage_summary(prefix: str = "") -> str:
+    """One-line 'stage total (count)' summary for console output, e.g. at the end of ingest."""
+    parts = []
+    for (stage,), s in sorted(STAGE_SECONDS.snapshot().items(), key=lambda item: -item[1]["sum"]):
+        if stage.startswith(prefix):
+            parts.append(f"{stage} {s['sum']:.2f}s ({s['count']})")
+    return ", ".join(parts)
+
+
+def register_stats(name: str, help_text: str, labelname: str, stats_fn: Callable[[], Optional[Dict[str, float]]],
+                   keys: Iterable[str], kind: str = "counter"):
+    """Expose selected numeric fields of a component's `stats()` dict as one labelled metric."""
+    keys = tuple(keys)
+
+    def collect():
+        stats = stats_fn() or {}
+        return {(k,): stats.get(k) for k in keys if isinstance(stats.get(k), (int, float))}
+
+    metrics.callback(name, help_text, kind, [labelname], collect)
@@ -0,0 +1,176 @@
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from backend.utils import filter_matches
+
+# Fields the partition layout can evaluate without looking at individual rows
+PARTITION_FIELDS = ("department", "country", "visibility")
+# Search plans (blocks + row masks) kept per distinct `where`
+MAX_CACHED_PLANS = 64
+
+PartitionKey = Tuple[str, str]
+
+
+def _where_fields(where: Optional[Dict[str, Any]]) -> set:
+    if not where:
+        return set()
+    if "$and" in where:
+        return set().union(*(_where_fields(c) for c in where["$and"]))
+    return set(where)
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class NumpyIndex:
+    """Exact in-memory cosine search over every chunk vector.
+
+    Rows are L2-normalised, sorted by (department, country) so each partition is one
+    contiguous block of the matrix. A `where` filter (as built by
+    `utils.build_access_filter`) resolves to a cached plan of partition blocks plus
+    per-row visibility masks; a search is one matrix-vector product per selected block
+    (slices, never copies of the matrix) and an `argpartition`. `search_batch` scores
+    many queries with matrix-matrix products. The matrix may be a read-only `np.memmap`
+    (see vector_snapshot.py), shared by every process that maps the same file.
+    """
+
+    def __init__(self, ids: Sequence[str], texts: Sequence[str], metadatas: Sequence[Dict[str, Any]], matrix: np.ndarray):
+        """`matrix` rows must already be normalised and ordered by (department, country); see `from_vectors`."""
+        self.ids = list(ids)
+        self.texts = list(texts)
+        self.metadatas = list(metadatas)
+        self.matrix = matrix
+        self.visibility = np.array([m.get("visibility", "all") for m in self.metadatas], dtype=object)
+
+        self.partitions: Dict[PartitionKey, slice] = {}
+        start = 0
+        for i in range(1, len(self.ids) + 1):
+            if i == len(self.ids) or self._key(i) != self._key(start):
+                self.partitions[self._key(start)] = slice(start, i)
+                start = i
+
+        self._plans: "OrderedDict[str, List[Tuple[slice, Optional[np.ndarray]]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, row: int) -> PartitionKey:
+        meta = self.metadatas[row]
+        return meta.get("department", ""), meta.get("country", "")
+
+    @classmethod
+    def from_vectors(cls, ids: Sequence[str], texts: Sequence[str], metadatas: Sequence[Dict[str, Any]], vectors) -> "NumpyIndex":
+        """Sort rows into partitions and normalise them into one contiguous float32 matrix."""
+        metadatas = [m or {} for m in metadatas]
+        order = sorted(range(len(ids)), key=lambda i: (metadatas[i].get("department", ""), metadatas[i].get("country", "")))
+        if order:
+            matrix = np.ascontiguousarray(_normalize_rows(np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)[order]))
+        else:
+            matrix = np.zeros((0, 0), dtype=np.float32)
+        return cls([ids[i] for i in order], [texts[i] or "" for i in order], [metadatas[i] for i in order], matrix)
+
+    @classmethod
+    def from_collection(cls, collection) -> "NumpyIndex":
+        data = collection.get(include=["embeddings", "documents", "metadatas"])
+        embeddings = data.get("embeddings")
+        if embeddings is None:
+            embeddings = []
+        return cls.from_vectors(data.get("ids") or [], data.get("documents") or [], data.get("metadatas") or [], embeddings)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dim(self) -> int:
+        return self.matrix.shape[1] if self.matrix.ndim == 2 else 0
+
+    def _build_plan(self, where: Optional[Dict[str, Any]]) -> List[Tuple[slice, Optional[np.ndarray]]]:
+        """Blocks to score for `where`, each with a row mask (None = every row of the block)."""
+        if not where:
+            return [(slice(0, len(self.ids)), None)]
+        if not _where_fields(where) <= set(PARTITION_FIELDS):
+            mask = np.array([filter_matches(m, where) for m in self.metadatas], dtype=bool)
+            return [(slice(0, len(self.ids)), mask)]
+        plan = []
+        for (department, country), block in self.partitions.items():
+            visibilities = self.visibility[block]
+            present = set(visibilities)
+            allowed = [v for v in present
+                       if filter_matches({"department": department, "country": country, "visibility": v}, where)]
+            if allowed:
+                plan.append((block, None if len(allowed) == len(present) else np.isin(visibilities, allowed)))
+        return plan
+
+    def _plan(self, where: Optional[Dict[str, Any]]) -> List[Tuple[slice, Optional[np.ndarray]]]:
+        key = json.dumps(where, sort_keys=True)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                return plan
+        plan = self._build_plan(where)
+        with self._lock:
+            self._plans[key] = plan
+            while len(self._plans) > MAX_CACHED_PLANS:
+                self._plans.popitem(last=False)
+        return plan
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        """Row indices of the k best scores per column of a (rows, queries) matrix, best first."""
+        if scores.shape[0] > k:
+            top = np.argpartition(-scores, k - 1, axis=0)[:k]
+        else:
+            top = np.broadcast_to(np.arange(scores.shape[0])[:, None], scores.shape)
+        order = np.argsort(-np.take_along_axis(scores, top, axis=0), axis=0, kind="stable")
+        return np.take_along_axis(top, order, axis=0)
+
+    def search(self, query_vector, k: int = 10, where: Optional[Dict[str, Any]] = None) -> List[Tuple[int, float]]:
+        """Top-k (position, cosine similarity) pairs for one query vector."""
+        return self.search_batch([query_vector], k=k, where=where)[0]
+
+    def search_batch(self, query_vectors, k: int = 10, where: Optional[Dict[str, Any]] = None) -> List[List[Tuple[int, float]]]:
+        """Top-k (position, cosine similarity) pairs for each of many query vectors sharing one filter."""
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        if k <= 0 or not self.ids:
+            return [[] for _ in range(len(queries))]
+        queries = _normalize_rows(queries).T  # (dim, queries)
+        score_parts, position_parts = [], []
+        for block, mask in self._plan(where):
+            scores = self.matrix[block] @ queries  # (rows, queries)
+            positions = np.arange(block.start, block.stop)
+            if mask is not None:
+                scores, positions = scores[mask], positions[mask]
+            score_parts.append(scores)
+            position_parts.append(positions)
+        if not sum(len(p) for p in position_parts):
+            return [[] for _ in range(queries.shape[1])]
+        scores = np.concatenate(score_parts) if len(score_parts) > 1 else score_parts[0]
+        positions = np.concatenate(position_parts) if len(position_parts) > 1 else position_parts[0]
+        top = self._top_k(scores, k)
+        return [
+            [(int(positions[i]), float(scores[i, q])) for i in top[:, q]]
+            for q in range(queries.shape[1])
+        ]
+
+    def documents(self, positions: Sequence[int]) -> List[Document]:
+        return [Document(page_content=self.texts[i], metadata=dict(self.metadatas[i])) for i in positions]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "chunks": len(self.ids),
+            "dim": self.dim,
+            "partitions": len(self.partitions),
+            "dtype": str(self.matrix.dtype),
+            "memory_mapped": isinstance(self.matrix, np.memmap),
+            "matrix_mb": round(self.matrix.nbytes / 1e6, 2),
+            "cached_plans": len(self._plans),
+        }
@@ -0,0 +1,173 @@
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from backend.config import settings
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+PROFILE_HEADER = "X-Profile"
+# Worker threads that run parts of a request (see rag_pipeline's executors)
+REQUEST_THREAD_PREFIXES = ("rag-blocking", "rag-stage")
+
+_PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+Frame = Tuple[str, str, int]
+
+
+class SamplingProfiler:
+    """Statistical wall-clock profiler: a background thread snapshots stacks every `interval` seconds.
+
+    The thread that calls `start()` is always sampled, including while it waits (an event
+    loop blocked in `select` is time spent on I/O). Other threads are sampled when
+    `thread_filter(thread)` accepts them, and only while they are running project code,
+    so idle pool workers do not show up. Output is a speedscope file with one profile per
+    thread (open it at https://www.speedscope.app or with `speedscope <file>`).
+    """
+
+    def __init__(self, interval: float = 0.005, thread_filter: Optional[Callable[[threading.Thread], bool]] = None):
+        self.interval = interval
+        self.thread_filter = thread_filter
+        self._frames: Dict[Frame, int] = {}
+        self._samples: Dict[int, List[List[int]]] = {}
+        self._weights: Dict[int, List[float]] = {}
+        self._thread_names: Dict[int, str] = {}
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self.origin_ident: Optional[int] = None
+        self.started = 0.0
+        self.elapsed = 0.0
+        self.sample_count = 0
+
+    def start(self):
+        self.origin_ident = threading.get_ident()
+        self.started = time.perf_counter()
+        self._sampler = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def _frame_index(self, code) -> int:
+        key = (getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno)
+        index = self._frames.get(key)
+        if index is None:
+            index = self._frames[key] = len(self._frames)
+        return index
+
+    def _run(self):
+        own = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            weight, last = now - last, now
+            threads = {t.ident: t for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                thread = threads.get(ident)
+                if ident != self.origin_ident and (thread is None or self.thread_filter is None or not self.thread_filter(thread)):
+                    continue
+                stack = []
+                in_project = ident == self.origin_ident
+                while frame is not None:
+                    code = frame.f_code
+                    in_project = in_project or code.co_filename.startswith(_PROJECT_DIR)
+                    stack.append(self._frame_index(code))
+                    frame = frame.f_back
+                if not in_project:
+                    continue
+                stack.reverse()
+                self._samples.setdefault(ident, []).append(stack)
+                self._weights.setdefault(ident, []).append(weight)
+                self._thread_names[ident] = thread.name if thread is not None else str(ident)
+                self.sample_count += 1
+
+    def to_speedscope(self, name: str) -> Dict:
+        frames = [{"name": qualname, "file": filename, "line": line} for (qualname, filename, line) in self._frames]
+        # origin thread first, so speedscope opens on the request itself
+        idents = sorted(self._samples, key=lambda i: (i != self.origin_ident, self._thread_names.get(i, "")))
+        profiles = []
+        for ident in idents:
+            weights = self._weights[ident]
+            profiles.append({
+                "type": "sampled",
+                "name": f"{name} [{self._thread_names.get(ident, ident)}]",
+                "unit": "seconds",
+                "startValue": 0,
+                "endValue": round(sum(weights), 6),
+                "samples": self._samples[ident],
+                "weights": [round(w, 6) for w in weights],
+            })
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": name,
+            "exporter": "hr-enterprise-assistant",
+            "activeProfileIndex": 0,
+            "shared": {"frames": frames},
+            "profiles": profiles,
+        }
+
+    def write(self, path: str, name: str) -> str:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.to_speedscope(name), f)
+        os.replace(tmp, path)
+        return path
+
+
+def request_threads(thread: threading.Thread) -> bool:
+    return thread.name.startswith(REQUEST_THREAD_PREFIXES)
+
+
+def all_threads(thread: threading.Thread) -> bool:
+    return True
+
+
+def profile_path(name: str) -> str:
+    """Unique `PROFILE_DIR/<timestamp>-<name>-<id>.speedscope.json` path."""
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "-", name).strip("-") or "profile"
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    return os.path.join(settings.PROFILE_DIR, f"{stamp}-{slug}-{uuid.uuid4().hex[:8]}.speedscope.json")
+
+
+def should_profile(header_value: Optional[str] = None, authorized: bool = False) -> bool:
+    """Profile when an authorized caller sent `X-Profile: 1`, else with probability `PROFILE_SAMPLE_RATE`."""
+    if authorized and (header_value or "").strip().lower() in ("1", "true", "yes", "on"):
+        return True
+    rate = settings.PROFILE_SAMPLE_RATE
+    return rate > 0 and random.random() < rate
+
+
+@contextmanager
+def profile(name: str, path: Optional[str] = None,
+            thread_filter: Optional[Callable[[threading.Thread], bool]] = request_threads) -> Iterator[str]:
+    """Profile the enclosed block and write a speedscope file; yields the file path.
+
+    Works around `await`s too: the event loop thread is sampled while the coroutine runs,
+    together with the RAG worker threads. Concurrent requests sharing those threads can
+    appear in the same profile.
+    """
+    path = path or profile_path(name)
+    profiler = SamplingProfiler(interval=settings.PROFILE_INTERVAL_MS / 1000, thread_filter=thread_filter)
+    profiler.start()
+    try:
+        yield path
+    finally:
+        profiler.stop()
+        try:
+            profiler.write(path, name)
+            print(f"🔬 Profile {name!r}: {profiler.sample_count} samples over {profiler.elapsed:.2f}s → {path}")
+        except OSError as e:
+            print(f"⚠️ Could not write profile {path}: {e}")
@@ -1,127 +1,324 @@
-from typing import List, Optional, Tuple, Dict, Any
+from typing import AsyncIterator, Iterator, List, Optional, Tuple, Dict, Any
+import asyncio
+import functools
 import re
 import json
-from langchain_chroma import Chroma
-from langchain_google_genai import (
-    ChatGoogleGenerativeAI,
-    GoogleGenerativeAIEmbeddings
-)
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from pydantic import BaseModel, Field
 from langchain_core.documents import Document
 from backend.config import settings
 from backend import db
+from backend.clients import registry
+from backend.answer_cache import answer_cache, make_scope
+from backend.context_budget import context_budgeter
+from backend.embedding_cache import embed_queries
+from backend.history_writer import history_writer
+from backend.metrics import LEXICAL_FAST_PATH, RELAXED_RETRIEVALS, STAGE_SECONDS, record_llm_call, register_stats, span, timed
+from backend.utils import build_access_filter, filter_matches
+
+# Below this share of the corpus a filter counts as very selective (see _filtered_search)
+SELECTIVE_FILTER_RATIO = 0.05
+# Reciprocal rank fusion constant for hybrid (BM25 + vector) retrieval
+RRF_K = 60
+
 
 def get_vectorstore():
-    # Try several candidate vectorstore directories (ingest and db use different paths)
-    candidates = [
-        "backend/vectorstore",
-        "./chroma_db",
-        "chroma_db",
-        "vectorstore",
-    ]
-    chosen = None
-    import os
-    for c in candidates:
-        if os.path.exists(c):
-            chosen = c
-            break
+    """Return the process-wide vector store (built once, shared across requests)."""
+    return registry.vectorstore()
 
-    if not chosen:
-        # fallback to the first candidate (will create when writing)
-        chosen = candidates[0]
 
-    embeddings = GoogleGenerativeAIEmbeddings(
-        model="models/embedding-001",
-        google_api_key=settings.GEMINI_API_KEY
-    )
+# Partition sizes per (department, country, visibility), refreshed when the index generation changes
+_partition_cache: Dict[str, Any] = {"generation": None, "counts": {}, "normalized": False}
+
+
+def _partition_counts(vectorstore=None) -> Tuple[Dict[Tuple[str, str, str], int], bool]:
+    """Count chunks per metadata partition once per index generation.
+
+    Also reports whether the store carries the normalized `visibility` field written by
+    the current ingest (older stores are filtered without the visibility clause).
+    With `RETRIEVER=numpy` the metadata comes from the NumPy index, so Chroma is not opened.
+    """
+    generation = registry.generation
+    if _partition_cache["generation"] != generation or not _partition_cache["counts"]:
+        counts: Dict[Tuple[str, str, str], int] = {}
+        normalized = False
+        try:
+            if settings.RETRIEVER == "numpy":
+                metas = registry.numpy_index().metadatas
+            else:
+                metas = (vectorstore or get_vectorstore())._collection.get(include=["metadatas"]).get("metadatas") or []
+        except Exception:
+            metas = []
+        for m in metas:
+            m = m or {}
+            if "visibility" in m:
+                normalized = True
+            key = (m.get("department", ""), m.get("country", ""), m.get("visibility", "all"))
+            counts[key] = counts.get(key, 0) + 1
+        _partition_cache.update(generation=generation, counts=counts, normalized=normalized)
+        if metas and not normalized:
+            print("⚠️ Vector store predates normalized metadata; re-run ingest to enable visibility filtering")
+    return _partition_cache["counts"], _partition_cache["normalized"]
+
+
+def _filtered_search(vectorstore, question: str, query_vector, k: int, where: Optional[Dict[str, Any]]) -> List[Document]:
+    """Similarity search under the access filter, on Chroma or the NumPy index (`settings.RETRIEVER`)."""
+    if settings.RETRIEVER == "numpy":
+        docs = _numpy_search(question, query_vector, k, where)
+    else:
+        docs = _chroma_search(vectorstore, question, query_vector, k, where)
+    return _finish_search(question, docs, k, where)
+
+
+def _finish_search(question: str, docs: List[Document], k: int, where: Optional[Dict[str, Any]]) -> List[Document]:
+    """Rank-fuse with BM25 (hybrid mode) and drop repeated policies."""
+    if settings.RETRIEVAL_MODE == "hybrid":
+        with span("bm25_search"):
+            lexical_docs = _lexical_search(question, k, where)
+        docs = _fuse_rankings(docs, lexical_docs, k)
+    return _dedupe_documents(docs)
+
+
+def _numpy_search(question: str, query_vector, k: int, where: Optional[Dict[str, Any]]) -> List[Document]:
+    """Exact top-k from the in-memory NumPy index (one matrix-vector product per filter)."""
+    if query_vector is None:
+        with span("embed_query"):
+            query_vector = registry.embeddings().embed_query(question)
+    index = registry.numpy_index()
+    with span("numpy_search"):
+        hits = index.search(query_vector, k=k, where=where)
+    return index.documents([position for position, _ in hits])
+
+
+def _chroma_search(vectorstore, question: str, query_vector, k: int, where: Optional[Dict[str, Any]]) -> List[Document]:
+    """Similarity search with the access filter applied inside Chroma.
+
+    The fetch size adapts to the filter's selectivity: it is clamped to the number of
+    matching chunks, and very selective filters (where approximate filtered HNSW search
+    can come back short) fall back to an exact scan of just the matching partition.
+    """
+    counts, _ = _partition_counts(vectorstore)
+    total = sum(counts.values())
+    matching = _matching_chunks(counts, where)
+    if counts and matching == 0:
+        return []
+    n = min(k, matching) if counts else k
+
+    docs: List[Document] = []
+    try:
+        with span("vector_search"):
+            if query_vector is not None:
+                docs = vectorstore.similarity_search_by_vector(query_vector, k=n, filter=where)
+            else:
+                docs = vectorstore.similarity_search(question, k=n, filter=where)
+    except Exception as e:
+        print(f"⚠️ Filtered vector search failed ({e}); scanning partition instead")
+
+    selective = bool(where) and total and matching / total < SELECTIVE_FILTER_RATIO
+    if len(docs) < n and selective:
+        with span("exact_partition_scan"):
+            docs = _exact_partition_search(vectorstore, question, query_vector, n, where)
+    return docs
 
-    return Chroma(
-        persist_directory=chosen,
-        embedding_function=embeddings
-    )
 
+def _matching_chunks(counts: Dict[Tuple[str, str, str], int], where: Optional[Dict[str, Any]]) -> int:
+    if not where:
+        return sum(counts.values())
+    return sum(n for (d, c, v), n in counts.items() if filter_matches({"department": d, "country": c, "visibility": v}, where))
 
-def retrieve_documents(question: str, department: str, country: Optional[str] = None, k: int = 10, role: Optional[str] = None) -> Tuple[List[Document], bool]:
-    """Retrieve documents relevant to the question and strictly filter by department and visibility.
 
-    - Documents tagged with a `department` metadata that matches the requested department are prioritized.
-    - Documents containing `common` in text or metadata are allowed.
-    - Documents with visibility set to `HR_ONLY` are excluded for `employee` role.
+def _chroma_search_batch(vectorstore, questions: List[str], query_vectors, k: int, where: Optional[Dict[str, Any]]) -> List[List[Document]]:
+    """`_chroma_search` for many query vectors sharing one filter, as a single Chroma query.
+
+    Questions the batched query leaves short under a very selective filter get the exact
+    partition scan; if the batched query fails, every question is searched on its own.
     """
-    vectorstore = get_vectorstore()
+    counts, _ = _partition_counts(vectorstore)
+    total = sum(counts.values())
+    matching = _matching_chunks(counts, where)
+    if counts and matching == 0:
+        return [[] for _ in questions]
+    n = min(k, matching) if counts else k
 
-    docs = vectorstore.similarity_search(question, k=k)
+    try:
+        with span("vector_search"):
+            data = vectorstore._collection.query(query_embeddings=[list(v) for v in query_vectors], n_results=n,
+                                                 where=where or None, include=["documents", "metadatas"])
+    except Exception as e:
+        print(f"⚠️ Batched vector search failed ({e}); searching per question")
+        return [_chroma_search(vectorstore, q, v, k, where) for q, v in zip(questions, query_vectors)]
 
-    department_l = (department or "").lower()
-    role_l = (role or "").lower()
-    country_l = (country or "").lower()
+    selective = bool(where) and total and matching / total < SELECTIVE_FILTER_RATIO
+    batches = []
+    for question, vector, texts, metas in zip(questions, query_vectors, data["documents"], data["metadatas"]):
+        docs = [Document(page_content=text or "", metadata=meta or {}) for text, meta in zip(texts, metas)]
+        if len(docs) < n and selective:
+            with span("exact_partition_scan"):
+                docs = _exact_partition_search(vectorstore, question, vector, n, where)
+        batches.append(docs)
+    return batches
+
+
+def _lexical_documents(index, positions) -> List[Document]:
+    return [Document(page_content=index.texts[i], metadata=dict(index.metadatas[i])) for i in positions]
 
-    filtered_docs: List[Document] = []
+
+def _lexical_search(question: str, k: int, where: Optional[Dict[str, Any]]) -> List[Document]:
+    try:
+        index = registry.lexical()
+    except Exception as e:
+        print(f"⚠️ BM25 index unavailable ({e}); using vector results only")
+        return []
+    return _lexical_documents(index, [i for i, _ in index.search(question, k=k, where=where)])
+
+
+def _fuse_rankings(vector_docs: List[Document], lexical_docs: List[Document], k: int) -> List[Document]:
+    """Reciprocal rank fusion of the vector and BM25 rankings (chunks matched on source + text)."""
+    scores: Dict[Tuple[str, str], float] = {}
+    by_key: Dict[Tuple[str, str], Document] = {}
+    for ranking in (vector_docs, lexical_docs):
+        for rank, doc in enumerate(ranking):
+            key = ((doc.metadata or {}).get("source", ""), doc.page_content)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+            by_key.setdefault(key, doc)
+    ranked = sorted(scores, key=lambda key: -scores[key])
+    return [by_key[key] for key in ranked[:k]]
+
+
+def _dedupe_documents(docs: List[Document]) -> List[Document]:
+    """Drop repeats of the same policy (keyed on `policy_id` for CSV rows, text otherwise), keeping rank order."""
+    seen = set()
+    unique = []
     for doc in docs:
-        text = (doc.page_content or "").lower()
-        meta = {k.lower(): str(v).lower() for k, v in (doc.metadata or {}).items()}
-
-        doc_dept = meta.get("department", "")
-        doc_country = meta.get("country", "")
-        visibility = meta.get("visibility", "all")
-        source_name = meta.get("source", "") or meta.get("source_file", "")
-
-        # Try to infer department from source filename if not explicitly provided
-        if not doc_dept and source_name:
-            sn = source_name.lower()
-            if "hr" in sn or "hr_" in sn or "human" in sn:
-                doc_dept = "hr"
-            elif "it" in sn or "it_department" in sn or "it_" in sn:
-                doc_dept = "it"
-            elif "finance" in sn or "finance_" in sn or "payroll" in sn:
-                doc_dept = "finance"
-            elif "product" in sn or "product_" in sn:
-                doc_dept = "product"
-            elif "engineering" in sn or "engineer" in sn or "eng_" in sn:
-                doc_dept = "engineering"
-            elif "common" in sn or "company" in sn:
-                doc_dept = "common"
-
-        # Visibility: if document is HR-only and requester is an employee, skip
-        if role_l == "employee" and visibility in ("hr", "hr_only", "hr-only"):
+        meta = doc.metadata or {}
+        key = ("policy", meta["policy_id"], meta.get("country", "")) if meta.get("policy_id") else ("text", doc.page_content)
+        if key in seen:
             continue
+        seen.add(key)
+        unique.append(doc)
+    return unique
+
+
+def _exact_partition_search(vectorstore, question: str, query_vector, k: int, where: Dict[str, Any]) -> List[Document]:
+    if query_vector is None:
+        query_vector = registry.embeddings().embed_query(question)
+    data = vectorstore._collection.get(where=where, include=["embeddings", "documents", "metadatas"])
+    embeddings = data.get("embeddings")
+    if embeddings is None or len(embeddings) == 0:
+        return []
+    matrix = np.asarray(embeddings, dtype=np.float32)
+    query = np.asarray(query_vector, dtype=np.float32)
+    scores = (matrix @ query) / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query) + 1e-12)
+    top = np.argsort(-scores)[:k]
+    return [
+        Document(page_content=data["documents"][i] or "", metadata=data["metadatas"][i] or {})
+        for i in top
+    ]
 
-        # If a specific country/policy type was requested, require document country to match exactly
-        if country_l:
-            # require doc_country to be present and contain the requested country token
-            if not doc_country:
-                # skip documents without explicit country when user requested a specific country
-                continue
-            if country_l not in str(doc_country).lower():
-                continue
-
-        # Accept if department matches, or document marked common
-        if (
-            department_l and (department_l in text or department_l == doc_dept)
-        ) or "common" in text or "common" in doc_dept:
-            filtered_docs.append(doc)
-
-    # If no strict matches found, attempt a relaxed fallback
-    relaxed = False
-    if not filtered_docs:
+
+@timed("retrieve")
+def retrieve_documents(question: str, department: str, country: Optional[str] = None, k: int = 10, role: Optional[str] = None, query_vector: Optional[List[float]] = None) -> Tuple[List[Document], bool]:
+    """Retrieve documents relevant to the question, filtered by department, country and visibility.
+
+    - The filter runs inside the vector search (Chroma `where`) on the normalized
+      `department` / `country` / `visibility` fields written at ingest.
+    - Documents whose department is `common` are always allowed.
+    - Documents with visibility `hr_only` are excluded for non-HR roles.
+    Returns (documents, relaxed) where `relaxed` marks a fallback outside the strict filter.
+    """
+    vectorstore = None if settings.RETRIEVER == "numpy" else get_vectorstore()
+    role_l = (role or "").lower()
+    _, normalized = _partition_counts(vectorstore)
+    if query_vector is None and settings.RETRIEVER == "numpy":
+        # embedded once and reused by the relaxed fallback searches below
+        with span("embed_query"):
+            query_vector = registry.embeddings().embed_query(question)
+
+    where = build_access_filter(department, country, role_l, include_visibility=normalized)
+    filtered_docs = _filtered_search(vectorstore, question, query_vector, k, where)
+    if filtered_docs:
+        return filtered_docs, False
+
+    # No strict matches: attempt a relaxed fallback
+    if role_l == "hr":
         # HR can see everything: return top matches
-        if role_l == "hr":
-            relaxed = True
-            filtered_docs = docs
+        RELAXED_RETRIEVALS.inc(1, "hr_unfiltered")
+        return _filtered_search(vectorstore, question, query_vector, k, None), True
+
+    # include any 'common' docs first, then top matches the role may see
+    common_where = build_access_filter("common", None, role_l, include_visibility=normalized)
+    docs = _filtered_search(vectorstore, question, query_vector, k, common_where)
+    if docs:
+        RELAXED_RETRIEVALS.inc(1, "common")
+    else:
+        RELAXED_RETRIEVALS.inc(1, "any_department")
+        docs = _filtered_search(vectorstore, question, query_vector, k, build_access_filter(None, None, role_l, include_visibility=normalized))
+    return docs, True
+
+
+@timed("retrieve_batch")
+def retrieve_documents_batch(questions: List[str], query_vectors: List[List[float]], department: str, country: Optional[str] = None, k: int = 10, role: Optional[str] = None) -> List[Tuple[List[Document], bool]]:
+    """`retrieve_documents` for many questions under one user's access filter.
+
+    The strict-filter vector search runs once for the whole batch (a matrix-matrix product
+    on the NumPy index, one multi-vector query on Chroma); questions it leaves without
+    documents take the per-question relaxed fallback of `retrieve_documents`.
+    """
+    if not questions:
+        return []
+    vectorstore = None if settings.RETRIEVER == "numpy" else get_vectorstore()
+    _, normalized = _partition_counts(vectorstore)
+    where = build_access_filter(department, country, (role or "").lower(), include_visibility=normalized)
+    if settings.RETRIEVER == "numpy":
+        index = registry.numpy_index()
+        with span("numpy_search"):
+            hits = index.search_batch(query_vectors, k=k, where=where)
+        batches = [index.documents([position for position, _ in h]) for h in hits]
+    else:
+        batches = _chroma_search_batch(vectorstore, questions, query_vectors, k, where)
+
+    results = []
+    for question, vector, docs in zip(questions, query_vectors, batches):
+        docs = _finish_search(question, docs, k, where)
+        if docs:
+            results.append((docs, False))
         else:
-            # include any 'common' docs first
-            common_docs = [d for d in docs if "common" in (d.page_content or "").lower() or "common" in str(d.metadata).lower()]
-            if common_docs:
-                relaxed = True
-                filtered_docs = common_docs
-            else:
-                # as last resort, return top similarity matches but mark as relaxed
-                relaxed = True
-                filtered_docs = docs
+            results.append(retrieve_documents(question, department, country=country, k=k, role=role, query_vector=vector))
+    return results
 
-    return filtered_docs, relaxed
 
+@timed("lexical_fast_path")
+def lexical_fast_path(question: str, department: str, country: Optional[str] = None, k: int = 10, role: Optional[str] = None) -> Optional[List[Document]]:
+    """Resolve policy-ID / exact keyword queries from the BM25 index, skipping the embedding call.
 
+    Returns the matching chunks (same access filter as `retrieve_documents`), or None when
+    the question is not a precise lookup and should go through vector retrieval.
+    """
+    if not settings.LEXICAL_FAST_PATH:
+        return None
+    try:
+        index = registry.lexical()
+        _, normalized = _partition_counts()
+    except Exception as e:
+        print(f"⚠️ Lexical fast path unavailable: {e}")
+        return None
+    where = build_access_filter(department, country, (role or "").lower(), include_visibility=normalized)
+    positions = index.precise_matches(question, where=where)[:k]
+    if not positions:
+        LEXICAL_FAST_PATH.inc(1, "miss")
+        return None
+    LEXICAL_FAST_PATH.inc(1, "hit")
+    print(f"⚡ Lexical fast path: {len(positions)} chunk(s) for {question!r}")
+    return _dedupe_documents(_lexical_documents(index, positions))
+
+
+@timed("db_history_recent")
 def _fetch_conversation_history(username: str, limit: int = 6):
+    if settings.HISTORY_WRITE_BEHIND and history_writer.pending(username):
+        # the user's previous exchange may still be queued: wait for their rows so the context includes it
+        history_writer.flush(timeout=1.0, session_id=username)
     session = db.SessionLocal()
     try:
         msgs = (
@@ -137,52 +334,70 @@ def _fetch_conversation_history(username: str, limit: int = 6):
         session.close()
 
 
-def _save_chat_message(username: str, role: str, content: str, department: Optional[str] = None):
+def _save_chat_message(username: str, role: str, content: str, department: Optional[str] = None, turn_id: Optional[str] = None):
+    # messages of one question/answer exchange share a turn_id (see _save_exchange)
+    turn_id = turn_id or db.new_turn_id()
+    if settings.HISTORY_WRITE_BEHIND:
+        # batched into one transaction by the background writer; never waits on SQLite
+        history_writer.enqueue(username, role, content, department=department, turn_id=turn_id)
+        return
     session = db.SessionLocal()
     try:
-        m = db.ChatMessage(session_id=username, role=role, content=content, department=(department or ""))
-        session.add(m)
-        session.commit()
+        with span("db_history_write"):
+            m = db.ChatMessage(session_id=username, role=role, content=content, department=(department or ""), turn_id=turn_id)
+            session.add(m)
+            session.commit()
     finally:
         session.close()
 
 
-def generate_answer(question: str, documents: List[Document], department: str, role: str, username: Optional[str] = None, relaxed: bool = False) -> Dict[str, Any]:
-    """Generate a structured response dict:
-    {
-      answer: str,
-      suggested_follow_ups: [str],
-      next_steps: str,
-      confidence: int (optional, only for HR)
-    }
-    """
-    if not documents:
-        reply = (
-            f"I searched {department}-specific and company-wide (common) policy documents and did not find any mention that answers your question. "
-            "For confirmation, please consult your HR representative or submit a formal request for review."
-        )
-        if username:
-            _save_chat_message(username, "assistant", reply, department=department)
-        return {
-            "answer": reply,
-            "suggested_follow_ups": [
-                "Do you mean paid time off for innovation projects or a formal leave type?",
-                "Which team or product is this request for (so I can search more precisely)?"
-            ],
-            "next_steps": "I can broaden the search to related departments (IT/Product) or escalate this to HR. Which would you prefer?"
-        }
+DEFAULT_FOLLOW_UPS = [
+    "Do you mean paid time off for innovation projects or a formal leave type?",
+    "Which team or product is this request for (so I can search more precisely)?"
+]
+DEFAULT_NEXT_STEPS = "I can broaden the search to related departments (IT/Product) or escalate this to HR. Which would you prefer?"
+
+# Runs the optional evaluator / restructuring calls of the multi-call mode side by side
+_stage_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rag-stage")
+
+
+class StructuredAnswer(BaseModel):
+    """Schema for single-call generation."""
+    answer: str = Field(description="Concise, user-facing answer grounded only in the policy excerpts")
+    suggested_follow_ups: List[str] = Field(default_factory=list, description="Up to 2 short follow-up questions")
+    next_steps: str = Field(default="", description="One short actionable next step for the user")
+    confidence: Optional[int] = Field(default=None, description="0-100: how much of the answer is directly supported by the excerpts")
 
-    context = "\n\n".join(
-        f"[{doc.metadata.get('policy_name', 'Policy')}]\n{doc.page_content}"
-        for doc in documents
-    )
 
-    llm = ChatGoogleGenerativeAI(
-        model="gemini-2.5-flash",
-        google_api_key=settings.GEMINI_API_KEY,
-        temperature=0
+def _is_hr(role: Optional[str]) -> bool:
+    return (role or "").lower() in ("hr", "human resources")
+
+
+def _no_documents_answer(department: str, username: Optional[str]) -> Dict[str, Any]:
+    reply = (
+        f"I searched {department}-specific and company-wide (common) policy documents and did not find any mention that answers your question. "
+        "For confirmation, please consult your HR representative or submit a formal request for review."
     )
+    if username:
+        _save_chat_message(username, "assistant", reply, department=department)
+    return {
+        "answer": reply,
+        "suggested_follow_ups": list(DEFAULT_FOLLOW_UPS),
+        "next_steps": DEFAULT_NEXT_STEPS
+    }
+
 
+def _build_context(documents: List[Document]) -> str:
+    """Deduplicated, merged and budget-packed context (see `context_budget.ContextBudgeter`)."""
+    with span("context_assembly"):
+        context, report = context_budgeter.assemble(documents)
+    print(f"🧮 Context: {report['chunks_in']}→{report['chunks_out']} chunks, "
+          f"{report['tokens_in']}→{report['tokens_out']} tokens (saved {report['tokens_saved']})")
+    return context
+
+
+def _build_messages(question: str, context: str, department: str, role: str, username: Optional[str], relaxed: bool, mode: str = "text") -> List[Dict[str, str]]:
+    """Chat messages for the answer call. `mode`: "text", "structured" (schema output) or "stream"."""
     system_prompt = f"""
 You are an Enterprise HR Policy Assistant for a company.
 
@@ -206,117 +421,592 @@ Return the answer in clear natural language. Do not include internal notes.
             role_label = "user" if (h.role or "").lower() == "user" else "assistant"
             messages.append({"role": role_label, "content": h.content})
 
+    if mode == "structured":
+        instructions = (
+            "Fill every field of the response schema: `answer` (the answer only, without follow-ups or next steps), "
+            "`suggested_follow_ups` (0-2 questions based on previous context) and `next_steps` (one short action)."
+        )
+        if _is_hr(role):
+            instructions += " Also set `confidence` to a 0-100 score of how much of the answer is directly supported by the policies."
+    elif mode == "stream":
+        # follow-ups and next steps are sent as separate events after the streamed answer
+        instructions = "Answer clearly and politely. Do not list follow-up questions or next steps; they are provided separately."
+    else:
+        instructions = "Answer clearly and politely. Also provide 0-2 suggested follow-up questions based on previous context."
+
     user_prompt = f"""
 {preface}Policies:
 {context}
 
 Previous question: {question}
 
-Answer clearly and politely. Also provide 0-2 suggested follow-up questions based on previous context.
+{instructions}
 """
 
     messages.append({"role": "user", "content": user_prompt})
+    return messages
+
+
+def _strip_sections(text: str) -> str:
+    """Sanitize an answer: strip trailing suggestion/next-step sections."""
+    lower = text.lower()
+    markers = [
+        "next step:", "next steps:",
+        "suggested follow-up", "suggested follow-ups",
+        "suggested follow-up questions", "suggested follow-ups:",
+        "suggested follow ups", "suggested questions",
+        "suggestions:", "follow-up questions:"
+    ]
+    idxs = []
+    for m in markers:
+        i = lower.find(m)
+        if i != -1:
+            idxs.append(i)
+    if not idxs:
+        return text.strip()
+    cut = min(idxs)
+    return text[:cut].strip()
+
+
+def _fallback_suggestions(final_answer: str) -> List[str]:
+    suggested: List[str] = []
+    lines = [l.strip("-* ") for l in final_answer.splitlines() if l.strip()]
+    for l in lines:
+        if len(suggested) >= 2:
+            break
+        if l.lower().startswith("suggest") or l.endswith("?"):
+            suggested.append(l)
+    return suggested or list(DEFAULT_FOLLOW_UPS)
 
-    llm_response = llm.invoke(messages).content
 
-    # Save user + assistant messages
-    if username:
-        _save_chat_message(username, "user", question, department=department)
-        _save_chat_message(username, "assistant", llm_response, department=department)
-
-    final_answer = llm_response.strip()
-
-    # Sanitize final_answer: strip trailing suggestion/next-step sections
-    def _strip_sections(text: str) -> str:
-        lower = text.lower()
-        markers = [
-            "next step:", "next steps:",
-            "suggested follow-up", "suggested follow-ups",
-            "suggested follow-up questions", "suggested follow-ups:",
-            "suggested follow ups", "suggested questions",
-            "suggestions:", "follow-up questions:"
-        ]
-        idxs = []
-        for m in markers:
-            i = lower.find(m)
-            if i != -1:
-                idxs.append(i)
-        if not idxs:
-            return text.strip()
-        cut = min(idxs)
-        return text[:cut].strip()
-
-    final_answer = _strip_sections(final_answer)
-
-    # Compute confidence only for HR role
-    confidence_score: Optional[int] = None
-    if (role or "").lower() in ("hr", "human resources"):
-        eval_prompt = (
-            "Please provide a single numeric confidence score (0-100) that indicates how much of the answer above is directly supported by the provided policy excerpts. "
-            "Respond with only the number and no additional text.\n\n"
-            f"Policies:\n{context}\n\nAnswer:\n{final_answer}"
-        )
-        try:
-            eval_resp = llm.invoke([
-                {"role": "system", "content": "You are an objective evaluator that returns a single number."},
-                {"role": "user", "content": eval_prompt}
-            ]).content
-            m = re.search(r"(\d{1,3})", eval_resp)
-            if m:
-                confidence_score = max(0, min(100, int(m.group(1))))
-            else:
-                confidence_score = 80
-        except Exception:
-            confidence_score = 80
+def _confidence_messages(context: str, final_answer: str) -> List[Dict[str, str]]:
+    eval_prompt = (
+        "Please provide a single numeric confidence score (0-100) that indicates how much of the answer above is directly supported by the provided policy excerpts. "
+        "Respond with only the number and no additional text.\n\n"
+        f"Policies:\n{context}\n\nAnswer:\n{final_answer}"
+    )
+    return [
+        {"role": "system", "content": "You are an objective evaluator that returns a single number."},
+        {"role": "user", "content": eval_prompt}
+    ]
 
-    # Request structured JSON for suggestions and next steps from the LLM
-    suggested: List[str] = []
-    next_steps: str = ""
+
+def _parse_confidence(eval_resp: str) -> int:
+    m = re.search(r"(\d{1,3})", eval_resp or "")
+    if m:
+        return max(0, min(100, int(m.group(1))))
+    return 80
+
+
+def _restructure_messages(context: str, final_answer: str) -> List[Dict[str, str]]:
+    """Request structured JSON for suggestions and next steps from the LLM."""
+    struct_prompt = (
+        "Given the provided policies and the assistant answer, return a JSON object with the keys:\n"
+        "- answer: a concise, user-facing answer string\n"
+        "- suggested_follow_ups: an array of up to 2 short follow-up question strings\n"
+        "- next_steps: one short actionable next step the user can take\n"
+        "Return ONLY valid JSON. Do not include any commentary.\n\n"
+        f"Policies:\n{context}\n\nAnswer:\n{final_answer}"
+    )
+    return [
+        {"role": "system", "content": "You are a helpful assistant that outputs strict JSON."},
+        {"role": "user", "content": struct_prompt}
+    ]
+
+
+def _parse_restructured(struct_resp: Optional[str], final_answer: str) -> Dict[str, Any]:
     try:
-        struct_prompt = (
-            "Given the provided policies and the assistant answer, return a JSON object with the keys:\n"
-            "- answer: a concise, user-facing answer string\n"
-            "- suggested_follow_ups: an array of up to 2 short follow-up question strings\n"
-            "- next_steps: one short actionable next step the user can take\n"
-            "Return ONLY valid JSON. Do not include any commentary.\n\n"
-            f"Policies:\n{context}\n\nAnswer:\n{final_answer}"
-        )
-        struct_resp = llm.invoke([
-            {"role": "system", "content": "You are a helpful assistant that outputs strict JSON."},
-            {"role": "user", "content": struct_prompt}
-        ]).content
         parsed = json.loads(struct_resp)
-        answer_text = parsed.get("answer", final_answer)
-        suggested = parsed.get("suggested_follow_ups", []) or []
-        next_steps = parsed.get("next_steps", "") or ""
+        return {
+            "answer": parsed.get("answer", final_answer),
+            "suggested_follow_ups": parsed.get("suggested_follow_ups", []) or [],
+            "next_steps": parsed.get("next_steps", "") or ""
+        }
     except Exception:
         # Fallback heuristics
-        answer_text = final_answer
-        lines = [l.strip("-* ") for l in final_answer.splitlines() if l.strip()]
-        for l in lines:
-            if len(suggested) >= 2:
-                break
-            if l.lower().startswith("suggest") or l.endswith("?"):
-                suggested.append(l)
-        if not suggested:
-            suggested = [
-                "Do you mean paid time off for innovation projects or a formal leave type?",
-                "Which team or product is this request for (so I can search more precisely)?"
-            ]
-        next_steps = "I can broaden the search to related departments (IT/Product) or escalate this to HR. Which would you prefer?"
+        return {
+            "answer": final_answer,
+            "suggested_follow_ups": _fallback_suggestions(final_answer),
+            "next_steps": DEFAULT_NEXT_STEPS
+        }
+
+
+def _evaluate_confidence(llm, context: str, final_answer: str) -> int:
+    try:
+        messages = _confidence_messages(context, final_answer)
+        with span("llm_confidence"):
+            resp = llm.invoke(messages)
+        text = _content_text(resp.content)
+        record_llm_call("confidence", _messages_text(messages), resp, text)
+        return _parse_confidence(text)
+    except Exception:
+        return 80
 
+
+def _restructure(llm, context: str, final_answer: str) -> Dict[str, Any]:
+    try:
+        messages = _restructure_messages(context, final_answer)
+        with span("llm_restructure"):
+            resp = llm.invoke(messages)
+        struct_resp = _content_text(resp.content)
+        record_llm_call("restructure", _messages_text(messages), resp, struct_resp)
+    except Exception:
+        struct_resp = None
+    return _parse_restructured(struct_resp, final_answer)
+
+
+async def _aevaluate_confidence(llm, context: str, final_answer: str) -> int:
+    try:
+        messages = _confidence_messages(context, final_answer)
+        with span("llm_confidence"):
+            resp = await llm.ainvoke(messages)
+        text = _content_text(resp.content)
+        record_llm_call("confidence", _messages_text(messages), resp, text)
+        return _parse_confidence(text)
+    except Exception:
+        return 80
+
+
+async def _arestructure(llm, context: str, final_answer: str) -> Dict[str, Any]:
+    try:
+        messages = _restructure_messages(context, final_answer)
+        with span("llm_restructure"):
+            resp = await llm.ainvoke(messages)
+        struct_resp = _content_text(resp.content)
+        record_llm_call("restructure", _messages_text(messages), resp, struct_resp)
+    except Exception:
+        struct_resp = None
+    return _parse_restructured(struct_resp, final_answer)
+
+
+def _structured_result(parsed: Optional["StructuredAnswer"], role: str) -> Tuple[Dict[str, Any], str]:
+    if parsed is None:
+        raise ValueError("empty structured response")
+    answer_text = _strip_sections(parsed.answer or "")
     result: Dict[str, Any] = {
         "answer": answer_text,
-        "suggested_follow_ups": suggested,
-        "next_steps": next_steps
+        "suggested_follow_ups": [q for q in (parsed.suggested_follow_ups or []) if q][:2],
+        "next_steps": parsed.next_steps or ""
+    }
+    if _is_hr(role):
+        confidence = parsed.confidence if parsed.confidence is not None else 80
+        result["confidence"] = max(0, min(100, int(confidence)))
+    return result, answer_text
+
+
+def _generate_single(llm, messages: List[Dict[str, str]], role: str) -> Tuple[Dict[str, Any], str]:
+    """One schema-constrained call returning answer, follow-ups, next steps (and confidence for HR)."""
+    with span("llm_answer"):
+        parsed = llm.with_structured_output(StructuredAnswer).invoke(messages)
+    record_llm_call("answer_structured", _messages_text(messages), completion=_structured_text(parsed))
+    return _structured_result(parsed, role)
+
+
+def _generate_multi(llm, messages: List[Dict[str, str]], context: str, role: str) -> Tuple[Dict[str, Any], str]:
+    """Answer call, then the confidence evaluator (HR only) and JSON restructuring run concurrently."""
+    with span("llm_answer"):
+        resp = llm.invoke(messages)
+    llm_response = _content_text(resp.content)
+    record_llm_call("answer", _messages_text(messages), resp, llm_response)
+    final_answer = _strip_sections(llm_response.strip())
+
+    confidence_future = _stage_executor.submit(_evaluate_confidence, llm, context, final_answer) if _is_hr(role) else None
+    structure_future = _stage_executor.submit(_restructure, llm, context, final_answer)
+
+    result = structure_future.result()
+    if confidence_future is not None:
+        result["confidence"] = confidence_future.result()
+    return result, llm_response
+
+
+async def _agenerate_single(llm, messages: List[Dict[str, str]], role: str) -> Tuple[Dict[str, Any], str]:
+    with span("llm_answer"):
+        parsed = await llm.with_structured_output(StructuredAnswer).ainvoke(messages)
+    record_llm_call("answer_structured", _messages_text(messages), completion=_structured_text(parsed))
+    return _structured_result(parsed, role)
+
+
+async def _agenerate_multi(llm, messages: List[Dict[str, str]], context: str, role: str) -> Tuple[Dict[str, Any], str]:
+    with span("llm_answer"):
+        resp = await llm.ainvoke(messages)
+    llm_response = _content_text(resp.content)
+    record_llm_call("answer", _messages_text(messages), resp, llm_response)
+    final_answer = _strip_sections(llm_response.strip())
+
+    if _is_hr(role):
+        result, confidence = await asyncio.gather(
+            _arestructure(llm, context, final_answer),
+            _aevaluate_confidence(llm, context, final_answer)
+        )
+        result["confidence"] = confidence
+    else:
+        result = await _arestructure(llm, context, final_answer)
+    return result, llm_response
+
+
+def generate_answer(question: str, documents: List[Document], department: str, role: str, username: Optional[str] = None, relaxed: bool = False) -> Dict[str, Any]:
+    """Generate a structured response dict:
+    {
+      answer: str,
+      suggested_follow_ups: [str],
+      next_steps: str,
+      confidence: int (optional, only for HR)
     }
 
-    if confidence_score is not None:
-        result["confidence"] = confidence_score
+    `settings.GENERATION_MODE` selects one schema-constrained LLM call ("single") or the
+    answer + evaluator + restructuring calls ("multi"); single falls back to multi on error.
+    """
+    if not documents:
+        return _no_documents_answer(department, username)
+
+    context = _build_context(documents)
+    llm = registry.llm()
+
+    result = None
+    if settings.GENERATION_MODE == "single":
+        try:
+            messages = _build_messages(question, context, department, role, username, relaxed, mode="structured")
+            result, saved_reply = _generate_single(llm, messages, role)
+        except Exception as e:
+            print(f"⚠️ Structured generation failed ({e}); falling back to multi-call mode")
+    if result is None:
+        messages = _build_messages(question, context, department, role, username, relaxed)
+        result, saved_reply = _generate_multi(llm, messages, context, role)
+
+    # Save user + assistant messages
+    if username:
+        _save_exchange(username, question, saved_reply, department)
+
+    return result
+
+
+async def agenerate_answer(question: str, documents: List[Document], department: str, role: str, username: Optional[str] = None, relaxed: bool = False) -> Dict[str, Any]:
+    """Async `generate_answer`: LLM calls use `ainvoke`, history reads/writes run on the blocking executor."""
+    if not documents:
+        return await _run_blocking(_no_documents_answer, department, username)
+
+    context = _build_context(documents)
+    llm = registry.llm()
+
+    result = None
+    if settings.GENERATION_MODE == "single":
+        try:
+            messages = await _run_blocking(_build_messages, question, context, department, role, username, relaxed, mode="structured")
+            result, saved_reply = await _agenerate_single(llm, messages, role)
+        except Exception as e:
+            print(f"⚠️ Structured generation failed ({e}); falling back to multi-call mode")
+    if result is None:
+        messages = await _run_blocking(_build_messages, question, context, department, role, username, relaxed)
+        result, saved_reply = await _agenerate_multi(llm, messages, context, role)
+
+    if username:
+        await _run_blocking(_save_exchange, username, question, saved_reply, department)
 
     return result
 
 
+def _content_text(content: Any) -> str:
+    """Chat chunks may carry a string or a list of content parts."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "".join(p if isinstance(p, str) else str(p.get("text", "")) for p in content if isinstance(p, (str, dict)))
+    return str(content or "")
+
+
+def _messages_text(messages: Any) -> str:
+    """Prompt text of a message list, for token estimates when the model reports no usage."""
+    return "\n".join(m.get("content", "") if isinstance(m, dict) else _content_text(getattr(m, "content", "")) for m in messages or [])
+
+
+def _structured_text(parsed: Optional["StructuredAnswer"]) -> str:
+    if parsed is None:
+        return ""
+    return " ".join([parsed.answer or "", *(parsed.suggested_follow_ups or []), parsed.next_steps or ""])
+
+
+def _save_exchange(username: str, question: str, reply: str, department: Optional[str]):
+    """Persist a question and its reply linked by one turn_id (concurrent questions stay paired)."""
+    turn_id = db.new_turn_id()
+    _save_chat_message(username, "user", question, department=department, turn_id=turn_id)
+    _save_chat_message(username, "assistant", reply, department=department, turn_id=turn_id)
+
+
+# --- Async execution ---
+# Bounded pool for the blocking parts of the async path (Chroma search, SQLite reads/writes)
+_blocking_executor = ThreadPoolExecutor(max_workers=settings.RAG_BLOCKING_WORKERS, thread_name_prefix="rag-blocking")
+
+
+async def _run_blocking(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_blocking_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def _aembed_query(question: str) -> Optional[List[float]]:
+    try:
+        with span("embed_query"):
+            return await registry.embeddings().aembed_query(question)
+    except Exception:
+        return None
+
+
+def _cached_answer(question: str, scope, query_vector, username: Optional[str], department: str) -> Optional[Dict[str, Any]]:
+    with span("answer_cache_lookup"):
+        cached = answer_cache.get(question, scope, vector=query_vector, generation=registry.generation)
+    if cached is not None and username:
+        _save_exchange(username, question, cached.get("answer", ""), department)
+    return cached
+
+
+async def astream_answer(question: str, department: str, role: str, username: Optional[str] = None, country: Optional[str] = None) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+    """Streaming variant of `run_rag` yielding (event, data) pairs.
+
+    Events: `token` (answer text as generated), then trailing `answer`, `follow_ups`,
+    `next_steps`, `confidence` (HR only) and finally `done`. Chat history is persisted
+    once the answer has been fully generated.
+    """
+    scope = make_scope(department, role, country)
+    documents = await _run_blocking(lexical_fast_path, question, department, country=country, role=role)
+    query_vector = None if documents else await _aembed_query(question)
+    if settings.ANSWER_CACHE_ENABLED:
+        cached = await _run_blocking(_cached_answer, question, scope, query_vector, username, department)
+        if cached is not None:
+            for event in _result_events(cached):
+                yield event
+            return
+
+    if documents:
+        relaxed = False
+    else:
+        documents, relaxed = await _run_blocking(retrieve_documents, question, department, country=country, role=role, query_vector=query_vector)
+    if not documents:
+        result = await _run_blocking(_no_documents_answer, department, username)
+        for event in _result_events(result):
+            yield event
+        return
+
+    context = _build_context(documents)
+    llm = registry.llm()
+    messages = await _run_blocking(_build_messages, question, context, department, role, username, relaxed, mode="stream")
+
+    parts: List[str] = []
+    usage = None
+    started = time.perf_counter()
+    async for chunk in llm.astream(messages):
+        usage = getattr(chunk, "usage_metadata", None) or usage
+        text = _content_text(chunk.content)
+        if text:
+            if not parts:
+                STAGE_SECONDS.observe(time.perf_counter() - started, "llm_stream_first_token")
+            parts.append(text)
+            yield "token", {"text": text}
+    STAGE_SECONDS.observe(time.perf_counter() - started, "llm_stream")
+    llm_response = "".join(parts)
+    record_llm_call("answer_stream", _messages_text(messages), completion=llm_response, usage=usage)
+    final_answer = _strip_sections(llm_response)
+    yield "answer", {"answer": final_answer}
+
+    if username:
+        await _run_blocking(_save_exchange, username, question, llm_response, department)
+
+    # Trailing details: restructuring and (HR) confidence run concurrently, sent as each completes
+    result: Dict[str, Any] = {"answer": final_answer}
+    tasks = {asyncio.ensure_future(_arestructure(llm, context, final_answer)): "details"}
+    if _is_hr(role):
+        tasks[asyncio.ensure_future(_aevaluate_confidence(llm, context, final_answer))] = "confidence"
+    pending = set(tasks)
+    while pending:
+        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if tasks[task] == "confidence":
+                result["confidence"] = task.result()
+                yield "confidence", {"confidence": result["confidence"]}
+            else:
+                details = task.result()
+                result["suggested_follow_ups"] = details.get("suggested_follow_ups", [])
+                result["next_steps"] = details.get("next_steps", "")
+                yield "follow_ups", {"suggested_follow_ups": result["suggested_follow_ups"]}
+                yield "next_steps", {"next_steps": result["next_steps"]}
+
+    if settings.ANSWER_CACHE_ENABLED:
+        answer_cache.put(question, scope, result, vector=query_vector, generation=registry.generation)
+    yield "done", {"cached": False}
+
+
+def _result_events(result: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Replay a complete (cached or canned) result as stream events."""
+    yield "token", {"text": result.get("answer", "")}
+    yield "answer", {"answer": result.get("answer", "")}
+    yield "follow_ups", {"suggested_follow_ups": result.get("suggested_follow_ups", [])}
+    yield "next_steps", {"next_steps": result.get("next_steps", "")}
+    if "confidence" in result:
+        yield "confidence", {"confidence": result["confidence"]}
+    yield "done", {"cached": bool(result.get("cached", False))}
+
+
+@timed("rag_total")
 def run_rag(question: str, department: str, role: str, username: Optional[str] = None, country: Optional[str] = None) -> Dict[str, Any]:
-    documents, relaxed = retrieve_documents(question, department, country=country, role=role)
-    return generate_answer(question, documents, department, role, username=username, relaxed=relaxed)
+    """Answer a question, serving repeated/near-identical questions from the answer cache.
+
+    Cache hits are flagged with `cached: true` and skip retrieval and generation entirely.
+    """
+    scope = make_scope(department, role, country)
+    # policy-ID / exact keyword lookups are answered from the BM25 index without embedding
+    documents = lexical_fast_path(question, department, country=country, role=role)
+    query_vector = None
+    if settings.ANSWER_CACHE_ENABLED:
+        if not documents:
+            try:
+                # served from the query-embedding cache on repeats; retrieval reuses it too
+                with span("embed_query"):
+                    query_vector = registry.embeddings().embed_query(question)
+            except Exception:
+                query_vector = None
+        cached = _cached_answer(question, scope, query_vector, username, department)
+        if cached is not None:
+            return cached
+
+    if documents:
+        relaxed = False
+    else:
+        documents, relaxed = retrieve_documents(question, department, country=country, role=role, query_vector=query_vector)
+    result = generate_answer(question, documents, department, role, username=username, relaxed=relaxed)
+
+    # Only cache answers grounded in retrieved policies
+    if settings.ANSWER_CACHE_ENABLED and documents:
+        answer_cache.put(question, scope, result, vector=query_vector, generation=registry.generation)
+    return result
+
+
+@timed("rag_total")
+async def arun_rag(question: str, department: str, role: str, username: Optional[str] = None, country: Optional[str] = None) -> Dict[str, Any]:
+    """Async `run_rag` for the FastAPI event loop: nothing here blocks the loop.
+
+    Embedding and LLM calls use the async LangChain methods; Chroma search and SQLite
+    work run on a bounded thread pool (`settings.RAG_BLOCKING_WORKERS`).
+    """
+    scope = make_scope(department, role, country)
+    documents = await _run_blocking(lexical_fast_path, question, department, country=country, role=role)
+    # embed on the loop (async client) rather than inside the threaded vector search
+    query_vector = None if documents else await _aembed_query(question)
+    if settings.ANSWER_CACHE_ENABLED:
+        cached = await _run_blocking(_cached_answer, question, scope, query_vector, username, department)
+        if cached is not None:
+            return cached
+
+    if documents:
+        relaxed = False
+    else:
+        documents, relaxed = await _run_blocking(retrieve_documents, question, department, country=country, role=role, query_vector=query_vector)
+    result = await agenerate_answer(question, documents, department, role, username=username, relaxed=relaxed)
+
+    if settings.ANSWER_CACHE_ENABLED and documents:
+        answer_cache.put(question, scope, result, vector=query_vector, generation=registry.generation)
+    return result
+
+
+async def arun_rag_batch(questions: List[str], department: str, role: str, country: Optional[str] = None,
+                         concurrency: Optional[int] = None) -> AsyncIterator[Tuple[int, Dict[str, Any]]]:
+    """Answer many questions for one user, yielding (index, result) as each answer completes.
+
+    Per-question work is shared across the batch: policy-ID lookups still take the lexical
+    fast path, every other question is embedded in one batched request and searched in one
+    batched retrieval, and at most `concurrency` (`settings.RAG_BATCH_CONCURRENCY`) answers
+    are generated at a time. Answers are independent: chat history is neither read nor
+    written. A failing question yields {"error": ...} and the rest of the batch carries on.
+    """
+    started = time.perf_counter()
+    scope = make_scope(department, role, country)
+    indexes = range(len(questions))
+
+    found: Dict[int, Tuple[List[Document], bool]] = {}
+    fast = await _run_blocking(lambda: [lexical_fast_path(q, department, country=country, role=role) for q in questions])
+    for i, documents in enumerate(fast):
+        if documents:
+            found[i] = (documents, False)
+    fast_hits = len(found)
+
+    vectors: List[Optional[List[float]]] = [None] * len(questions)
+    to_embed = [i for i in indexes if i not in found]
+    if to_embed:
+        try:
+            with span("embed_query_batch"):
+                embedded = await _run_blocking(embed_queries, registry.embeddings(), [questions[i] for i in to_embed])
+            for i, vector in zip(to_embed, embedded):
+                vectors[i] = vector
+        except Exception as e:
+            print(f"⚠️ Batched embedding failed ({e}); embedding per question")
+
+    todo = list(indexes)
+    if settings.ANSWER_CACHE_ENABLED:
+        cached = await _run_blocking(lambda: [_cached_answer(questions[i], scope, vectors[i], None, department) for i in indexes])
+        todo = [i for i in indexes if cached[i] is None]
+        for i in indexes:
+            if cached[i] is not None:
+                yield i, cached[i]
+
+    to_search = [i for i in todo if i not in found and vectors[i] is not None]
+    if to_search:
+        try:
+            retrieved = await _run_blocking(retrieve_documents_batch, [questions[i] for i in to_search], [vectors[i] for i in to_search],
+                                            department, country=country, role=role)
+            found.update(zip(to_search, retrieved))
+        except Exception as e:
+            print(f"⚠️ Batched retrieval failed ({e}); retrieving per question")
+
+    semaphore = asyncio.Semaphore(max(1, concurrency or settings.RAG_BATCH_CONCURRENCY))
+
+    async def answer(i: int) -> Tuple[int, Dict[str, Any]]:
+        question = questions[i]
+        async with semaphore:
+            try:
+                if i in found:
+                    documents, relaxed = found[i]
+                else:
+                    documents, relaxed = await _run_blocking(retrieve_documents, question, department, country=country, role=role, query_vector=vectors[i])
+                result = await agenerate_answer(question, documents, department, role, relaxed=relaxed)
+            except Exception as e:
+                return i, {"error": str(e)}
+        if settings.ANSWER_CACHE_ENABLED and documents:
+            answer_cache.put(question, scope, result, vector=vectors[i], generation=registry.generation)
+        return i, result
+
+    tasks = [asyncio.ensure_future(answer(i)) for i in todo]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # the consumer may stop early (client disconnected): don't leave generations running
+        for task in tasks:
+            task.cancel()
+    STAGE_SECONDS.observe(time.perf_counter() - started, "rag_batch_total")
+    print(f"📦 Batch of {len(questions)} questions answered in {time.perf_counter() - started:.2f}s "
+          f"({len(questions) - len(todo)} cached, {fast_hits} via lexical fast path)")
+
+
+def run_rag_batch(questions: List[str], department: str, role: str, country: Optional[str] = None,
+                  concurrency: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Blocking `arun_rag_batch` for scripts and jobs; results are returned in question order."""
+    async def collect() -> List[Dict[str, Any]]:
+        results: List[Dict[str, Any]] = [{} for _ in questions]
+        async for i, result in arun_rag_batch(questions, department, role, country=country, concurrency=concurrency):
+            results[i] = result
+        return results
+    return asyncio.run(collect())
+
+
+# Cache effectiveness on /metrics, read from each cache's own counters at scrape time
+register_stats("hr_assistant_answer_cache_lookups_total", "Answer cache lookups by outcome", "result",
+               answer_cache.stats, ["hits_exact", "hits_semantic", "misses"])
+register_stats("hr_assistant_embedding_cache_lookups_total", "Query-embedding cache lookups by outcome", "result",
+               registry.embedding_cache_stats, ["hits_memory", "hits_disk", "misses"])
+register_stats("hr_assistant_cache_hit_ratio", "Hit ratio per cache", "cache",
+               lambda: {"answer": answer_cache.stats()["hit_rate"],
+                        "embedding": (registry.embedding_cache_stats() or {}).get("hit_rate")},
+               ["answer", "embedding"], kind="gauge")
+register_stats("hr_assistant_context_budget_total", "Prompt context assembly: tokens in/out and chunks removed", "field",
+               context_budgeter.stats, ["tokens_in", "tokens_out", "duplicates_removed", "merged", "dropped_for_budget"])
+register_stats("hr_assistant_history_writer", "Chat history write-behind queue", "field",
+               history_writer.stats, ["queue_depth", "pending"], kind="gauge")
+register_stats("hr_assistant_history_writer_messages_total", "Chat messages persisted by the write-behind writer, by outcome", "result",
+               history_writer.stats, ["written", "dropped"])
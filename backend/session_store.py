@@ -0,0 +1,215 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from backend.config import settings
+
+
+class SessionBackend(ABC):
+    """Key -> JSON-serialisable dict with a time-to-live.
+
+    Expiry is sliding: reading an entry extends it by `ttl_seconds`. Expired entries are
+    never returned; `sweep()` deletes them, and `start_sweeper()` runs it in the background.
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+        self._sweeper: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: Dict[str, Any], ttl_seconds: Optional[int] = None):
+        ...
+
+    @abstractmethod
+    def pop(self, key: str) -> Optional[Dict[str, Any]]:
+        """Remove and return an entry (one-time values such as OAuth state)."""
+
+    @abstractmethod
+    def sweep(self) -> int:
+        """Delete expired entries; returns how many were removed."""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        ...
+
+    def delete(self, key: str):
+        self.pop(key)
+
+    def start_sweeper(self, interval: float = 300.0):
+        if self._sweeper is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    removed = self.sweep()
+                    if removed:
+                        print(f"🧹 Swept {removed} expired sessions ({type(self).__name__})")
+                except Exception as e:
+                    print(f"⚠️ Session sweep failed: {e}")
+
+        self._stop.clear()
+        self._sweeper = threading.Thread(target=run, name="session-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def close(self):
+        self._stop.set()
+        if self._sweeper is not None:
+            self._sweeper.join(timeout=5)
+            self._sweeper = None
+
+
+class MemorySessionBackend(SessionBackend):
+    """In-process LRU with TTL. Fast, but every worker process has its own sessions."""
+
+    def __init__(self, ttl_seconds: int, max_entries: int = 10000):
+        super().__init__(ttl_seconds)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self.evicted = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._entries[key]
+                return None
+            self._entries[key] = (value, now + self.ttl_seconds)
+            self._entries.move_to_end(key)
+            return dict(value)
+
+    def set(self, key: str, value: Dict[str, Any], ttl_seconds: Optional[int] = None):
+        with self._lock:
+            self._entries[key] = (dict(value), time.time() + (ttl_seconds or self.ttl_seconds))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evicted += 1
+
+    def pop(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is None or entry[1] <= time.time():
+            return None
+        return entry[0]
+
+    def sweep(self) -> int:
+        now = time.time()
+        with self._lock:
+            expired = [k for k, (_, expires_at) in self._entries.items() if expires_at <= now]
+            for k in expired:
+                del self._entries[k]
+        return len(expired)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "memory", "entries": len(self._entries), "capacity": self.max_entries,
+                "evicted": self.evicted, "ttl_seconds": self.ttl_seconds}
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """Sessions in a local SQLite file (WAL) shared by every worker process on the host.
+
+    Each store uses its own `namespace` in one `sessions` table. To keep reads cheap,
+    the sliding expiry is only written back once less than half the TTL remains.
+    """
+
+    def __init__(self, path: str, namespace: str, ttl_seconds: int):
+        super().__init__(ttl_seconds)
+        self.path = path
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ix_sessions_expires ON sessions (expires_at)")
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM sessions WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (self.namespace, key, now),
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] - now < self.ttl_seconds / 2:
+                self._conn.execute(
+                    "UPDATE sessions SET expires_at = ? WHERE namespace = ? AND key = ?",
+                    (now + self.ttl_seconds, self.namespace, key),
+                )
+        return json.loads(row[0])
+
+    def set(self, key: str, value: Dict[str, Any], ttl_seconds: Optional[int] = None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value), time.time() + (ttl_seconds or self.ttl_seconds)),
+            )
+
+    def pop(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            # DELETE ... RETURNING would need SQLite 3.35; a short write transaction is portable
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM sessions WHERE namespace = ? AND key = ?", (self.namespace, key)
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute("DELETE FROM sessions WHERE namespace = ? AND key = ?", (self.namespace, key))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None or row[1] <= time.time():
+            return None
+        return json.loads(row[0])
+
+    def sweep(self) -> int:
+        with self._lock:
+            cur = self._conn.execute(
+                "DELETE FROM sessions WHERE namespace = ? AND expires_at <= ?", (self.namespace, time.time())
+            )
+            return cur.rowcount
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries = self._conn.execute(
+                "SELECT COUNT(*) FROM sessions WHERE namespace = ? AND expires_at > ?", (self.namespace, time.time())
+            ).fetchone()[0]
+        return {"backend": "sqlite", "path": self.path, "entries": entries, "ttl_seconds": self.ttl_seconds}
+
+    def close(self):
+        super().close()
+        with self._lock:
+            self._conn.close()
+
+
+def build_session_store(namespace: str, ttl_seconds: int) -> SessionBackend:
+    """Session store selected by `settings.SESSION_BACKEND` ("sqlite" or "memory")."""
+    backend = (settings.SESSION_BACKEND or "sqlite").lower()
+    if backend == "memory":
+        return MemorySessionBackend(ttl_seconds, max_entries=settings.SESSION_MAX_ENTRIES)
+    if backend == "sqlite":
+        return SQLiteSessionBackend(settings.SESSION_DB_PATH, namespace, ttl_seconds)
+    raise ValueError(f"Unknown SESSION_BACKEND {settings.SESSION_BACKEND!r} (expected 'sqlite' or 'memory')")
@@ -0,0 +1,96 @@
+import threading
+
+import pytest
+
+from backend.chunk_store import ChunkEmbeddingStore, content_hash
+from backend.embedding_scheduler import EmbeddingScheduler, is_quota_error
+
+MODEL = "fake-embedding"
+
+
+def vector(text):
+    return [float(len(text)), float(sum(map(ord, text)) % 97)]
+
+
+class FakeEmbedder:
+    """Deterministic `List[str] -> vectors`; raises the queued errors on the matching calls."""
+
+    def __init__(self, fail_on=None):
+        self.fail_on = dict(fail_on or {})  # call number -> exception
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def __call__(self, texts):
+        with self._lock:
+            self.calls.append(list(texts))
+            error = self.fail_on.pop(len(self.calls), None)
+        if error is not None:
+            raise error
+        return [vector(t) for t in texts]
+
+
+def texts(n):
+    return [f"chunk number {i}" for i in range(n)]
+
+
+def scheduler(embed_fn, **kwargs):
+    kwargs.setdefault("batch_size", 4)
+    kwargs.setdefault("max_in_flight", 2)
+    return EmbeddingScheduler(embed_fn, retry_on=is_quota_error, sleep=lambda seconds: None, **kwargs)
+
+
+def test_batches_and_results():
+    fake = FakeEmbedder()
+    items = texts(10)
+    batches = []
+    s = scheduler(fake)
+
+    results = s.run([f"id{i}" for i in range(10)], items, on_batch=lambda ids, vectors: batches.append(ids))
+
+    assert results == {f"id{i}": vector(t) for i, t in enumerate(items)}
+    assert sorted(len(call) for call in fake.calls) == [2, 4, 4]
+    assert sorted(cid for batch in batches for cid in batch) == sorted(results)
+    assert s.stats["embedded"] == 10 and s.stats["batches"] == 3 and s.stats["retries"] == 0
+
+
+def test_retries_quota_errors():
+    fake = FakeEmbedder(fail_on={1: RuntimeError("429 Resource exhausted: quota exceeded")})
+    s = scheduler(fake, max_in_flight=1)
+
+    results = s.run(["a", "b"], ["first", "second"])
+
+    assert results == {"a": vector("first"), "b": vector("second")}
+    assert s.stats["retries"] == 1
+    assert len(fake.calls) == 2
+
+
+def test_non_quota_errors_are_not_retried():
+    fake = FakeEmbedder(fail_on={1: ValueError("bad input")})
+    with pytest.raises(ValueError):
+        scheduler(fake, max_in_flight=1).run(["a"], ["text"])
+    assert len(fake.calls) == 1
+
+
+def test_resumes_from_chunk_store_after_failure(tmp_path):
+    """Finished batches persisted through `on_batch` are not embedded again after a crash."""
+    store = ChunkEmbeddingStore(str(tmp_path / "chunks.sqlite"))
+    items = texts(12)
+    hashes = [content_hash(t) for t in items]
+    persist = lambda batch_hashes, vectors: store.put_many(batch_hashes, vectors, MODEL)
+
+    crashing = FakeEmbedder(fail_on={3: ValueError("connection reset")})
+    with pytest.raises(ValueError):
+        scheduler(crashing, max_in_flight=1).run(hashes, items, on_batch=persist)
+    assert len(store.get_many(hashes, MODEL)) == 8
+
+    # second run: what ingest does, only text missing from the store is embedded
+    done = store.get_many(hashes, MODEL)
+    missing = [h for h in hashes if h not in done]
+    resumed = FakeEmbedder()
+    s = scheduler(resumed, max_in_flight=1)
+    done.update(s.run(missing, [items[hashes.index(h)] for h in missing], on_batch=persist))
+
+    assert [t for call in resumed.calls for t in call] == items[8:]
+    assert done == {h: vector(t) for h, t in zip(hashes, items)}
+    assert len(store.get_many(hashes, MODEL)) == 12
+    store.close()
@@ -0,0 +1,171 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from backend import db
+
+T0 = datetime(2024, 1, 1, 9, 0, 0)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = db.create_history_engine(f"sqlite:///{tmp_path / 'history.db'}")
+    db.migrate(engine)
+    yield engine
+    engine.dispose()
+
+
+def _session(engine):
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+
+
+def _legacy_db(path, rows):
+    """A chat history DB as written before schema versioning: no department/turn_id, single-column indexes."""
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE messages (id INTEGER PRIMARY KEY, session_id VARCHAR, role VARCHAR,"
+        " content TEXT, timestamp DATETIME)"
+    )
+    conn.execute("CREATE INDEX ix_messages_session_id ON messages (session_id)")
+    conn.executemany(
+        "INSERT INTO messages (id, session_id, role, content, timestamp) VALUES (?, ?, ?, ?, ?)",
+        [(i, sid, role, content, ts.isoformat(sep=" ")) for i, (sid, role, content, ts) in enumerate(rows, start=1)],
+    )
+    conn.commit()
+    conn.close()
+
+
+def _indexes(engine):
+    with engine.connect() as conn:
+        return {row[1] for row in conn.exec_driver_sql("PRAGMA index_list(messages)")}
+
+
+def test_question_pages_follow_the_keyset_cursor(engine):
+    session = _session(engine)
+    # several questions share a timestamp: the cursor must break ties on id
+    stamps = [T0, T0, T0 + timedelta(seconds=1), T0 + timedelta(seconds=1), T0 + timedelta(seconds=2), T0, T0 + timedelta(seconds=3)]
+    for i, ts in enumerate(stamps):
+        session.add(db.ChatMessage(session_id="alice", role="user", content=f"q{i}", department="hr", timestamp=ts))
+        session.add(db.ChatMessage(session_id="alice", role="assistant", content=f"a{i}", department="hr", timestamp=ts))
+    session.add(db.ChatMessage(session_id="bob", role="user", content="other department", department="it", timestamp=T0))
+    session.commit()
+
+    expected = (
+        session.query(db.ChatMessage)
+        .filter(db.ChatMessage.department == "hr", db.ChatMessage.role == "user")
+        .order_by(db.ChatMessage.timestamp.desc(), db.ChatMessage.id.desc())
+        .all()
+    )
+    pages, before = [], None
+    while True:
+        rows = db.fetch_question_page(session, "hr", 3 + 1, before=before)
+        page = rows[:3]
+        pages.append([m.content for m in page])
+        if len(rows) <= 3:
+            break
+        before = (page[-1].timestamp, page[-1].id)
+
+    assert [c for page in pages for c in page] == [m.content for m in expected]
+    assert [len(page) for page in pages] == [3, 3, 1]
+    session.close()
+
+
+def test_fresh_database_is_created_at_the_current_version(engine):
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA user_version").scalar() == db.SCHEMA_VERSION
+    assert {"ix_messages_department_role_timestamp", "ix_messages_session_timestamp", "ix_messages_turn_role"} <= _indexes(engine)
+
+
+def test_legacy_database_is_migrated_in_place(tmp_path):
+    path = tmp_path / "legacy.db"
+    _legacy_db(path, [("alice", "user", "hello", T0), ("alice", "assistant", "hi", T0 + timedelta(seconds=1))])
+    engine = db.create_history_engine(f"sqlite:///{path}")
+
+    db.migrate(engine)
+    db.migrate(engine)  # idempotent
+
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA user_version").scalar() == db.SCHEMA_VERSION
+        columns = [row[1] for row in conn.exec_driver_sql("PRAGMA table_info(messages)")]
+    assert {"department", "turn_id"} <= set(columns)
+    indexes = _indexes(engine)
+    assert "ix_messages_session_id" not in indexes
+    assert {"ix_messages_department_role_timestamp", "ix_messages_session_timestamp"} <= indexes
+    session = _session(engine)
+    assert [m.content for m in session.query(db.ChatMessage).order_by(db.ChatMessage.id)] == ["hello", "hi"]
+    session.close()
+    engine.dispose()
+
+
+LEGACY_CONVERSATIONS = [
+    ("alice", "user", "q1", T0),
+    ("bob", "user", "bob q1", T0),
+    ("alice", "assistant", "a1", T0 + timedelta(seconds=1)),
+    ("alice", "assistant", "a1 follow-up", T0 + timedelta(seconds=2)),
+    ("bob", "assistant", "bob a1", T0 + timedelta(seconds=2)),
+    ("alice", "user", "q2 unanswered", T0 + timedelta(seconds=3)),
+    ("alice", "user", "q3", T0 + timedelta(seconds=4)),
+    ("alice", "assistant", "a3", T0 + timedelta(seconds=5)),
+]
+
+
+def _turns(engine):
+    session = _session(engine)
+    try:
+        return {m.content: m.turn_id for m in session.query(db.ChatMessage)}
+    finally:
+        session.close()
+
+
+def _assert_paired(turns):
+    assert None not in turns.values()
+    assert turns["q1"] == turns["a1"]
+    assert turns["bob q1"] == turns["bob a1"]
+    assert turns["q3"] == turns["a3"]
+    # an extra reply and an unanswered question each get a turn of their own
+    others = [turns["a1 follow-up"], turns["q2 unanswered"]]
+    assert len(set(others) | {turns["q1"], turns["bob q1"], turns["q3"]}) == 5
+
+
+def test_v1_database_gets_turn_ids_and_backfill(tmp_path):
+    path = tmp_path / "v1.db"
+    _legacy_db(path, LEGACY_CONVERSATIONS)
+    conn = sqlite3.connect(path)
+    conn.execute("ALTER TABLE messages ADD COLUMN department VARCHAR")
+    conn.execute("UPDATE messages SET department = 'hr'")
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+    conn.close()
+    engine = db.create_history_engine(f"sqlite:///{path}")
+
+    db.migrate(engine)
+
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA user_version").scalar() == db.SCHEMA_VERSION
+    assert "ix_messages_turn_role" in _indexes(engine)
+    assert "ix_messages_unlinked" not in _indexes(engine)
+    _assert_paired(_turns(engine))
+
+    session = _session(engine)
+    q3 = session.query(db.ChatMessage).filter_by(content="q3").one()
+    assert [m.content for m in db.fetch_turn(session, q3.id, "hr")] == ["q3", "a3"]
+    q2 = session.query(db.ChatMessage).filter_by(content="q2 unanswered").one()
+    replies = db.fetch_replies(session, [q3.turn_id, q2.turn_id])
+    assert replies[q3.turn_id].content == "a3" and q2.turn_id not in replies
+    session.close()
+    engine.dispose()
+
+
+def test_backfill_pairs_across_pages_and_is_resumable(engine):
+    session = _session(engine)
+    for sid, role, content, ts in LEGACY_CONVERSATIONS:
+        session.add(db.ChatMessage(session_id=sid, role=role, content=content, department="hr", timestamp=ts))
+    session.commit()
+    session.close()
+
+    # pages of two rows split question/answer pairs across batches
+    assert db.backfill_turn_ids(engine, batch_size=2) == len(LEGACY_CONVERSATIONS)
+    _assert_paired(_turns(engine))
+    assert db.backfill_turn_ids(engine) == 0
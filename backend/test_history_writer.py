@@ -0,0 +1,115 @@
+import threading
+
+from sqlalchemy.orm import sessionmaker
+
+from backend import db
+from backend.history_writer import HistoryWriter
+
+
+class CountingSessions:
+    """Session factory over a throwaway SQLite file that records the rows committed per transaction."""
+
+    def __init__(self, path, gate=None):
+        self.engine = db.create_history_engine(f"sqlite:///{path}")
+        db.Base.metadata.create_all(bind=self.engine)
+        self.factory = sessionmaker(autocommit=False, autoflush=False, bind=self.engine)
+        self.commits = []
+        self.gate = gate  # when set, commits of the "slow" session wait on it
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        session = self.factory()
+        commit = session.commit
+
+        def counted_commit():
+            rows = list(session.new)
+            if self.gate is not None and any(r.session_id == "slow" for r in rows):
+                self.gate.wait(5)
+            commit()
+            with self._lock:
+                self.commits.append(len(rows))
+
+        session.commit = counted_commit
+        return session
+
+    def rows(self):
+        session = self.factory()
+        try:
+            return session.query(db.ChatMessage).order_by(db.ChatMessage.id).all()
+        finally:
+            session.close()
+
+
+def test_concurrent_writes_are_batched(tmp_path):
+    sessions = CountingSessions(tmp_path / "history.db")
+    writer = HistoryWriter(session_factory=sessions, flush_interval=0.05, batch_size=256)
+
+    def produce(n):
+        for i in range(500):
+            writer.enqueue(f"user{n}", "user" if i % 2 == 0 else "assistant", f"message {i}", department="hr")
+
+    threads = [threading.Thread(target=produce, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert writer.flush(10.0)
+
+    rows = sessions.rows()
+    assert len(rows) == 2000
+    assert sum(sessions.commits) == 2000
+    # one transaction per flush, never more rows than batch_size, far fewer than one per message
+    assert max(sessions.commits) <= 256
+    assert len(sessions.commits) < 100
+    # enqueue order (and its timestamps) is preserved per session
+    for n in range(4):
+        contents = [r.content for r in rows if r.session_id == f"user{n}"]
+        assert contents == [f"message {i}" for i in range(500)]
+    stats = writer.stats()
+    assert stats["written"] == 2000 and stats["dropped"] == 0 and stats["pending"] == 0
+    writer.close()
+
+
+def test_close_drains_the_queue(tmp_path):
+    sessions = CountingSessions(tmp_path / "history.db")
+    # a long flush interval: without close() nothing would be written for seconds
+    writer = HistoryWriter(session_factory=sessions, flush_interval=30.0, batch_size=1000)
+    for i in range(50):
+        writer.enqueue("alice", "user", f"question {i}")
+
+    writer.close()
+
+    assert [r.content for r in sessions.rows()] == [f"question {i}" for i in range(50)]
+    assert writer.stats()["pending"] == 0
+
+
+def test_writes_after_close_are_synchronous(tmp_path):
+    sessions = CountingSessions(tmp_path / "history.db")
+    writer = HistoryWriter(session_factory=sessions, flush_interval=0.05)
+    writer.enqueue("alice", "user", "before shutdown")
+    writer.close()
+
+    writer.enqueue("alice", "assistant", "after shutdown", turn_id="t1")
+
+    rows = sessions.rows()
+    assert [r.content for r in rows] == ["before shutdown", "after shutdown"]
+    assert rows[-1].turn_id == "t1"
+    assert writer.pending() == 0
+
+
+def test_flush_waits_only_for_the_given_session(tmp_path):
+    gate = threading.Event()
+    sessions = CountingSessions(tmp_path / "history.db", gate=gate)
+    writer = HistoryWriter(session_factory=sessions, flush_interval=0.01, batch_size=1)
+    writer.enqueue("alice", "user", "hello")
+    assert writer.flush(5.0, session_id="alice")
+
+    writer.enqueue("slow", "user", "stuck behind a slow commit")
+    assert writer.pending("slow") == 1
+    assert writer.flush(0.5, session_id="alice")
+    assert not writer.flush(0.1)
+
+    gate.set()
+    assert writer.flush(5.0)
+    assert writer.pending("slow") == 0
+    writer.close()
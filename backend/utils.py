@@ -1,5 +1,6 @@
+import re
 from datetime import datetime
-from typing import List, Dict
+from typing import Any, List, Dict, Optional
 
 # =============================
 # METADATA FILTERING
@@ -30,6 +31,84 @@ def filter_docs_by_access(
     return filtered
 
 
+# =============================
+# NORMALIZED METADATA (written at ingest, matched by vector search filters)
+# =============================
+
+COMMON_DEPARTMENTS = ("common", "all", "company")
+HR_ONLY_VISIBILITY = "hr_only"
+
+
+def normalize_department(value: Optional[str]) -> str:
+    """'Customer Support' / 'customer-support' -> 'customer_support'; 'all'/'company' -> 'common'"""
+    v = re.sub(r"[\s\-]+", "_", (value or "").strip().lower())
+    return "common" if v in COMMON_DEPARTMENTS else v
+
+
+def normalize_country(value: Optional[str]) -> str:
+    v = (value or "").strip().lower()
+    if v in ("india", "indian", "indian_policy"):
+        return "india"
+    if v in ("foreign", "international", "foreign_policy"):
+        return "foreign"
+    return v
+
+
+def normalize_visibility(value: Optional[str]) -> str:
+    v = re.sub(r"[\s\-]+", "_", (value or "").strip().lower())
+    if v in ("hr", "hr_only"):
+        return HR_ONLY_VISIBILITY
+    return v or "all"
+
+
+def build_access_filter(
+    department: Optional[str],
+    country: Optional[str] = None,
+    role: Optional[str] = None,
+    include_visibility: bool = True
+) -> Optional[Dict[str, Any]]:
+    """
+    Build a Chroma `where` filter for department (+ common), country and visibility
+    """
+    clauses = []
+    dept = normalize_department(department)
+    if dept and dept != "common":
+        clauses.append({"department": {"$in": [dept, "common"]}})
+    elif dept:
+        clauses.append({"department": "common"})
+    country_n = normalize_country(country)
+    if country_n:
+        clauses.append({"country": country_n})
+    if include_visibility and (role or "").lower() != "hr":
+        clauses.append({"visibility": {"$ne": HR_ONLY_VISIBILITY}})
+
+    if not clauses:
+        return None
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
+
+def filter_matches(meta: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """
+    Evaluate a `where` filter built by build_access_filter against one metadata dict
+    """
+    if not where:
+        return True
+    if "$and" in where:
+        return all(filter_matches(meta, c) for c in where["$and"])
+    for field, cond in where.items():
+        value = meta.get(field)
+        if isinstance(cond, dict):
+            if "$in" in cond and value not in cond["$in"]:
+                return False
+            if "$ne" in cond and value == cond["$ne"]:
+                return False
+        elif value != cond:
+            return False
+    return True
+
+
 # =============================
 # POLICY VERSION HANDLING
 # =============================
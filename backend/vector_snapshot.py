@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from backend.numpy_index import NumpyIndex
+
+# Written by ingest next to the Chroma files (backend/vectorstore/snapshot/)
+SNAPSHOT_DIR = "snapshot"
+HEADER_FILE = "snapshot.json"
+SNAPSHOT_FORMAT = "hr-assistant-vector-snapshot"
+SNAPSHOT_VERSION = 1
+DTYPES = {"float32": "<f4", "float16": "<f2"}
+
+
+class SnapshotError(Exception):
+    """The snapshot exists but cannot be used (corrupt, wrong version, other embeddings, stale)."""
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _write_file(directory: str, prefix: str, suffix: str, data: bytes) -> Dict[str, Any]:
+    """Content-addressed file: a new snapshot never overwrites one that a process may have mapped."""
+    digest = hashlib.sha256(data).hexdigest()
+    name = f"{prefix}-{digest[:16]}{suffix}"
+    tmp = os.path.join(directory, name + ".tmp")
+    with open(tmp, "wb") as fh:
+        fh.write(data)
+    os.replace(tmp, os.path.join(directory, name))
+    return {"file": name, "sha256": digest, "bytes": len(data)}
+
+
+def write_snapshot(directory: str, index: NumpyIndex, embedding: str, generation: str = "", dtype: str = "float32") -> Dict[str, Any]:
+    """Export `index` as raw row-major vectors plus columnar metadata; returns the header.
+
+    The header is replaced last (atomically), so readers see either the old or the new
+    snapshot. Files the new header no longer references are removed afterwards.
+    """
+    if dtype not in DTYPES:
+        raise ValueError(f"Unknown snapshot dtype {dtype!r} (expected one of {', '.join(DTYPES)})")
+    os.makedirs(directory, exist_ok=True)
+
+    rows, dim = len(index), index.dim
+    vectors = np.ascontiguousarray(np.asarray(index.matrix).astype(DTYPES[dtype]))
+    keys = sorted({key for meta in index.metadatas for key in meta})
+    metadata = {
+        "ids": index.ids,
+        "texts": index.texts,
+        # one list per metadata key; None where a chunk lacks the key
+        "columns": {key: [meta.get(key) for meta in index.metadatas] for key in keys},
+    }
+    header = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "embedding": embedding,
+        "generation": generation,
+        "dtype": dtype,
+        "rows": rows,
+        "dim": dim,
+        "vectors": _write_file(directory, "vectors", f".{dtype}", vectors.tobytes()),
+        "metadata": _write_file(directory, "metadata", ".json", json.dumps(metadata, ensure_ascii=False).encode("utf-8")),
+        "created_at": datetime.utcnow().isoformat() + "Z",
+    }
+    tmp = os.path.join(directory, HEADER_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(header, fh, indent=1)
+    os.replace(tmp, os.path.join(directory, HEADER_FILE))
+
+    keep = {HEADER_FILE, header["vectors"]["file"], header["metadata"]["file"]}
+    for name in os.listdir(directory):
+        if name not in keep:
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass  # still mapped by a running process (Windows); removed by a later export
+    return header
+
+
+def read_header(directory: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(directory, HEADER_FILE), encoding="utf-8") as fh:
+            return json.load(fh)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        raise SnapshotError(f"unreadable header: {e}")
+
+
+def load_snapshot(directory: str, embedding: Optional[str] = None, generation: Optional[str] = None,
+                  verify: bool = False) -> Optional[NumpyIndex]:
+    """Open a snapshot as a `NumpyIndex` over a read-only memory map; None when there is none.
+
+    `embedding` / `generation`, when given, must match what ingest recorded. The metadata
+    checksum and the vector file's size (rows × dim × itemsize) are always checked; `verify`
+    also hashes the whole vector file, which reads every page and costs time in index size.
+    """
+    header = read_header(directory)
+    if header is None:
+        return None
+    if header.get("format") != SNAPSHOT_FORMAT or header.get("version") != SNAPSHOT_VERSION:
+        raise SnapshotError(f"unsupported format {header.get('format')!r} v{header.get('version')}")
+    if embedding is not None and header.get("embedding") != embedding:
+        raise SnapshotError(f"built with {header.get('embedding')!r}, serving {embedding!r}")
+    if generation is not None and header.get("generation") != generation:
+        raise SnapshotError(f"stale (generation {header.get('generation')!r}, index {generation!r})")
+    dtype = DTYPES.get(header.get("dtype"))
+    if dtype is None:
+        raise SnapshotError(f"unknown dtype {header.get('dtype')!r}")
+
+    rows, dim = int(header["rows"]), int(header["dim"])
+    vectors_path = os.path.join(directory, header["vectors"]["file"])
+    metadata_path = os.path.join(directory, header["metadata"]["file"])
+    try:
+        expected_bytes = rows * dim * np.dtype(dtype).itemsize
+        if os.path.getsize(vectors_path) != expected_bytes:
+            raise SnapshotError(f"{header['vectors']['file']} is {os.path.getsize(vectors_path)} bytes, expected {expected_bytes}")
+        if verify and _sha256(vectors_path) != header["vectors"]["sha256"]:
+            raise SnapshotError(f"checksum mismatch in {header['vectors']['file']}")
+        with open(metadata_path, "rb") as fh:
+            raw = fh.read()
+    except OSError as e:
+        raise SnapshotError(str(e))
+    if hashlib.sha256(raw).hexdigest() != header["metadata"]["sha256"]:
+        raise SnapshotError(f"checksum mismatch in {header['metadata']['file']}")
+
+    metadata = json.loads(raw.decode("utf-8"))
+    columns = metadata["columns"]
+    metadatas = [
+        {key: values[i] for key, values in columns.items() if values[i] is not None}
+        for i in range(rows)
+    ]
+    matrix = np.memmap(vectors_path, dtype=dtype, mode="r", shape=(rows, dim)) if rows else np.zeros((0, 0), dtype=np.float32)
+    return NumpyIndex(metadata["ids"], metadata["texts"], metadatas, matrix)
@@ -104,25 +104,80 @@ function App() {
     setInput("");
     setLoading(true);
 
+    // Placeholder assistant message that is filled in as the answer streams
+    const assistantMsg = {
+      role: "assistant",
+      content: "",
+      suggested_follow_ups: [],
+      next_steps: "",
+      confidence: undefined,
+      question: questionText,
+      liked: null,
+      streaming: true
+    };
+    setMessages(prev => [...prev, assistantMsg]);
+    const updateAssistant = (patch) => setMessages(prev => {
+      const next = [...prev];
+      const i = next.length - 1;
+      next[i] = { ...next[i], ...(typeof patch === 'function' ? patch(next[i]) : patch) };
+      return next;
+    });
+
     try {
-      const res = await axios.post(`${API_BASE}/query`, {
-        question: questionText,
-        policy_country: countryPolicy,
-        department: (selectedDept || '').toLowerCase()
-      }, { withCredentials: true });
-      // refresh history after sending
+      const res = await fetch(`${API_BASE}/query/stream`, {
+        method: 'POST',
+        credentials: 'include',
+        headers: { 'Content-Type': 'application/json', Accept: 'text/event-stream' },
+        body: JSON.stringify({
+          question: questionText,
+          policy_country: countryPolicy,
+          department: (selectedDept || '').toLowerCase()
+        })
+      });
+      if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+
+      // Parse server-sent events: blocks separated by a blank line, with `event:` and `data:` lines
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = "";
+      const handleEvent = (event, data) => {
+        if (event === 'token') {
+          setLoading(false);
+          updateAssistant(m => ({ content: m.content + (data.text || "") }));
+        } else if (event === 'answer') {
+          updateAssistant({ content: data.answer || "" });
+        } else if (event === 'follow_ups') {
+          updateAssistant({ suggested_follow_ups: data.suggested_follow_ups || [] });
+        } else if (event === 'next_steps') {
+          updateAssistant({ next_steps: data.next_steps || "" });
+        } else if (event === 'confidence') {
+          updateAssistant({ confidence: data.confidence });
+        } else if (event === 'error') {
+          throw new Error(data.error || 'stream error');
+        }
+      };
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        let sep;
+        while ((sep = buffer.indexOf("\n\n")) !== -1) {
+          const block = buffer.slice(0, sep);
+          buffer = buffer.slice(sep + 2);
+          let event = 'message';
+          const dataLines = [];
+          block.split("\n").forEach(line => {
+            if (line.startsWith('event:')) event = line.slice(6).trim();
+            else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+          });
+          if (dataLines.length) handleEvent(event, JSON.parse(dataLines.join("\n")));
+        }
+      }
+      updateAssistant({ streaming: false });
+      // refresh history after the answer has been persisted
       fetchHistory();
-      setMessages(prev => [...prev, {
-        role: "assistant",
-        content: res.data.answer,
-        suggested_follow_ups: res.data.suggested_follow_ups || [],
-        next_steps: res.data.next_steps || "",
-        confidence: res.data.confidence,
-        question: questionText,
-        liked: null
-      }]);
     } catch (err) {
-      setMessages(prev => [...prev, { role: "assistant", content: "Error connecting to AI service.", suggested_follow_ups: [], next_steps: "", question: questionText }]);
+      updateAssistant({ content: "Error connecting to AI service.", suggested_follow_ups: [], next_steps: "", streaming: false });
     } finally {
       setLoading(false);
     }